@@ -1,20 +1,76 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import statistics
+import sys
 import time
+import tracemalloc
 import numpy as np
-import random
-from matmul_correct import matrix_multiply
+from matmul_correct import BACKENDS, BACKEND_THRESHOLDS, matrix_multiply, multiply, multiply_blocked, multiply_strassen, test_matrices
+
+# Square sizes of the default suite, and rectangular (rows, inner, cols) shapes: wide and skinny
+# products, an outer product and a dot product
+DEFAULT_SIZES = (8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+DEFAULT_SHAPES = ((1024, 16, 1024), (16, 1024, 16), (2048, 64, 8), (8, 64, 2048), (512, 1, 512), (1, 4096, 1))
+# Pure Python kernels are skipped on products with more multiply-adds than this, a 2048 x 2048 product
+# would take hours, which the command line can raise
+PYTHON_MAX_WORK = 256 ** 3
+# Timed runs of a kernel go on until they add up to this many seconds, within the repeat bounds
+MIN_TIME = 0.2
+MIN_REPEATS = 3
+MAX_REPEATS = 1000
+# A kernel has regressed once its median time is this much slower than in the baseline
+REGRESSION_RATIO = 1.5
+# Runs faster than this are too noisy to compare against a baseline
+MIN_COMPARED_TIME = 1e-4
 
-def generate_random_matrix(rows, cols):
-    """Generate a random matrix with the given number of rows and columns."""
+CSV_FIELDS = ('kernel', 'rows', 'inner', 'cols', 'median', 'iqr', 'min', 'repeats', 'gflops', 'peak_memory')
+
+def generate_random_matrix(rows, cols, kind='float'):
+    """Generate a random matrix with the given number of rows and columns, of floats or small integers."""
+    if kind == 'int':
+        return [[random.randint(-1000, 1000) for _ in range(cols)] for _ in range(rows)]
     return [[random.random() for _ in range(cols)] for _ in range(rows)]
 
-def time_function(func, *args, repeats=5):
-    """Times a function by running it multiple times and averaging the time taken."""
-    total_time = 0.0
-    for _ in range(repeats):
-        start_time = time.time()
+def measure(func, *args, min_time=MIN_TIME, min_repeats=MIN_REPEATS, max_repeats=MAX_REPEATS, memory=True):
+    """Times a function with perf_counter_ns and returns the statistics of its run times in seconds.
+
+    One untimed call warms up caches, lazy imports and the allocator, then the function is called until
+    the timed runs add up to min_time, at least min_repeats and at most max_repeats times, so that fast
+    functions get many samples and slow ones are not repeated needlessly. The median and interquartile
+    range describe the runs robustly against the odd outlier, and one more run traced by tracemalloc
+    gives the peak memory allocated, which the timed runs leave out as tracing slows them down.
+    """
+    func(*args)
+    samples = []
+    total = 0
+    while len(samples) < max_repeats and (len(samples) < min_repeats or total < min_time * 1e9):
+        start = time.perf_counter_ns()
         func(*args)
-        total_time += time.time() - start_time
-    return total_time / repeats
+        elapsed = time.perf_counter_ns() - start
+        samples.append(elapsed)
+        total += elapsed
+    quartiles = statistics.quantiles(samples, n=4) if len(samples) > 1 else [samples[0]] * 3
+    result = {'median': statistics.median(samples) / 1e9, 'iqr': (quartiles[2] - quartiles[0]) / 1e9,
+              'min': min(samples) / 1e9, 'repeats': len(samples), 'peak_memory': None}
+    if memory:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func(*args)
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1] - base
+        if started:
+            tracemalloc.stop()
+    return result
+
+def time_function(func, *args, repeats=MIN_REPEATS):
+    """Times a function as measure does, without tracing memory, and returns its median time in seconds."""
+    return measure(func, *args, min_repeats=repeats, memory=False)['median']
 
 def calculate_flops(m, n, p, time_taken):
     """Calculate the effective FLOPS for a matrix multiplication."""
@@ -23,47 +79,192 @@ def calculate_flops(m, n, p, time_taken):
     flops = operations / time_taken
     return flops
 
-def benchmark_matrix_multiply(sizes, repeats=5):
-    """Benchmark the custom matrix_multiply function against NumPy's matrix multiplication."""
-    for size in sizes:
-        rows, cols = size
+def kernels():
+    """Returns the kernels to benchmark, each with whether it runs in pure Python.
 
-        # Generate two random matrices of the given size
-        mat1 = generate_random_matrix(rows, cols)
-        mat2 = generate_random_matrix(cols, rows)  # Ensure mat2 is of compatible size
+    'reference' is the textbook i-j-k loop, validated like matrix_multiply, every available backend is
+    called through matrix_multiply as backend='auto' would, and 'numpy-dot' multiplies prebuilt arrays,
+    the bound the list based kernels are measured against.
+    """
+    result = {'reference': (lambda a, b: (test_matrices(a, b), multiply(a, b))[1], True)}
+    for name, (_, _, available) in BACKENDS.items():
+        if available():
+            result[name] = ((lambda a, b, name=name: matrix_multiply(a, b, backend=name, sparse=False)), name in ('python', 'array'))
+    result['strassen'] = (lambda a, b: matrix_multiply(a, b, strassen=True), True)
+    if (os.cpu_count() or 1) > 1:
+        result['parallel'] = (lambda a, b: matrix_multiply(a, b, parallel=True), True)
+    result['numpy-dot'] = (np.dot, False)
+    return result
 
-        # Benchmark the custom matrix_multiply function
-        custom_time = time_function(matrix_multiply, mat1, mat2, repeats=repeats)
-        custom_flops = calculate_flops(rows, cols, rows, custom_time)/1e6
+def run_suite(shapes, names=None, kind='float', python_max_work=PYTHON_MAX_WORK, min_time=MIN_TIME, memory=True, seed=0, verbose=False):
+    """Benchmarks the kernels on random matrices of every shape.
 
-        # Convert matrices to numpy arrays
-        np_mat1 = np.array(mat1)
-        np_mat2 = np.array(mat2)
+    Parameters:
+    shapes(List[Tuple[int, int, int]]): The (rows, inner, cols) shapes of the products.
+    names(List[str]): The kernels to run, see kernels, all of them by default.
+    kind(str): 'float' or 'int' elements.
+    python_max_work(int): The largest product, in multiply-adds, given to pure Python kernels.
+    min_time(float): The time in seconds the timed runs of a measurement add up to.
+    memory(bool): Whether to record the peak memory of every measurement.
+    seed(int): Seeds the matrices.
+    verbose(bool): Whether to print a line per measurement to stderr.
 
-        # Benchmark NumPy's matrix multiplication
-        numpy_time = time_function(np.dot, np_mat1, np_mat2, repeats=repeats)
-        numpy_flops = calculate_flops(rows, cols, rows, numpy_time)/1e6
+    Returns:
+    Dict: The report, with the environment, the settings and an entry per kernel and shape.
+    """
+    random.seed(seed)
+    available = kernels()
+    names = list(available) if names is None else names
+    results = []
+    for rows, inner, cols in shapes:
+        matrix1 = generate_random_matrix(rows, inner, kind)
+        matrix2 = generate_random_matrix(inner, cols, kind)
+        arrays = (np.array(matrix1), np.array(matrix2))
+        expected = None
+        for name in names:
+            func, pure_python = available[name]
+            if pure_python and rows * inner * cols > python_max_work:
+                continue
+            args = arrays if name == 'numpy-dot' else (matrix1, matrix2)
+            # A kernel which gives the wrong answer has no business in the report
+            product = np.asarray(func(*args))
+            if expected is None:
+                expected = product
+            assert np.allclose(product, expected), f"{name} does not match on {rows}x{inner}x{cols}"
+            entry = dict(kernel=name, rows=rows, inner=inner, cols=cols, **measure(func, *args, min_time=min_time, memory=memory))
+            entry['gflops'] = calculate_flops(rows, inner, cols, entry['median']) / 1e9
+            results.append(entry)
+            if verbose:
+                print(f"{name:>10} {rows}x{inner}x{cols}: median {entry['median']:.6f}s, IQR {entry['iqr']:.6f}s, "
+                      f"{entry['repeats']} runs, {entry['gflops']:.4f} GFLOPS", file=sys.stderr, flush=True)
+    environment = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                   'platform': platform.platform(), 'cpus': os.cpu_count()}
+    settings = {'kind': kind, 'python_max_work': python_max_work, 'min_time': min_time, 'seed': seed}
+    return {'environment': environment, 'settings': settings, 'results': results}
 
-        # Compare the results (sanity check)
-        result_custom = matrix_multiply(mat1, mat2)
-        result_numpy = np.dot(np_mat1, np_mat2)
-        assert np.allclose(result_custom, result_numpy.tolist()), "Results do not match!"
+def write_csv(report, target):
+    """Writes the entries of a report as CSV rows to a file name or an open text file."""
+    if isinstance(target, str):
+        with open(target, 'w', newline='') as filehandle:
+            write_csv(report, filehandle)
+        return
+    writer = csv.DictWriter(target, CSV_FIELDS)
+    writer.writeheader()
+    for entry in report['results']:
+        writer.writerow({field: entry[field] for field in CSV_FIELDS})
 
-        print(f"Matrix size: {rows}x{cols} multiplied by {cols}x{rows}")
-        print(f"Custom function average time: {custom_time:.6f} seconds over {repeats} runs")
-        print(f"Custom function FLOPS: {custom_flops:}")
-        print(f"NumPy function average time: {numpy_time:.6f} seconds over {repeats} runs")
-        print(f"NumPy function FLOPS: {numpy_flops:}")
-        print("-" * 40)
+def compare(report, baseline, ratio=REGRESSION_RATIO):
+    """Lists the regressions of a report against a baseline report.
 
-if __name__ == "__main__":
-    # Define matrix sizes for benchmarking
-    matrix_sizes = [
-        (10, 10),
-        (50, 50),
-        (100, 100),
-        (200, 200)
-    ]
-    
-    benchmark_matrix_multiply(matrix_sizes, repeats=5)
+    A kernel regresses on a shape when its median time grows past `ratio` times the baseline, by more
+    than the spread of both measurements, ignoring runs which took under MIN_COMPARED_TIME in both.
+    """
+    regressions = []
+    before = {(entry['kernel'], entry['rows'], entry['inner'], entry['cols']): entry for entry in baseline['results']}
+    for entry in report['results']:
+        old = before.get((entry['kernel'], entry['rows'], entry['inner'], entry['cols']))
+        if old is None or max(entry['median'], old['median']) < MIN_COMPARED_TIME:
+            continue
+        if entry['median'] > ratio * old['median'] and entry['median'] - old['median'] > entry['iqr'] + old['iqr']:
+            regressions.append(f"{entry['kernel']} {entry['rows']}x{entry['inner']}x{entry['cols']}: "
+                               f"{entry['median']:.4g}s against {old['median']:.4g}s")
+    return regressions
+
+def calibrate_backends(sizes=(2, 4, 8, 16, 32, 64, 128), repeats=5):
+    """Finds the product sizes from which each backend of matrix_multiply beats the pure Python one.
 
+    Every available backend is timed against backend='python' on random square float matrices, and its
+    threshold is the number of multiply-adds of the smallest size from which it wins at every larger size
+    tried, or infinity when it never does. Backends which cannot run here keep their current threshold, so
+    that the result holds every key of BACKEND_THRESHOLDS. Set BACKEND_THRESHOLDS in matmul_correct.py to it.
+    """
+    matrices = [generate_random_matrix(n, n) for n in sizes]
+    times = {name: [time_function(lambda a: matrix_multiply(a, a, backend=name), matrix, repeats=repeats) for matrix in matrices]
+             for name, (_, _, available) in BACKENDS.items() if available()}
+    thresholds = dict(BACKEND_THRESHOLDS)
+    for name, backend_times in times.items():
+        if name == 'python':
+            continue
+        thresholds[name] = float('inf')
+        for n, backend_time, python_time in reversed(list(zip(sizes, backend_times, times['python']))):
+            if backend_time >= python_time:
+                break
+            thresholds[name] = n ** 3
+        print(f"Backend {name}: " + ", ".join(f"{n}: {t / p:.2f}x" for n, t, p in zip(sizes, backend_times, times['python'])) + " of the Python time")
+    print(f"BACKEND_THRESHOLDS = {thresholds}")
+    return thresholds
+
+def tune_strassen(sizes=(256, 512), leaves=(16, 32, 64, 128, 256), repeats=3):
+    """Finds the Strassen leaf size that is fastest on this machine.
+
+    Every candidate leaf is timed on random square matrices of each size, and the one with the smallest
+    total time wins, provided it beats the tiled classical kernel; otherwise the largest size is returned,
+    so that Strassen never recurses on the sizes tried. Set STRASSEN_LEAF in matmul_correct.py to the result.
+    """
+    matrices = [(generate_random_matrix(n, n), generate_random_matrix(n, n)) for n in sizes]
+    classical = sum(time_function(multiply_blocked, a, b, repeats=repeats) for a, b in matrices)
+    print(f"Classical tiled kernel: {classical:.6f} seconds")
+    best_leaf, best_time = max(sizes), classical
+    for leaf in leaves:
+        total = sum(time_function(multiply_strassen, a, b, leaf, repeats=repeats) for a, b in matrices)
+        print(f"Strassen leaf {leaf}: {total:.6f} seconds, speedup {classical / total:.2f}x")
+        if total < best_time:
+            best_leaf, best_time = leaf, total
+    print(f"Best leaf size: {best_leaf}")
+    return best_leaf
+
+def parse_shape(text):
+    """Reads a shape given as N for a square product or as ROWSxINNERxCOLS."""
+    parts = [int(part) for part in text.lower().split('x')]
+    if len(parts) == 1:
+        return (parts[0],) * 3
+    if len(parts) != 3:
+        raise argparse.ArgumentTypeError("expected N or ROWSxINNERxCOLS")
+    return tuple(parts)
+
+def main(argv=None):
+    """Command line entry point, writes the report as JSON and returns 1 when a regression is found."""
+    parser = argparse.ArgumentParser(description="Benchmark the matrix multiply kernels.")
+    parser.add_argument("--shapes", nargs="+", type=parse_shape, default=None, help="N or ROWSxINNERxCOLS, the default suite when left out")
+    parser.add_argument("--kernels", nargs="+", choices=list(kernels()), default=None, help="kernels to run, all by default")
+    parser.add_argument("--kind", choices=('float', 'int'), default='float', help="element type of the matrices")
+    parser.add_argument("--python-max-work", type=lambda text: int(float(text)), default=PYTHON_MAX_WORK, help="largest product given to pure Python kernels")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="seconds the timed runs of a measurement add up to")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random matrices")
+    parser.add_argument("-o", "--output", default=None, help="file to write the JSON report to (default: stdout)")
+    parser.add_argument("--csv", default=None, help="file to also write the results to as CSV")
+    parser.add_argument("--baseline", default=None, help="earlier JSON report to check for regressions against")
+    parser.add_argument("--ratio", type=float, default=REGRESSION_RATIO, help="slowdown counted as a regression")
+    parser.add_argument("--calibrate", action="store_true", help="measure the BACKEND_THRESHOLDS of matmul_correct.py instead")
+    parser.add_argument("--tune-strassen", action="store_true", help="measure the STRASSEN_LEAF of matmul_correct.py instead")
+    args = parser.parse_args(argv)
+
+    if args.calibrate:
+        calibrate_backends()
+        return 0
+    if args.tune_strassen:
+        tune_strassen()
+        return 0
+
+    shapes = args.shapes or [(n, n, n) for n in DEFAULT_SIZES] + list(DEFAULT_SHAPES)
+    report = run_suite(shapes, args.kernels, args.kind, args.python_max_work, args.min_time, not args.no_memory, args.seed, verbose=True)
+    status = 0
+    if args.baseline is not None:
+        with open(args.baseline) as filehandle:
+            report['regressions'] = compare(report, json.load(filehandle), args.ratio)
+        for line in report['regressions']:
+            print("regression: " + line, file=sys.stderr)
+        status = 1 if report['regressions'] else 0
+    if args.csv is not None:
+        write_csv(report, args.csv)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as filehandle:
+            json.dump(report, filehandle, indent=2)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,28 @@
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
 import unittest
-from matmul_correct import matrix_multiply
+from unittest import mock
+from multiprocessing import shared_memory
+import matmul_correct
+from matmul_correct import BACKENDS, multiply_files, write_matrix_file, batch_matrix_multiply, matrix_chain_multiply, matrix_chain_order, CSRMatrix, DOKMatrix, Matrix, check_validity, choose_backend, register_backend, matrix_multiply, multiply, multiply_blocked, multiply_parallel, multiply_sparse, multiply_strassen, scan_matrix, share_matrix, unshare_matrix
 
 class TestMatrixMultiplication(unittest.TestCase):
 
+    def assertMatricesAlmostEqual(self, result, expected, rel=1e-10):
+        # Kernels which add the products in another order, or with compensated summation as sum() does
+        # from Python 3.12 on, only agree with multiply up to rounding on floats, integers stay exact
+        self.assertEqual([len(row) for row in result], [len(row) for row in expected])
+        for row, expected_row in zip(result, expected):
+            for value, reference in zip(row, expected_row):
+                if type(value) is int and type(reference) is int:
+                    self.assertEqual(value, reference)
+                else:
+                    self.assertLessEqual(abs(value - reference), rel * max(1, abs(reference)))
+
     def test_square_matrices(self):
         matrix1 = [[1, 2], [3, 4]]
         matrix2 = [[5, 6], [7, 8]]
@@ -162,5 +182,389 @@ class TestMatrixMultiplication(unittest.TestCase):
         result = [[complex(0, 0), complex(0, 0)], [complex(0, 0), complex(0, 0)]]
         self.assertEqual(matrix_multiply(matrix1, matrix2), result)
 
+    def test_blocked_matches_reference(self):
+        rng = random.Random(0)
+        for make in (lambda: rng.randint(-100, 100), rng.random, lambda: complex(rng.random(), rng.random())):
+            matrix1 = [[make() for _ in range(37)] for _ in range(23)]
+            matrix2 = [[make() for _ in range(41)] for _ in range(37)]
+            for tile in (1, 5, 32, 64):
+                self.assertMatricesAlmostEqual(multiply_blocked(matrix1, matrix2, tile), multiply(matrix1, matrix2))
+
+    def test_blocked_keeps_integers_exact(self):
+        matrix1 = [[10**30, 1], [1, -10**30]]
+        matrix2 = [[3, 10**30], [10**30, 7]]
+        result = matrix_multiply(matrix1, matrix2)
+        self.assertEqual(result, [[4 * 10**30, 10**60 + 7], [3 - 10**60, 10**30 - 7 * 10**30]])
+        self.assertTrue(all(type(element) is int for row in result for element in row))
+
+    def test_strassen_is_exact_for_integers(self):
+        rng = random.Random(2)
+        # Odd sizes pad on the way down and rectangular shapes pad up to a square
+        for rows, inner, cols in ((1, 1, 1), (8, 8, 8), (33, 33, 33), (17, 40, 9), (5, 2, 30)):
+            matrix1 = [[rng.randint(-10**12, 10**12) for _ in range(inner)] for _ in range(rows)]
+            matrix2 = [[rng.randint(-10**12, 10**12) for _ in range(cols)] for _ in range(inner)]
+            for leaf in (2, 3, 16):
+                self.assertEqual(multiply_strassen(matrix1, matrix2, leaf), multiply(matrix1, matrix2))
+        self.assertEqual(matrix_multiply([[1, 2], [3, 4]], [[5, 6], [7, 8]], strassen=True), [[19, 22], [43, 50]])
+
+    def test_strassen_floats_and_complex(self):
+        rng = random.Random(3)
+        for make in (rng.random, lambda: complex(rng.random(), rng.random())):
+            matrix1 = [[make() for _ in range(45)] for _ in range(45)]
+            matrix2 = [[make() for _ in range(45)] for _ in range(45)]
+            for row, expected in zip(multiply_strassen(matrix1, matrix2, 4), multiply(matrix1, matrix2)):
+                for value, reference in zip(row, expected):
+                    self.assertAlmostEqual(abs(value - reference), 0, places=10)
+
+    def test_matrix_round_trip_and_views(self):
+        matrix = Matrix.from_lists([[1, 2, 3], [4, 5, 6]])
+        self.assertEqual((matrix.shape, matrix.typecode, matrix.data.itemsize), ((2, 3), 'q', 8))
+        self.assertEqual(matrix.tolist(), [[1, 2, 3], [4, 5, 6]])
+        self.assertEqual(Matrix.from_lists([[1, 2.5]]).typecode, 'd')
+        self.assertEqual(Matrix.from_lists([[2**53, 0.5]]).typecode, 'd')
+        # Integers are never rounded into doubles
+        for lossy in ([[2**63]], [[-2**63 - 1, 1]], [[2**53 + 1, 0.5]]):
+            with self.assertRaises(OverflowError):
+                Matrix.from_lists(lossy)
+        # Row views and the two dimensional view share the storage
+        row = matrix.row(1)
+        matrix[1, 0] = 7
+        self.assertEqual(row.tolist(), [7, 5, 6])
+        self.assertEqual(matrix.memoryview()[1, 2], 6)
+        matrix.memoryview()[0, 0] = 9
+        self.assertEqual(matrix[0, 0], 9)
+        with self.assertRaises(IndexError):
+            matrix[2, 0]
+        with self.assertRaises(ValueError):
+            Matrix(2, 2, [1, 2, 3])
+        with self.assertRaises(TypeError):
+            Matrix.from_lists([[1j]])
+
+    def test_matrix_multiply_natively(self):
+        rng = random.Random(4)
+        for make in (rng.random, lambda: rng.randint(-1000, 1000)):
+            lists1 = [[make() for _ in range(17)] for _ in range(9)]
+            lists2 = [[make() for _ in range(12)] for _ in range(17)]
+            product = multiply(Matrix.from_lists(lists1), Matrix.from_lists(lists2))
+            self.assertIsInstance(product, Matrix)
+            self.assertMatricesAlmostEqual(product.tolist(), multiply(lists1, lists2))
+        self.assertEqual(matrix_multiply(Matrix.from_lists([[1, 2], [3, 4]]), [[5, 6], [7, 8]]).tolist(), [[19, 22], [43, 50]])
+        self.assertEqual(multiply(Matrix.from_lists([[1, 2]]), Matrix.from_lists([[0.5], [1]])).tolist(), [[2.5]])
+        with self.assertRaises(ValueError):
+            multiply(Matrix.from_lists([[1, 2]]), Matrix.from_lists([[1, 2]]))
+        with self.assertRaises(OverflowError):
+            multiply(Matrix.from_lists([[2**62]]), Matrix.from_lists([[4]]))
+        with self.assertRaises(OverflowError):
+            matrix_multiply(Matrix.from_lists([[1]]), [[2**64 + 1]])
+
+    def test_validation(self):
+        self.assertEqual(matmul_correct.test_matrices([[1, 2, 3]], [[1], [2.5], [3j]]), (1, 3, 1))
+        # Ragged rows are reported before element types, as before
+        with self.assertRaises(ValueError):
+            check_validity([[1, "a"], [1]])
+        for bad in ([[1, True]], [[1, None]], [[1], ["1"]]):
+            with self.assertRaises(TypeError):
+                check_validity(bad)
+        check_validity([])
+
+    def test_trusted_skips_validation(self):
+        matrix1 = [[1, 2], [3, 4]]
+        matrix2 = [[5, 6], [7, 8]]
+        self.assertEqual(matrix_multiply(matrix1, matrix2, trusted=True), [[19, 22], [43, 50]])
+        # Without validation booleans are simply multiplied
+        self.assertEqual(matrix_multiply([[True]], [[2]], trusted=True), [[2]])
+
+    def test_backends_agree(self):
+        rng = random.Random(5)
+        ints1 = [[rng.randint(-1000, 1000) for _ in range(12)] for _ in range(10)]
+        ints2 = [[rng.randint(-1000, 1000) for _ in range(8)] for _ in range(12)]
+        floats = [[rng.random() for _ in range(12)] for _ in range(12)]
+        for name, (_, types, available) in BACKENDS.items():
+            if not available():
+                continue
+            if int in types:
+                result = matrix_multiply(ints1, ints2, backend=name)
+                self.assertEqual(result, multiply(ints1, ints2))
+                self.assertTrue(all(type(element) is int for row in result for element in row))
+            for row, expected in zip(matrix_multiply(floats, floats, backend=name), multiply(floats, floats)):
+                for value, reference in zip(row, expected):
+                    self.assertAlmostEqual(value, reference, places=12)
+
+    def test_auto_backend_keeps_integers_exact(self):
+        big = [[10**18] * 8 for _ in range(8)]
+        self.assertEqual(choose_backend('auto', big, big, 8**3), 'python')
+        self.assertEqual(matrix_multiply(big, big), [[8 * 10**36] * 8 for _ in range(8)])
+        self.assertEqual(choose_backend('auto', [[1]], [[1]], 1), 'python')
+        # Integers mixed with floats only go to the double precision kernels while a double holds them
+        mixed = [[1.5 if i == j else 0 for j in range(8)] for i in range(8)]
+        identity = [[int(i == j) for j in range(8)] for i in range(8)]
+        fast = 'numpy' if BACKENDS['numpy'][2]() else 'python'
+        self.assertEqual(choose_backend('auto', mixed, identity, 8**3), fast)
+        mixed[0][0] = 2**60 + 1
+        self.assertEqual(choose_backend('auto', mixed, identity, 8**3), 'python')
+        self.assertEqual(matrix_multiply(mixed, identity)[0][0], 2**60 + 1)
+        mixed[0][0] = 2.0**60
+        self.assertEqual(choose_backend('auto', mixed, identity, 8**3), fast)
+        with self.assertRaises(ValueError):
+            matrix_multiply([[2**60 + 1, 0.5]], [[1], [1]], backend='array')
+        with self.assertRaises(ValueError):
+            matrix_multiply(big, big, backend='numpy')
+        with self.assertRaises(ValueError):
+            matrix_multiply([[1]], [[1]], backend='fortran')
+
+    def test_trusted_products_are_not_scanned(self):
+        rng = random.Random(12)
+        shapes = (9, 8, 10, 7, 8, 9)
+        matrices = [[[rng.random() for _ in range(cols)] for _ in range(rows)] for rows, cols in zip(shapes, shapes[1:])]
+        with mock.patch.object(matmul_correct, 'scan_matrix', wraps=scan_matrix) as scan:
+            # Every matrix of the chain is scanned once, and none of the intermediate products
+            product = matrix_chain_multiply(matrices)
+            self.assertEqual(scan.call_count, len(matrices))
+            scan.reset_mock()
+            matrix_chain_multiply(matrices, trusted=True)
+            matrix_multiply(matrices[0], matrices[1], trusted=True)
+            matrix_multiply(matrices[0], matrices[1], trusted=True, types={float})
+            self.assertEqual(scan.call_count, 0)
+        expected = matrices[0]
+        for matrix in matrices[1:]:
+            expected = multiply(expected, matrix)
+        self.assertMatricesAlmostEqual(product, expected)
+
+    @unittest.skipIf(matmul_correct._cython_kernel() is None, "Cython is not installed")
+    def test_cython_backend(self):
+        # The kernel was compiled without leaving the pyximport hooks installed
+        self.assertFalse(any(type(finder).__module__.startswith('pyximport') for finder in sys.meta_path))
+        rng = random.Random(13)
+        matrix1 = [[rng.random() for _ in range(21)] for _ in range(15)]
+        matrix2 = [[rng.random() for _ in range(18)] for _ in range(21)]
+        self.assertEqual(choose_backend('cython', matrix1, matrix2, 15 * 21 * 18), 'cython')
+        self.assertMatricesAlmostEqual(matrix_multiply(matrix1, matrix2, backend='cython'), multiply(matrix1, matrix2))
+        with self.assertRaises(ValueError):
+            matrix_multiply([[1, 2]], [[3], [4]], backend='cython')
+
+    def test_backend_chosen_once(self):
+        # A sparse integer product large enough for the sparse kernels checks its integers a single time
+        matrix = [[0] * 40 for _ in range(40)]
+        matrix[3][5] = 7
+        with mock.patch.object(matmul_correct, 'fits_int64', wraps=matmul_correct.fits_int64) as fits:
+            self.assertEqual(matrix_multiply(matrix, matrix), multiply(matrix, matrix))
+            self.assertLessEqual(fits.call_count, 1)
+
+    def test_calibration_keeps_every_threshold(self):
+        import bench
+        unavailable = dict(BACKENDS, cython=(BACKENDS['cython'][0], BACKENDS['cython'][1], lambda: False))
+        with mock.patch.dict(BACKENDS, unavailable), mock.patch('builtins.print'):
+            thresholds = bench.calibrate_backends(sizes=(2, 4), repeats=1)
+        self.assertLessEqual(set(matmul_correct.BACKEND_THRESHOLDS), set(thresholds))
+        self.assertEqual(thresholds['cython'], matmul_correct.BACKEND_THRESHOLDS['cython'])
+
+    def test_register_backend(self):
+        calls = []
+        register_backend('recording', lambda a, b: calls.append(1) or multiply(a, b), types=(int,))
+        try:
+            self.assertEqual(matrix_multiply([[1, 2]], [[3], [4]], backend='recording'), [[11]])
+            self.assertEqual(calls, [1])
+            with self.assertRaises(ValueError):
+                matrix_multiply([[1.5]], [[2]], backend='recording')
+        finally:
+            del BACKENDS['recording']
+
+    def test_sparse_formats(self):
+        lists = [[0, 2, 0], [0, 0, 0], [1.5, 0, 3j]]
+        self.assertEqual(scan_matrix(lists), ({int, float, complex}, 3))
+        dok = DOKMatrix.from_lists(lists)
+        csr = CSRMatrix.from_lists(lists)
+        self.assertEqual((dok.nnz, csr.nnz, list(csr.indptr), list(csr.indices)), (3, 3, [0, 1, 1, 3], [1, 0, 2]))
+        self.assertEqual(dok.tolist(), lists)
+        self.assertEqual(csr.tolist(), lists)
+        self.assertEqual(dok.tocsr(), csr)
+        self.assertEqual(csr.todok(), dok)
+        dok[0, 1] = 0
+        self.assertEqual((dok.nnz, dok[0, 1], dok[2, 2]), (2, 0, 3j))
+        with self.assertRaises(IndexError):
+            dok[3, 0] = 1
+        with self.assertRaises(TypeError):
+            dok[0, 0] = "1"
+
+    def test_sparse_multiply_matches_reference(self):
+        rng = random.Random(6)
+        def sparse_matrix(rows, cols, make):
+            return [[make() if rng.random() < 0.1 else 0 for _ in range(cols)] for _ in range(rows)]
+        for make in (lambda: rng.randint(-10**20, 10**20), rng.random):
+            sparse1, sparse2 = sparse_matrix(30, 40, make), sparse_matrix(40, 20, make)
+            dense1 = [[make() for _ in range(30)] for _ in range(10)]
+            dense2 = [[make() for _ in range(20)] for _ in range(40)]
+            csr1, csr2 = CSRMatrix.from_lists(sparse1), CSRMatrix.from_lists(sparse2)
+            # Sparse times dense, dense times sparse and sparse times sparse all add up like multiply
+            self.assertEqual(multiply_sparse(csr1, dense2), multiply(sparse1, dense2))
+            self.assertEqual(multiply_sparse(dense1, csr1), multiply(dense1, sparse1))
+            self.assertEqual(multiply_sparse(csr1, csr2).tolist(), multiply(sparse1, sparse2))
+            self.assertEqual(matrix_multiply(DOKMatrix.from_lists(sparse1), csr2).tolist(), multiply(sparse1, sparse2))
+            self.assertEqual(matrix_multiply(sparse1, dense2, sparse=True), multiply(sparse1, dense2))
+        with self.assertRaises(ValueError):
+            multiply_sparse(csr1, csr1)
+
+    def test_sparsity_detected_during_validation(self):
+        # Integers too large for numpy stay with pure Python, which the sparse kernels replace
+        matrix = [[10**20 if i == j else 0 for j in range(40)] for i in range(40)]
+        with mock.patch("matmul_correct.multiply_sparse", wraps=matmul_correct.multiply_sparse) as sparse:
+            self.assertEqual(matrix_multiply(matrix, matrix), [[10**40 if i == j else 0 for j in range(40)] for i in range(40)])
+            self.assertEqual(sparse.call_count, 1)
+            matrix_multiply(matrix, matrix, sparse=False)
+            matrix_multiply(matrix, matrix, trusted=True)
+            self.assertEqual(sparse.call_count, 1)
+
+    def test_parallel_matches_reference(self):
+        rng = random.Random(1)
+        # Floats, integers and complex numbers go through shared memory, mixed and huge values do not
+        for make in (rng.random, lambda: rng.randint(-100, 100), lambda: complex(rng.random(), rng.random()),
+                     lambda: rng.choice((1, 2.5, 10**30))):
+            matrix1 = [[make() for _ in range(19)] for _ in range(13)]
+            matrix2 = [[make() for _ in range(11)] for _ in range(19)]
+            self.assertMatricesAlmostEqual(multiply_parallel(matrix1, matrix2, workers=2), multiply(matrix1, matrix2))
+        matrix = [[rng.random() for _ in range(100)] for _ in range(100)]
+        self.assertMatricesAlmostEqual(matrix_multiply(matrix, matrix, parallel=True, workers=2), multiply(matrix, matrix))
+        # A single process never starts a pool, whether asked for or all the host has
+        with mock.patch.object(matmul_correct, 'Pool') as pool, mock.patch.object(matmul_correct.os, 'cpu_count', return_value=1):
+            self.assertMatricesAlmostEqual(matrix_multiply(matrix, matrix, parallel=True), multiply(matrix, matrix))
+            self.assertMatricesAlmostEqual(multiply_parallel(matrix, matrix), multiply(matrix, matrix))
+            self.assertMatricesAlmostEqual(multiply_parallel(matrix, matrix, workers=1), multiply(matrix, matrix))
+            pool.assert_not_called()
+        with self.assertRaises(ValueError):
+            matrix_multiply([[1, 2]], [[1, 2]], parallel=True)
+
+    def test_shared_matrix_round_trip(self):
+        matrix = [[1, -2**63], [2**63 - 1, 0]]
+        block, description = share_matrix(matrix)
+        try:
+            self.assertEqual(unshare_matrix(description), matrix)
+        finally:
+            block.close()
+            block.unlink()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=description[1])
+        self.assertEqual(share_matrix([[2**63]]), (None, ('list', [[2**63]])))
+
+    def test_batch_matrix_multiply(self):
+        rng = random.Random(7)
+        # Small batches stay in Python, large ones of one shape are stacked, huge integers never are
+        for count, make in ((3, rng.random), (40, rng.random), (40, lambda: rng.randint(-9, 9)), (40, lambda: 10**30 + rng.randint(0, 9))):
+            matrices1 = [[[make() for _ in range(3)] for _ in range(4)] for _ in range(count)]
+            matrices2 = [[[make() for _ in range(2)] for _ in range(3)] for _ in range(count)]
+            expected = [multiply(a, b) for a, b in zip(matrices1, matrices2)]
+            result = batch_matrix_multiply(matrices1, matrices2)
+            for product, reference in zip(result, expected):
+                for row, reference_row in zip(product, reference):
+                    for value, reference_value in zip(row, reference_row):
+                        if type(reference_value) is int:
+                            self.assertEqual((type(value), value), (int, reference_value))
+                        else:
+                            self.assertAlmostEqual(value, reference_value, places=12)
+            # Results are written into the rows of an earlier result
+            rows = [row for product in result for row in product]
+            self.assertIs(batch_matrix_multiply(matrices1, matrices2, out=result), result)
+            self.assertTrue(all(a is b for a, b in zip(rows, (row for product in result for row in product))))
+        mixed = batch_matrix_multiply([[[1, 2]], [[1], [2]]], [[[3], [4]], [[5, 6]]])
+        self.assertEqual(mixed, [[[11]], [[5, 6], [10, 12]]])
+        with self.assertRaises(ValueError):
+            batch_matrix_multiply([[[1, 2]]], [[[1, 2]]])
+        with self.assertRaises(ValueError):
+            batch_matrix_multiply([[[1]]], [])
+        with self.assertRaises(TypeError):
+            batch_matrix_multiply([[[1]]], [[["2"]]])
+
+    def test_matrix_chain_multiply(self):
+        # The textbook example, best split as (A1 (A2 A3)) ((A4 A5) A6)
+        cost, split = matrix_chain_order([30, 35, 15, 5, 10, 20, 25])
+        self.assertEqual((cost, split[0][5], split[0][2], split[3][5]), (15125, 2, 0, 4))
+        self.assertEqual(matrix_chain_order([10, 100, 5, 50])[0], 7500)
+        rng = random.Random(8)
+        dims = [7, 30, 2, 25, 3, 9]
+        matrices = [[[rng.randint(-10**12, 10**12) for _ in range(dims[i + 1])] for _ in range(dims[i])] for i in range(len(dims) - 1)]
+        expected = matrices[0]
+        for matrix in matrices[1:]:
+            expected = multiply(expected, matrix)
+        self.assertEqual(matrix_chain_multiply(matrices), expected)
+        self.assertEqual(matrix_chain_multiply([[[1, 2]]]), [[1, 2]])
+        with self.assertRaises(ValueError):
+            matrix_chain_multiply([[[1, 2]], [[1, 2]]])
+        with self.assertRaises(ValueError):
+            matrix_chain_multiply([])
+
+    def test_multiply_files(self):
+        rng = random.Random(9)
+        matrix1 = [[rng.random() for _ in range(53)] for _ in range(37)]
+        matrix2 = [[rng.random() for _ in range(29)] for _ in range(53)]
+        integers1 = [[rng.randint(-10**6, 10**6) for _ in range(30)] for _ in range(20)]
+        integers2 = [[rng.randint(-10**6, 10**6) for _ in range(10)] for _ in range(30)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = lambda name: os.path.join(directory, name)
+            write_matrix_file(matrix1, path('a.npy'), (37, 53))
+            write_matrix_file(iter(matrix2), path('b.bin'), (53, 29))
+            # A budget of a few kilobytes cuts the product into many small tiles
+            self.assertEqual(multiply_files(path('a.npy'), path('b.bin'), path('c.npy'), shape2=(53, 29), memory_budget=4000), (37, 29))
+            import numpy as np
+            for row, expected in zip(np.load(path('c.npy')).tolist(), multiply(matrix1, matrix2)):
+                for value, reference in zip(row, expected):
+                    self.assertAlmostEqual(value, reference, places=12)
+
+            write_matrix_file(integers1, path('i.npy'), (20, 30), 'int64')
+            write_matrix_file(integers2, path('j.npy'), (30, 10), 'int64')
+            multiply_files(path('i.npy'), path('j.npy'), path('k.bin'), memory_budget=5000)
+            self.assertEqual(np.fromfile(path('k.bin'), dtype='int64').reshape(20, 10).tolist(), multiply(integers1, integers2))
+
+            # Narrow integers are summed in 64 bits instead of wrapping around in their own width
+            write_matrix_file([[100000] * 4] * 4, path('narrow.npy'), (4, 4), 'int32')
+            multiply_files(path('narrow.npy'), path('narrow.npy'), path('wide.npy'))
+            self.assertEqual((np.load(path('wide.npy')).dtype, np.load(path('wide.npy')).tolist()), (np.int64, [[4 * 10**10] * 4] * 4))
+            write_matrix_file([[200] * 3] * 3, path('bytes.bin'), (3, 3), 'uint8')
+            multiply_files(path('bytes.bin'), path('bytes.bin'), path('sums.npy'), (3, 3), (3, 3), 'uint8')
+            self.assertEqual((np.load(path('sums.npy')).dtype, np.load(path('sums.npy')).tolist()), (np.uint64, [[120000] * 3] * 3))
+
+            # Signed times unsigned 64 bit integers stay exact integers instead of becoming doubles
+            write_matrix_file([[2**31 + 1, -1], [3, 2**31]], path('signed.npy'), (2, 2), 'int64')
+            write_matrix_file([[2**30 + 1, 5], [7, 2**30]], path('unsigned.npy'), (2, 2), 'uint64')
+            multiply_files(path('signed.npy'), path('unsigned.npy'), path('mixed.npy'))
+            self.assertEqual((np.load(path('mixed.npy')).dtype, np.load(path('mixed.npy')).tolist()),
+                             (np.int64, multiply([[2**31 + 1, -1], [3, 2**31]], [[2**30 + 1, 5], [7, 2**30]])))
+            write_matrix_file([[2**63], [0]], path('huge.npy'), (2, 1), 'uint64')
+            with self.assertRaises(OverflowError):
+                multiply_files(path('signed.npy'), path('huge.npy'), path('out.npy'))
+
+            write_matrix_file([[2**40] * 3] * 3, path('big.npy'), (3, 3), 'int64')
+            with self.assertRaises(OverflowError):
+                multiply_files(path('big.npy'), path('big.npy'), path('out.npy'))
+            with self.assertRaises(ValueError):
+                multiply_files(path('a.npy'), path('a.npy'), path('out.npy'))
+            with self.assertRaises(ValueError):
+                multiply_files(path('a.npy'), path('b.bin'), path('out.npy'))
+            with self.assertRaises(ValueError):
+                write_matrix_file([[1, 2]], path('bad.npy'), (1, 3))
+
+    def test_benchmark_suite(self):
+        import bench
+        stats = bench.measure(sum, range(100), min_time=0.001)
+        self.assertGreaterEqual(stats['repeats'], bench.MIN_REPEATS)
+        self.assertTrue(0 <= stats['min'] <= stats['median'] and stats['iqr'] >= 0 and stats['peak_memory'] >= 0)
+        self.assertEqual(bench.parse_shape('16x1024x16'), (16, 1024, 16))
+
+        report = bench.run_suite([(4, 4, 4), (2, 8, 3)], ['python', 'numpy-dot'], min_time=0.001)
+        self.assertEqual([(entry['kernel'], entry['cols']) for entry in report['results']],
+                         [('python', 4), ('numpy-dot', 4), ('python', 3), ('numpy-dot', 3)])
+        self.assertEqual(bench.compare(report, report), [])
+        slower = copy.deepcopy(report)
+        slower['results'][0]['median'] = 1.0
+        self.assertEqual(len(bench.compare(slower, report)), 1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline, table = os.path.join(directory, 'baseline.json'), os.path.join(directory, 'results.csv')
+            arguments = ['--shapes', '4', '--kernels', 'python', '--min-time', '0.001', '--no-memory']
+            self.assertEqual(bench.main(arguments + ['-o', baseline, '--csv', table]), 0)
+            with open(table) as filehandle:
+                self.assertEqual(filehandle.readline().strip(), ','.join(bench.CSV_FIELDS))
+            with open(baseline) as filehandle:
+                self.assertEqual(json.load(filehandle)['results'][0]['kernel'], 'python')
+            self.assertEqual(bench.main(arguments + ['--baseline', baseline, '-o', os.path.join(directory, 'new.json')]), 0)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,45 @@
-from typing import List, Union
+import importlib
+import os
+import sys
+from array import array
+from multiprocessing import Pool, shared_memory
+from itertools import repeat
+from operator import add, mul, sub
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+# Number of columns of the second matrix multiplied against every row of the first before moving on to
+# the next ones, few enough for the elements of the tile to stay in the CPU caches
+TILE_SIZE = 32
+
+# Number of multiply-adds below which parallel=True still multiplies in the calling process, as starting
+# the pool costs more than the product
+PARALLEL_MIN_WORK = 100 * 100 * 100
+
+# Size at and below which multiply_strassen hands blocks over to the tiled kernel, measured with
+# bench.py --tune-strassen, as the seven products only win once the saved n^3 work outweighs the
+# eighteen extra additions of a level
+STRASSEN_LEAF = 128
+
+# The element types a matrix may hold, bool and numeric subclasses are rejected as by isnum
+NUMERIC_TYPES = frozenset((int, float, complex))
+
+# Number of multiply-adds from which backend='auto' hands a product to each backend, tried in this order,
+# as measured with bench.py --calibrate. The array backend only pays off for operands which already are
+# Matrix objects, converting lists costs it more than it saves, so it is never picked automatically
+BACKEND_THRESHOLDS = {'numpy': 4 * 4 * 4, 'cython': 4 * 4 * 4, 'array': float('inf')}
+
+# Fraction of nonzero elements at or below which matrix_multiply switches to the sparse kernels
+SPARSE_DENSITY = 0.05
+
+# Number of multiply-adds below which matrix_multiply never switches to the sparse kernels, as converting
+# the operands costs more than it saves
+SPARSE_MIN_WORK = 32 * 32 * 32
+
+# Number of pairs of one shape from which batch_matrix_multiply stacks them into a single numpy product
+BATCH_NUMPY_MIN = 16
+
+# Bytes the tiles of multiply_files may hold in memory at once
+MEMORY_BUDGET = 64 * 1024 * 1024
 
 
 def matrix_shape(matrix: List[List]) -> List:
@@ -40,34 +81,59 @@ def isnum(x: Union[int, float, complex]) -> None:
         raise TypeError
 
 
-def check_validity(matrix: List[List[Union[int, float, complex]]]) -> None:
-    """Checks the validity of the matrix.
+def scan_matrix(matrix: List[List[Union[int, float, complex]]]) -> Tuple[set, int]:
+    """Validates a matrix in a single pass, returning its element types and its number of nonzero elements.
 
     Parameters:
     matrix(List[List[Union[int, float, complex]]]): The matrix to be validated.
 
     Returns:
-    None
+    Tuple[set, int]: The types of the elements, which backends are chosen by, and the number of nonzero
+    elements, which decides whether the sparse kernels are used.
 
-    This function raises a ValueError if all the rows of the matrix do not have
-    an equal number of elements or if the matrix contains non-numeric elements.
+    Raises the errors of check_validity. The types of every row are collected at C speed with
+    map(type, row) instead of calling isnum on each element, and checked once at the end, while
+    row.count(0) counts the zeros of every type, as 0 == 0.0 == 0j.
     """
 
-    # Checking if all the rows have an equal number of elements (columns)
-    for i in range(len(matrix) - 1):
-        if not (len(matrix[i]) == len(matrix[i + 1])):
+    cols = len(matrix[0]) if len(matrix) else 0
+    types = set()
+    zeros = 0
+    for row in matrix:
+        # Checking if all the rows have an equal number of elements (columns)
+        if len(row) != cols:
             raise ValueError
+        types.update(map(type, row))
+        zeros += row.count(0)
 
     # Checking if all the elements of the matrix are numeric
-    for row in matrix:
-        for element in row:
-            isnum(element)
+    if not types <= NUMERIC_TYPES:
+        raise TypeError
+
+    return types, len(matrix) * cols - zeros
+
+
+def check_validity(matrix: List[List[Union[int, float, complex]]]) -> set:
+    """Checks the validity of the matrix.
+
+    Parameters:
+    matrix(List[List[Union[int, float, complex]]]): The matrix to be validated.
+
+    Returns:
+    set: The types of the elements, which backends are chosen by.
+
+    This function raises a ValueError if all the rows of the matrix do not have
+    an equal number of elements or a TypeError if the matrix contains non-numeric elements.
+    The work is done by the single pass of scan_matrix.
+    """
+
+    return scan_matrix(matrix)[0]
 
 
 def test_matrices(
     matrix1: List[List[Union[int, float, complex]]],
     matrix2: List[List[Union[int, float, complex]]],
-) -> None:
+) -> Tuple[int, int, int]:
     """Checks compatibility and validity of two matrices for multiplication.
 
     Parameters:
@@ -75,21 +141,33 @@ def test_matrices(
     matrix2(List[List[Union[int, float, complex]]]): The second matrix.
 
     Returns:
-    None
+    Tuple[int, int, int]: The rows of the first matrix, its columns and the columns of the second,
+    so that callers do not have to work the shapes out again.
 
     This function checks whether the matrices are valid and compatible for multiplication.
     Raises a ValueError if they are not.
     """
 
-    check_validity(
+    return _check_pair(matrix1, matrix2)[:3]
+
+
+def _check_pair(
+    matrix1: List[List[Union[int, float, complex]]],
+    matrix2: List[List[Union[int, float, complex]]],
+) -> Tuple[int, int, int, set, int, int]:
+    # test_matrices, also returning the element types of both matrices and their numbers of nonzeros
+    types1, nonzeros1 = scan_matrix(
         matrix1
     )  # Checking for uniform rows and columns, non-numeric elements
-    check_validity(matrix2)
+    types2, nonzeros2 = scan_matrix(matrix2)
 
-    if not matrix_shape(matrix1)[1] == matrix_shape(matrix2)[0]:
+    rows, inner = matrix_shape(matrix1)
+    if not inner == matrix_shape(matrix2)[0]:
         # Checking for shape compatibility and empty matrices
         raise ValueError
 
+    return rows, inner, len(matrix2[0]), types1 | types2, nonzeros1, nonzeros2
+
 
 def init_result(rows: int, cols: int) -> List[List[int]]:
     """Initializes a result matrix with all elements set to zero.
@@ -110,6 +188,149 @@ def init_result(rows: int, cols: int) -> List[List[int]]:
     return res
 
 
+class Matrix:
+    """A dense matrix stored row by row in one flat typed array.
+
+    Parameters:
+    rows(int): The number of rows.
+    cols(int): The number of columns.
+    data(Iterable[Union[int, float]]): The elements row by row, zeros when left out.
+    typecode(str): 'd' for doubles or 'q' for signed 64 bit integers.
+
+    Every element takes 8 bytes instead of the 8 byte pointer plus 24 to 32 byte number object of a list
+    of lists, and a row is a contiguous slice of the array. Rows are handed out as memoryviews sharing
+    the storage, and the whole matrix as a two dimensional memoryview or through __array_interface__,
+    so numpy.asarray wraps it without copying. Complex numbers have no typed array and stay in lists.
+    """
+
+    __slots__ = ('rows', 'cols', 'data')
+
+    TYPECODES = {'d': 'f8', 'q': 'i8'}
+
+    def __init__(self, rows: int, cols: int, data=None, typecode: str = 'd'):
+        if typecode not in self.TYPECODES:
+            raise TypeError
+        if data is None:
+            data = array(typecode, bytes(8 * rows * cols))
+        elif not isinstance(data, array):
+            data = array(typecode, data)
+        elif data.typecode not in self.TYPECODES:
+            raise TypeError
+        if rows <= 0 or cols <= 0 or len(data) != rows * cols:
+            raise ValueError
+        self.rows = rows
+        self.cols = cols
+        self.data = data
+
+    @classmethod
+    def from_lists(cls, matrix: List[List[Union[int, float]]]) -> "Matrix":
+        """Copies a list of lists into a Matrix, of integers when every element is an int fitting 64 bits.
+
+        Integers are never rounded on the way in, one outside 64 bits, or one mixed with floats which a
+        double cannot hold exactly, raises an OverflowError.
+        """
+        check_validity(matrix)
+        rows, cols = matrix_shape(matrix)
+        values = [element for row in matrix for element in row]
+        if any(type(element) is complex for element in values):
+            raise TypeError
+        integers = [element for element in values if type(element) is int]
+        if any(not -2**63 <= element < 2**63 for element in integers):
+            raise OverflowError("integer element does not fit 64 bits")
+        if len(integers) == len(values):
+            return cls(rows, cols, values, 'q')
+        if any(float(element) != element for element in integers):
+            raise OverflowError("integer element mixed with floats does not fit a double exactly")
+        return cls(rows, cols, values, 'd')
+
+    def tolist(self) -> List[List[Union[int, float]]]:
+        values = self.data.tolist()
+        return [values[i * self.cols:(i + 1) * self.cols] for i in range(self.rows)]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.rows, self.cols
+
+    @property
+    def typecode(self) -> str:
+        return self.data.typecode
+
+    def row(self, i: int) -> memoryview:
+        """Returns row i as a one dimensional memoryview sharing the storage of the matrix."""
+        if not 0 <= i < self.rows:
+            raise IndexError
+        return memoryview(self.data)[i * self.cols:(i + 1) * self.cols]
+
+    def memoryview(self) -> memoryview:
+        """Returns the matrix as a rows x cols memoryview sharing its storage."""
+        return memoryview(self.data).cast('B').cast(self.typecode, (self.rows, self.cols))
+
+    @property
+    def __array_interface__(self) -> dict:
+        byteorder = '<' if sys.byteorder == 'little' else '>'
+        return {'shape': (self.rows, self.cols), 'typestr': byteorder + self.TYPECODES[self.typecode],
+                'data': (self.data.buffer_info()[0], False), 'version': 3}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __iter__(self) -> Iterator[memoryview]:
+        return (self.row(i) for i in range(self.rows))
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            i, j = index
+            if not (0 <= i < self.rows and 0 <= j < self.cols):
+                raise IndexError
+            return self.data[i * self.cols + j]
+        return self.row(index)
+
+    def __setitem__(self, index: Tuple[int, int], value: Union[int, float]) -> None:
+        i, j = index
+        if not (0 <= i < self.rows and 0 <= j < self.cols):
+            raise IndexError
+        self.data[i * self.cols + j] = value
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Matrix):
+            return self.shape == other.shape and self.data.tolist() == other.data.tolist()
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Matrix({self.rows}, {self.cols}, {self.data.tolist()!r}, {self.typecode!r})"
+
+
+def multiply_matrix(matrix1: Matrix, matrix2: Matrix) -> Matrix:
+    """Multiplies two Matrix objects into a new one.
+
+    Parameters:
+    matrix1(Matrix): The first matrix.
+    matrix2(Matrix): The second matrix.
+
+    Returns:
+    Matrix: The product, of integers when both factors are and of doubles otherwise.
+
+    The columns of the second matrix are gathered once with strided slices, and every row of the first
+    is read as one contiguous slice, so each element is turned into a Python number once rather than on
+    every multiplication, which would cost more than the multiplication itself. The dot products of a
+    row are appended straight to the typed array of the result. An integer product which does not fit
+    64 bits raises an OverflowError rather than losing precision.
+    """
+
+    if matrix1.cols != matrix2.rows:
+        raise ValueError
+    inner, cols = matrix1.cols, matrix2.cols
+    columns = [matrix2.data[j::cols].tolist() for j in range(cols)]
+    result = array('q' if matrix1.typecode == matrix2.typecode == 'q' else 'd')
+    for start in range(0, matrix1.rows * inner, inner):
+        row = matrix1.data[start:start + inner].tolist()
+        try:
+            result.extend([sum(map(mul, row, column)) for column in columns])
+        except OverflowError:
+            raise OverflowError("integer matrix product does not fit 64 bits") from None
+    return Matrix(matrix1.rows, cols, result)
+
+
 def multiply(
     matrix1: List[List[Union[int, float, complex]]],
     matrix2: List[List[Union[int, float, complex]]],
@@ -122,8 +343,13 @@ def multiply(
 
     Returns:
     List[List[Union[int, float, complex]]]: The resulting matrix after multiplication.
+
+    Two Matrix objects are multiplied natively with multiply_matrix.
     """
 
+    if isinstance(matrix1, Matrix) and isinstance(matrix2, Matrix):
+        return multiply_matrix(matrix1, matrix2)
+
     result = init_result(matrix_shape(matrix1)[0], matrix_shape(matrix2)[1])
 
     for i in range(len(result)):
@@ -136,24 +362,1062 @@ def multiply(
     return result
 
 
+def transpose(matrix: List[List[Union[int, float, complex]]]) -> List[Tuple[Union[int, float, complex], ...]]:
+    """Returns the columns of a matrix.
+
+    Parameters:
+    matrix(List[List[Union[int, float, complex]]]): The matrix to be transposed.
+
+    Returns:
+    List[Tuple[Union[int, float, complex], ...]]: The columns of the matrix, each as a tuple.
+    """
+
+    return list(zip(*matrix))
+
+
+def multiply_blocked(
+    matrix1: List[List[Union[int, float, complex]]],
+    matrix2: List[List[Union[int, float, complex]]],
+    tile: int = TILE_SIZE,
+) -> List[List[Union[int, float, complex]]]:
+    """Multiplies two matrices, visiting the columns of the second one tile by tile.
+
+    Parameters:
+    matrix1(List[List[Union[int, float, complex]]]): The first matrix.
+    matrix2(List[List[Union[int, float, complex]]]): The second matrix.
+    tile(int): The number of columns of the second matrix in a tile.
+
+    Returns:
+    List[List[Union[int, float, complex]]]: The resulting matrix after multiplication.
+
+    The second matrix is transposed once, so that every element of the result is the inner product of
+    two contiguous sequences, which sum(map(mul, ...)) computes without running any Python bytecode per
+    term. The sum starts from 0, so integers stay exact integers and complex numbers stay complex. Float
+    results agree with multiply up to rounding only, as sum() adds floats with compensated summation
+    from Python 3.12 on.
+    """
+
+    return multiply_columns(matrix1, transpose(matrix2), tile)
+
+
+def multiply_columns(
+    rows: List[List[Union[int, float, complex]]],
+    columns: List[Tuple[Union[int, float, complex], ...]],
+    tile: int = TILE_SIZE,
+) -> List[List[Union[int, float, complex]]]:
+    """Multiplies the rows of one matrix with the columns of another, see multiply_blocked.
+
+    Parameters:
+    rows(List[List[Union[int, float, complex]]]): The rows of the first matrix.
+    columns(List[Tuple[Union[int, float, complex], ...]]): The columns of the second matrix, as returned by transpose.
+    tile(int): The number of columns in a tile.
+
+    Returns:
+    List[List[Union[int, float, complex]]]: The rows of the product.
+    """
+
+    result = init_result(len(rows), len(columns))
+
+    for start in range(0, len(columns), tile):
+        block = columns[start:start + tile]
+        # Every row of the first matrix meets the same few columns in a row, which stay cached
+        for row, out in zip(rows, result):
+            out[start:start + tile] = [sum(map(mul, row, column)) for column in block]
+
+    return result
+
+
+def _combine(op, matrix1: List[List], matrix2: List[List]) -> List[List]:
+    return [list(map(op, row1, row2)) for row1, row2 in zip(matrix1, matrix2)]
+
+
+def _strassen(
+    matrix1: List[List[Union[int, float, complex]]],
+    matrix2: List[List[Union[int, float, complex]]],
+    leaf: int,
+) -> List[List[Union[int, float, complex]]]:
+    n = len(matrix1)
+    if n <= leaf:
+        return multiply_blocked(matrix1, matrix2)
+
+    # An odd size gets a zero row and column, dropped again from the product
+    odd = n % 2
+    if odd:
+        matrix1 = [row + [0] for row in matrix1] + [[0] * (n + 1)]
+        matrix2 = [row + [0] for row in matrix2] + [[0] * (n + 1)]
+    half = (n + odd) // 2
+
+    a11 = [row[:half] for row in matrix1[:half]]
+    a12 = [row[half:] for row in matrix1[:half]]
+    a21 = [row[:half] for row in matrix1[half:]]
+    a22 = [row[half:] for row in matrix1[half:]]
+    b11 = [row[:half] for row in matrix2[:half]]
+    b12 = [row[half:] for row in matrix2[:half]]
+    b21 = [row[:half] for row in matrix2[half:]]
+    b22 = [row[half:] for row in matrix2[half:]]
+
+    # Winograd's form of Strassen's algorithm, seven products and fifteen additions
+    s1 = _combine(add, a21, a22)
+    s2 = _combine(sub, s1, a11)
+    s3 = _combine(sub, a11, a21)
+    s4 = _combine(sub, a12, s2)
+    t1 = _combine(sub, b12, b11)
+    t2 = _combine(sub, b22, t1)
+    t3 = _combine(sub, b22, b12)
+    t4 = _combine(sub, t2, b21)
+
+    m1 = _strassen(a11, b11, leaf)
+    u2 = _combine(add, m1, _strassen(s2, t2, leaf))
+    u3 = _combine(add, u2, _strassen(s3, t3, leaf))
+    m5 = _strassen(s1, t1, leaf)
+    c11 = _combine(add, m1, _strassen(a12, b21, leaf))
+    c12 = _combine(add, _combine(add, u2, m5), _strassen(s4, b22, leaf))
+    c21 = _combine(sub, u3, _strassen(a22, t4, leaf))
+    c22 = _combine(add, u3, m5)
+
+    result = [row1 + row2 for row1, row2 in zip(c11, c12)] + [row1 + row2 for row1, row2 in zip(c21, c22)]
+    if odd:
+        result = [row[:n] for row in result[:n]]
+    return result
+
+
+def multiply_strassen(
+    matrix1: List[List[Union[int, float, complex]]],
+    matrix2: List[List[Union[int, float, complex]]],
+    leaf: int = STRASSEN_LEAF,
+) -> List[List[Union[int, float, complex]]]:
+    """Multiplies two matrices with Strassen's divide and conquer algorithm.
+
+    Parameters:
+    matrix1(List[List[Union[int, float, complex]]]): The first matrix.
+    matrix2(List[List[Union[int, float, complex]]]): The second matrix.
+    leaf(int): The size at and below which blocks are multiplied by multiply_blocked.
+
+    Returns:
+    List[List[Union[int, float, complex]]]: The resulting matrix after multiplication.
+
+    Both matrices are split into four blocks each, whose product takes seven block products instead of
+    eight, recursively, for O(n^2.81) work. Rectangular matrices are padded with zeros to a square and
+    blocks of odd size are padded by one row and column on the way down. Integers only ever get added,
+    subtracted and multiplied, so their product stays exact, while floats are rounded differently from
+    multiply and agree with it to the usual relative error of a few ulps times n.
+    """
+
+    rows, inner = matrix_shape(matrix1)
+    cols = len(matrix2[0])
+    n = max(rows, inner, cols)
+    if (rows, inner, cols) != (n, n, n):
+        matrix1 = [row + [0] * (n - inner) for row in matrix1] + [[0] * n for _ in range(n - rows)]
+        matrix2 = [row + [0] * (n - cols) for row in matrix2] + [[0] * n for _ in range(n - inner)]
+    result = _strassen(matrix1, matrix2, max(1, leaf))
+    return [row[:cols] for row in result[:rows]]
+
+
+class DOKMatrix:
+    """A sparse matrix kept as a dictionary from (row, column) to its nonzero elements.
+
+    Parameters:
+    rows(int): The number of rows.
+    cols(int): The number of columns.
+    entries(Dict[Tuple[int, int], Union[int, float, complex]]): The nonzero elements.
+
+    Cheap to build element by element, and converted with tocsr for multiplication.
+    """
+
+    __slots__ = ('rows', 'cols', 'entries')
+
+    def __init__(self, rows: int, cols: int, entries: Dict[Tuple[int, int], Union[int, float, complex]] = None):
+        if rows <= 0 or cols <= 0:
+            raise ValueError
+        self.rows = rows
+        self.cols = cols
+        self.entries = {}
+        for index, value in (entries or {}).items():
+            self[index] = value
+
+    @classmethod
+    def from_lists(cls, matrix: List[List[Union[int, float, complex]]]) -> "DOKMatrix":
+        check_validity(matrix)
+        rows, cols = matrix_shape(matrix)
+        result = cls(rows, cols)
+        result.entries = {(i, j): value for i, row in enumerate(matrix) for j, value in enumerate(row) if value}
+        return result
+
+    def tolist(self) -> List[List[Union[int, float, complex]]]:
+        result = init_result(self.rows, self.cols)
+        for (i, j), value in self.entries.items():
+            result[i][j] = value
+        return result
+
+    def tocsr(self) -> "CSRMatrix":
+        indptr = array('q', bytes(8 * (self.rows + 1)))
+        for i, _ in self.entries:
+            indptr[i + 1] += 1
+        for i in range(self.rows):
+            indptr[i + 1] += indptr[i]
+        keys = sorted(self.entries)
+        return CSRMatrix(self.rows, self.cols, indptr, array('q', [j for _, j in keys]), [self.entries[key] for key in keys])
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.rows, self.cols
+
+    @property
+    def nnz(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, index: Tuple[int, int]) -> Union[int, float, complex]:
+        i, j = index
+        if not (0 <= i < self.rows and 0 <= j < self.cols):
+            raise IndexError
+        return self.entries.get(index, 0)
+
+    def __setitem__(self, index: Tuple[int, int], value: Union[int, float, complex]) -> None:
+        i, j = index
+        if not (0 <= i < self.rows and 0 <= j < self.cols):
+            raise IndexError
+        isnum(value)
+        if value:
+            self.entries[i, j] = value
+        else:
+            self.entries.pop((i, j), None)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (DOKMatrix, CSRMatrix)):
+            return self.shape == other.shape and self.tolist() == other.tolist()
+        return NotImplemented
+
+
+class CSRMatrix:
+    """A sparse matrix in compressed sparse row form.
+
+    Parameters:
+    rows(int): The number of rows.
+    cols(int): The number of columns.
+    indptr(array): The nonzeros of row i are found from indptr[i] to indptr[i + 1].
+    indices(array): The column of every nonzero, increasing along a row.
+    values(List[Union[int, float, complex]]): The nonzeros, a list so that integers of any size stay exact.
+
+    Rows are contiguous runs of indices and values, which is what the sparse kernels walk.
+    """
+
+    __slots__ = ('rows', 'cols', 'indptr', 'indices', 'values')
+
+    def __init__(self, rows: int, cols: int, indptr, indices, values: List[Union[int, float, complex]]):
+        if rows <= 0 or cols <= 0 or len(indptr) != rows + 1 or not len(indices) == len(values) == indptr[-1]:
+            raise ValueError
+        self.rows = rows
+        self.cols = cols
+        self.indptr = array('q', indptr)
+        self.indices = array('q', indices)
+        self.values = list(values)
+
+    @classmethod
+    def from_lists(cls, matrix: List[List[Union[int, float, complex]]], trusted: bool = False) -> "CSRMatrix":
+        """Compresses a list of lists, validating it unless it is trusted."""
+        if not trusted:
+            check_validity(matrix)
+        rows, cols = matrix_shape(matrix)
+        indptr = array('q', [0])
+        indices = array('q')
+        values = []
+        for row in matrix:
+            nonzero = [j for j, value in enumerate(row) if value]
+            indices.extend(nonzero)
+            values.extend([row[j] for j in nonzero])
+            indptr.append(len(values))
+        return cls(rows, cols, indptr, indices, values)
+
+    def todok(self) -> DOKMatrix:
+        result = DOKMatrix(self.rows, self.cols)
+        result.entries = {(i, j): value for i in range(self.rows) for j, value in self.row_items(i)}
+        return result
+
+    def tolist(self) -> List[List[Union[int, float, complex]]]:
+        result = init_result(self.rows, self.cols)
+        for i, out in enumerate(result):
+            for j, value in self.row_items(i):
+                out[j] = value
+        return result
+
+    def row_items(self, i: int) -> Iterator[Tuple[int, Union[int, float, complex]]]:
+        """Returns the (column, value) pairs of the nonzeros of row i."""
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return zip(self.indices[start:end], self.values[start:end])
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.rows, self.cols
+
+    @property
+    def nnz(self) -> int:
+        return len(self.values)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (DOKMatrix, CSRMatrix)):
+            return self.shape == other.shape and self.tolist() == other.tolist()
+        return NotImplemented
+
+
+def multiply_sparse(
+    matrix1: Union[CSRMatrix, List[List[Union[int, float, complex]]]],
+    matrix2: Union[CSRMatrix, List[List[Union[int, float, complex]]]],
+) -> Union[CSRMatrix, List[List[Union[int, float, complex]]]]:
+    """Multiplies two matrices of which at least one is sparse, in time proportional to the nonzeros.
+
+    Parameters:
+    matrix1(Union[CSRMatrix, List[List[Union[int, float, complex]]]]): The first matrix.
+    matrix2(Union[CSRMatrix, List[List[Union[int, float, complex]]]]): The second matrix.
+
+    Returns:
+    Union[CSRMatrix, List[List[Union[int, float, complex]]]]: The product, sparse when both matrices are.
+
+    A sparse first matrix times a dense second one scales every row of the second matrix by the nonzeros
+    of a row of the first and adds them up, a whole row at a time with map, for nnz1 * cols operations.
+    Otherwise the second matrix is sparse and the rows of the product are gathered element by element
+    from its rows picked out by the nonzeros of the first (Gustavson's algorithm), which costs one
+    multiply-add per pair of nonzeros that meet. Zeros are skipped, everything else is added in the
+    order of multiply, so integers stay exact and floats agree with it.
+    """
+
+    rows = matrix1.rows if isinstance(matrix1, CSRMatrix) else len(matrix1)
+    inner = matrix1.cols if isinstance(matrix1, CSRMatrix) else len(matrix1[0])
+    cols = matrix2.cols if isinstance(matrix2, CSRMatrix) else len(matrix2[0])
+    if inner != (matrix2.rows if isinstance(matrix2, CSRMatrix) else len(matrix2)):
+        raise ValueError
+
+    if not isinstance(matrix2, CSRMatrix):
+        result = []
+        for i in range(rows):
+            out = [0] * cols
+            for k, value in matrix1.row_items(i):
+                out = list(map(add, out, map(mul, repeat(value), matrix2[k])))
+            result.append(out)
+        return result
+
+    if isinstance(matrix1, CSRMatrix):
+        row_items = matrix1.row_items
+    else:
+        def row_items(i):
+            return ((k, value) for k, value in enumerate(matrix1[i]) if value)
+
+    indptr, indices, values = array('q', [0]), array('q'), []
+    for i in range(rows):
+        out = {}
+        for k, value in row_items(i):
+            for j, other in matrix2.row_items(k):
+                out[j] = out.get(j, 0) + value * other
+        keys = sorted(j for j, total in out.items() if total)
+        indices.extend(keys)
+        values.extend([out[j] for j in keys])
+        indptr.append(len(values))
+    product = CSRMatrix(rows, cols, indptr, indices, values)
+    return product if isinstance(matrix1, CSRMatrix) else product.tolist()
+
+
+def share_matrix(matrix: List[List[Union[int, float, complex]]]) -> Tuple[Optional[shared_memory.SharedMemory], tuple]:
+    """Copies a matrix into a shared memory block when all of its elements fit a typed array.
+
+    Parameters:
+    matrix(List[List[Union[int, float, complex]]]): The matrix to be shared.
+
+    Returns:
+    Tuple: The shared memory block, or None, and the description workers rebuild the matrix from.
+
+    Matrices made only of floats, only of integers that fit in 64 bits or only of complex numbers are
+    stored flat as doubles, signed 64 bit integers or pairs of doubles, which round trip exactly. Any
+    other matrix is described by itself, so that it travels to every worker once with the pool.
+    """
+
+    kinds = {type(element) for row in matrix for element in row}
+    if kinds == {int} and all(-2**63 <= element < 2**63 for row in matrix for element in row):
+        typecode, values = 'q', array('q', (element for row in matrix for element in row))
+    elif kinds == {float}:
+        typecode, values = 'd', array('d', (element for row in matrix for element in row))
+    elif kinds == {complex}:
+        typecode, values = 'D', array('d', (part for row in matrix for element in row for part in (element.real, element.imag)))
+    else:
+        return None, ('list', matrix)
+
+    block = shared_memory.SharedMemory(create=True, size=max(1, len(values) * values.itemsize))
+    block.buf[:len(values) * values.itemsize] = values.tobytes()
+    return block, ('shared', block.name, typecode, len(matrix), len(matrix[0]))
+
+
+def unshare_matrix(description: tuple) -> List[List[Union[int, float, complex]]]:
+    """Rebuilds a matrix from the description returned by share_matrix."""
+
+    if description[0] == 'list':
+        return description[1]
+    _, name, typecode, rows, cols = description
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        view = block.buf.cast('d' if typecode == 'D' else typecode)
+        values = view[:rows * cols * (2 if typecode == 'D' else 1)].tolist()
+        view.release()
+    finally:
+        block.close()
+    if typecode == 'D':
+        values = list(map(complex, values[0::2], values[1::2]))
+    return [values[i * cols:(i + 1) * cols] for i in range(rows)]
+
+
+# The operands of the worker processes, set once by _init_worker
+_worker_rows = None
+_worker_columns = None
+
+
+def _init_worker(description1: tuple, description2: tuple) -> None:
+    global _worker_rows, _worker_columns
+    _worker_rows = unshare_matrix(description1)
+    _worker_columns = transpose(unshare_matrix(description2))
+
+
+def _multiply_block(bounds: Tuple[int, int]) -> List[List[Union[int, float, complex]]]:
+    return multiply_columns(_worker_rows[bounds[0]:bounds[1]], _worker_columns)
+
+
+def multiply_parallel(
+    matrix1: List[List[Union[int, float, complex]]],
+    matrix2: List[List[Union[int, float, complex]]],
+    workers: int = None,
+) -> List[List[Union[int, float, complex]]]:
+    """Multiplies two matrices on a pool of worker processes.
+
+    Parameters:
+    matrix1(List[List[Union[int, float, complex]]]): The first matrix.
+    matrix2(List[List[Union[int, float, complex]]]): The second matrix.
+    workers(int): The number of processes, defaults to the number of CPUs.
+
+    Returns:
+    List[List[Union[int, float, complex]]]: The resulting matrix after multiplication.
+
+    The rows of the result are split into blocks, about four per worker to balance the load, and every
+    block is computed with multiply_columns. The operands are handed over in shared memory, see
+    share_matrix, so a task is only a pair of row numbers and the workers never receive pickled rows.
+    The result is the same as the one of multiply, up to the rounding of floats. When there is only one
+    process to run, as with a single CPU, the product is computed in the calling process instead, as a
+    pool of one only adds the cost of starting it.
+    """
+
+    workers = workers or os.cpu_count() or 1
+    rows = len(matrix1)
+    if min(workers, rows) <= 1:
+        return multiply_blocked(matrix1, matrix2)
+    step = max(1, -(-rows // (4 * workers)))
+    blocks = []
+    try:
+        shared1, description1 = share_matrix(matrix1)
+        blocks.append(shared1)
+        shared2, description2 = share_matrix(matrix2)
+        blocks.append(shared2)
+        with Pool(min(workers, -(-rows // step)), _init_worker, (description1, description2)) as pool:
+            parts = pool.map(_multiply_block, [(start, min(rows, start + step)) for start in range(0, rows, step)])
+    finally:
+        for block in blocks:
+            if block is not None:
+                block.close()
+                block.unlink()
+
+    return [row for part in parts for row in part]
+
+
+def _import_optional(name: str):
+    """Imports an optional module, or returns None when it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def _numpy():
+    # numpy is only imported once a product is handed to it, keeping it out of the import of this module
+    global _numpy_module
+    if _numpy_module is False:
+        _numpy_module = _import_optional('numpy')
+    return _numpy_module
+
+
+def _cython_kernel():
+    # A prebuilt matmul_cy extension is used as it is, otherwise pyximport compiles it if Cython is installed.
+    # Its import hooks are removed again straight away, so that no other import of the process compiles .pyx files
+    global _cython_module
+    if _cython_module is False:
+        _cython_module = _import_optional('matmul_cy')
+        if _cython_module is None and _import_optional('Cython') is not None:
+            import pyximport
+            importers = pyximport.install(language_level=3)
+            try:
+                _cython_module = importlib.import_module('matmul_cy')
+            except ImportError:
+                _cython_module = None
+            finally:
+                pyximport.uninstall(*importers)
+    return _cython_module
+
+
+_numpy_module = False
+_cython_module = False
+
+
+def fits_int64(
+    matrix1: List[List[int]],
+    matrix2: List[List[int]],
+) -> bool:
+    """Checks whether no partial sum of the product of two integer matrices can overflow 64 bits."""
+
+    largest1 = max(max(map(abs, row)) for row in matrix1)
+    largest2 = max(max(map(abs, row)) for row in matrix2)
+    return largest1 * largest2 * len(matrix2) < 2**63
+
+
+def fits_float64(
+    matrix1: List[List[Union[int, float, complex]]],
+    matrix2: List[List[Union[int, float, complex]]],
+) -> bool:
+    """Checks whether a double holds every integer of two matrices mixing integers with other types exactly."""
+
+    for matrix in (matrix1, matrix2):
+        for row in matrix:
+            # Only rows with a large element need their integers looked at one by one
+            if max(map(abs, row)) > 2**53 and any(type(element) is int and abs(element) > 2**53 for element in row):
+                return False
+    return True
+
+
+def multiply_numpy(
+    matrix1: List[List[Union[int, float, complex]]],
+    matrix2: List[List[Union[int, float, complex]]],
+) -> List[List[Union[int, float, complex]]]:
+    """Multiplies two matrices with numpy, as int64, float64 or complex128 after the widest element type.
+
+    Integer matrices must satisfy fits_int64, which choose_backend checks, as numpy integers wrap
+    around silently, and integers mixed with floats must satisfy fits_float64, as they become doubles.
+    """
+
+    np = _numpy()
+    return (np.array(matrix1) @ np.array(matrix2)).tolist()
+
+
+def multiply_cython(
+    matrix1: List[List[float]],
+    matrix2: List[List[float]],
+) -> List[List[float]]:
+    """Multiplies two real matrices as doubles with the compiled kernel of matmul_cy.pyx."""
+
+    rows, inner = len(matrix1), len(matrix2)
+    cols = len(matrix2[0])
+    packed1 = Matrix(rows, inner, [element for row in matrix1 for element in row], 'd')
+    packed2 = Matrix(inner, cols, [element for row in matrix2 for element in row], 'd')
+    result = Matrix(rows, cols)
+    _cython_kernel().multiply_doubles(packed1.memoryview(), packed2.memoryview(), result.memoryview())
+    return result.tolist()
+
+
+def multiply_array(
+    matrix1: List[List[Union[int, float]]],
+    matrix2: List[List[Union[int, float]]],
+) -> List[List[Union[int, float]]]:
+    """Multiplies two real matrices through the array-backed Matrix, see multiply_matrix."""
+
+    return multiply_matrix(Matrix.from_lists(matrix1), Matrix.from_lists(matrix2)).tolist()
+
+
+# The backends of matrix_multiply, each with its kernel, the element types it multiplies without losing
+# precision and a check of whether it can run here. Integers go to numpy and array only when their
+# product fits 64 bits, or when mixed with other types only when they fit a double, which choose_backend
+# checks, and never to the double precision Cython kernel
+BACKENDS: Dict[str, Tuple[Callable, frozenset, Callable[[], bool]]] = {
+    'python': (multiply_blocked, NUMERIC_TYPES, lambda: True),
+    'array': (multiply_array, frozenset((int, float)), lambda: True),
+    'numpy': (multiply_numpy, NUMERIC_TYPES, lambda: _numpy() is not None),
+    'cython': (multiply_cython, frozenset((float,)), lambda: _cython_kernel() is not None),
+}
+
+
+def register_backend(name: str, kernel: Callable, types=NUMERIC_TYPES, available: Callable[[], bool] = lambda: True, threshold: float = None) -> None:
+    """Adds a backend to matrix_multiply.
+
+    Parameters:
+    name(str): The name it is selected by with backend=name.
+    kernel(Callable): Multiplies two valid, compatible lists of lists into a list of lists.
+    types(frozenset): The element types it multiplies exactly.
+    available(Callable[[], bool]): Whether it can run here.
+    threshold(float): The number of multiply-adds from which backend='auto' picks it, never by default.
+    """
+
+    BACKENDS[name] = (kernel, frozenset(types), available)
+    if threshold is not None:
+        BACKEND_THRESHOLDS[name] = threshold
+
+
+def choose_backend(
+    backend: str,
+    matrix1: List[List[Union[int, float, complex]]],
+    matrix2: List[List[Union[int, float, complex]]],
+    work: int,
+    types: set = None,
+) -> str:
+    """Picks the backend multiplying two valid, compatible matrices.
+
+    Parameters:
+    backend(str): 'auto' or one of BACKENDS.
+    matrix1(List[List[Union[int, float, complex]]]): The first matrix.
+    matrix2(List[List[Union[int, float, complex]]]): The second matrix.
+    work(int): The number of multiply-adds of the product.
+    types(set): The element types of both matrices, when the caller already knows them.
+
+    Returns:
+    str: The name of the backend.
+
+    'auto' takes the first backend of BACKEND_THRESHOLDS whose threshold the product reaches, which is
+    available and which handles every element type exactly, and falls back to 'python'. A backend asked
+    for by name which cannot run, or would lose precision, raises a ValueError.
+    """
+
+    if backend != 'auto' and backend not in BACKENDS:
+        raise ValueError("Unknown backend, expected one of auto, " + ", ".join(BACKENDS))
+    candidates = [name for name, threshold in BACKEND_THRESHOLDS.items() if work >= threshold] if backend == 'auto' else [backend]
+    if candidates == ['python'] or not candidates:
+        return 'python'
+
+    if types is None:
+        types = check_validity(matrix1) | check_validity(matrix2)
+    exact = None
+    for name in candidates:
+        _, supported, available = BACKENDS[name]
+        if not (types <= supported and available()):
+            continue
+        if name == 'python' or int not in types:
+            return name
+        # Integers are only exact in the other kernels while they fit int64, or a double once mixed with floats
+        if exact is None:
+            exact = fits_int64(matrix1, matrix2) if types == {int} else fits_float64(matrix1, matrix2)
+        if exact:
+            return name
+    if backend != 'auto':
+        raise ValueError(f"The {backend} backend is not available or cannot multiply these elements exactly")
+    return 'python'
+
+
 def matrix_multiply(
     matrix1: List[List[Union[int, float, complex]]],
     matrix2: List[List[Union[int, float, complex]]],
+    parallel: bool = False,
+    workers: int = None,
+    strassen: bool = False,
+    trusted: bool = False,
+    backend: str = 'auto',
+    sparse: Union[bool, str] = 'auto',
+    types: set = None,
 ) -> List[List[Union[int, float, complex]]]:
     """Performs matrix multiplication.
 
     Parameters:
     matrix1(List[List[Union[int, float, complex]]]): The first matrix.
     matrix2(List[List[Union[int, float, complex]]]): The second matrix.
+    parallel(bool): Whether to spread the rows of the result over a pool of processes, see multiply_parallel.
+    workers(int): The number of processes, giving more than one implies parallel.
+    strassen(bool): Whether to use multiply_strassen, which pays off for large square matrices.
+    trusted(bool): Skips the validation, for callers whose matrices are known to be well formed
+    and compatible, such as products of earlier multiplications. Malformed input then gives
+    wrong results or arbitrary errors.
+    backend(str): The kernel multiplying the matrices, one of BACKENDS, or 'auto' to pick one
+    after the size of the product, the element types and what is installed, see choose_backend.
+    sparse(Union[bool, str]): Whether to use the sparse kernels of multiply_sparse, 'auto' uses them
+    when the validation finds a matrix at most SPARSE_DENSITY full and the product would otherwise
+    go to the pure Python kernel.
+    types(set): The element types of both matrices, when the caller already knows them. A trusted
+    product is never scanned for them, so without them backend='auto' keeps it on the exact pure
+    Python kernel, and a backend asked for by name still scans the elements to check it is exact.
 
     Returns:
     List[List[Union[int, float, complex]]]: The resulting matrix after multiplication.
 
-    This function multiplies two matrices after validating them and returns the result.
+    This function multiplies two matrices after validating them and returns the result, using the
+    kernel chosen by choose_backend. Integer products stay exact, as they only go to numpy when they fit
+    64 bits and otherwise stay with the pure Python kernel, multiply_blocked.
+    When either matrix is a Matrix the other one is converted and a Matrix is returned, see multiply_matrix,
+    raising an OverflowError for integers the typed storage cannot hold exactly, see Matrix.from_lists,
+    and when either is a DOKMatrix or CSRMatrix the product is computed by multiply_sparse.
+    """
+
+    if isinstance(matrix1, (DOKMatrix, CSRMatrix)) or isinstance(matrix2, (DOKMatrix, CSRMatrix)):
+        matrix1 = matrix1.tocsr() if isinstance(matrix1, DOKMatrix) else matrix1
+        matrix2 = matrix2.tocsr() if isinstance(matrix2, DOKMatrix) else matrix2
+        if not isinstance(matrix1, CSRMatrix):
+            check_validity(matrix1)
+            matrix_shape(matrix1)
+        if not isinstance(matrix2, CSRMatrix):
+            check_validity(matrix2)
+            matrix_shape(matrix2)
+        return multiply_sparse(matrix1, matrix2)
+
+    if isinstance(matrix1, Matrix) or isinstance(matrix2, Matrix):
+        matrix1 = matrix1 if isinstance(matrix1, Matrix) else Matrix.from_lists(matrix1)
+        matrix2 = matrix2 if isinstance(matrix2, Matrix) else Matrix.from_lists(matrix2)
+        return multiply_matrix(matrix1, matrix2)
+
+    if trusted:
+        rows, inner, cols = len(matrix1), len(matrix2), len(matrix2[0])
+        nonzeros1, nonzeros2 = rows * inner, inner * cols
+        if types is None and backend == 'auto':
+            # Picking any other kernel would take a pass over the elements to learn their types
+            backend = 'python'
+    else:
+        rows, inner, cols, types, nonzeros1, nonzeros2 = _check_pair(
+            matrix1, matrix2
+        )  # Running the test function to check for compatibility and validity of the input matrices
+    sparse1 = nonzeros1 <= SPARSE_DENSITY * rows * inner
+    sparse2 = nonzeros2 <= SPARSE_DENSITY * inner * cols
+
+    # The backend is chosen at most once, as checking that integers fit it is a pass over both matrices
+    chosen = None
+    if sparse == 'auto' and (sparse1 or sparse2) and rows * inner * cols >= SPARSE_MIN_WORK:
+        chosen = choose_backend(backend, matrix1, matrix2, rows * inner * cols, types)
+    if sparse is True or chosen == 'python':
+        product = multiply_sparse(
+            CSRMatrix.from_lists(matrix1, trusted=True) if sparse1 or not sparse2 else matrix1,
+            CSRMatrix.from_lists(matrix2, trusted=True) if sparse2 else matrix2,
+        )
+        return product.tolist() if isinstance(product, CSRMatrix) else product
+
+    if strassen:
+        return multiply_strassen(matrix1, matrix2)
+
+    if parallel or (workers or 1) > 1:
+        # Without a second process to run on, the serial kernels below are faster than a pool
+        if min(workers or os.cpu_count() or 1, rows) > 1 and rows * inner * cols >= PARALLEL_MIN_WORK:
+            return multiply_parallel(matrix1, matrix2, workers)
+
+    if chosen is None:
+        chosen = choose_backend(backend, matrix1, matrix2, rows * inner * cols, types)
+    return BACKENDS[chosen][0](matrix1, matrix2)
+
+
+def batch_matrix_multiply(
+    matrices1: List[List[List[Union[int, float, complex]]]],
+    matrices2: List[List[List[Union[int, float, complex]]]],
+    out: List[List[List[Union[int, float, complex]]]] = None,
+) -> List[List[List[Union[int, float, complex]]]]:
+    """Multiplies many pairs of small matrices.
+
+    Parameters:
+    matrices1(List[List[List[Union[int, float, complex]]]]): The first matrix of every pair.
+    matrices2(List[List[List[Union[int, float, complex]]]]): The second matrix of every pair.
+    out(List[List[List[Union[int, float, complex]]]]): Result matrices of the right shapes, such as the
+    return value of an earlier call, whose rows are overwritten in place instead of allocating new ones.
+
+    Returns:
+    List[List[List[Union[int, float, complex]]]]: The product of every pair, `out` when it is given.
+
+    Multiplying tiny matrices one matrix_multiply call at a time spends most of the time validating
+    them and setting up the result. Here the whole batch is validated in one loop, which checks the
+    row lengths and gathers the element types and shapes of all the matrices, testing the types once
+    at the end. A batch of at least BATCH_NUMPY_MIN pairs of one shape is then multiplied as a single
+    stacked numpy product when numpy is installed, under the same rules as the numpy backend, so that
+    integers only go there when no product can overflow 64 bits. Other batches are multiplied pair by
+    pair with the dot product kernel of multiply_blocked.
+    """
+
+    if len(matrices1) != len(matrices2) or (out is not None and len(out) != len(matrices1)):
+        raise ValueError
+    types = set()
+    shapes = set()
+    for matrix1, matrix2 in zip(matrices1, matrices2):
+        if not (len(matrix1) and len(matrix2) and len(matrix1[0]) == len(matrix2) and len(matrix2[0])):
+            raise ValueError
+        shapes.add((len(matrix1), len(matrix2), len(matrix2[0])))
+        for matrix in (matrix1, matrix2):
+            cols = len(matrix[0])
+            for row in matrix:
+                if len(row) != cols:
+                    raise ValueError
+                types.update(map(type, row))
+    if not types <= NUMERIC_TYPES:
+        raise TypeError
+
+    if len(shapes) == 1 and len(matrices1) >= BATCH_NUMPY_MIN and _numpy() is not None and (
+            types != {int} or _largest(matrices1) * _largest(matrices2) * next(iter(shapes))[1] < 2**63):
+        np = _numpy()
+        products = (np.array(matrices1) @ np.array(matrices2)).tolist()
+        if out is None:
+            return products
+        for result, values in zip(out, products):
+            if len(result) != len(values):
+                raise ValueError
+            for target, row in zip(result, values):
+                target[:] = row
+        return out
+
+    if out is None:
+        return [[[sum(map(mul, row, column)) for column in zip(*matrix2)] for row in matrix1]
+                for matrix1, matrix2 in zip(matrices1, matrices2)]
+
+    for matrix1, matrix2, result in zip(matrices1, matrices2, out):
+        if len(result) != len(matrix1):
+            raise ValueError
+        columns = list(zip(*matrix2))
+        for row, target in zip(matrix1, result):
+            target[:] = [sum(map(mul, row, column)) for column in columns]
+    return out
+
+
+def _largest(matrices: List[List[List[int]]]) -> int:
+    # The largest magnitude of any element of a batch of integer matrices
+    return max(max(map(abs, row)) for matrix in matrices for row in matrix)
+
+
+def matrix_chain_order(dims: List[int]) -> Tuple[int, List[List[int]]]:
+    """Finds the cheapest order to multiply a chain of matrices, by dynamic programming.
+
+    Parameters:
+    dims(List[int]): The shapes of the chain, matrix i being dims[i] x dims[i + 1].
+
+    Returns:
+    Tuple[int, List[List[int]]]: The least number of scalar multiply-adds, and the table whose entry
+    [i][j] is the matrix k after which the subchain i..j is split, for j > i.
+
+    The cheapest product of matrices i to j splits them at the k minimizing the cost of both halves plus
+    dims[i] * dims[k + 1] * dims[j + 1], worked out for ever longer subchains in O(n^3) time.
+    """
+
+    n = len(dims) - 1
+    cost = [[0] * n for _ in range(n)]
+    split = [[0] * n for _ in range(n)]
+    for length in range(1, n):
+        for i in range(n - length):
+            j = i + length
+            cost[i][j], split[i][j] = min((cost[i][k] + cost[k + 1][j] + dims[i] * dims[k + 1] * dims[j + 1], k) for k in range(i, j))
+    return (cost[0][n - 1] if n else 0), split
+
+
+def matrix_chain_multiply(
+    matrices: List[List[List[Union[int, float, complex]]]],
+    trusted: bool = False,
+) -> List[List[Union[int, float, complex]]]:
+    """Multiplies a chain of matrices in the order needing the fewest scalar multiplications.
+
+    Parameters:
+    matrices(List[List[List[Union[int, float, complex]]]]): The matrices, in the order of the product.
+    trusted(bool): Skips the validation, see matrix_multiply.
+
+    Returns:
+    List[List[Union[int, float, complex]]]: The product of all the matrices.
+
+    The matrices are validated once up front, after which every product of the order found by
+    matrix_chain_order goes through matrix_multiply unvalidated, picking a backend after the element
+    types gathered up front, as a product never holds a type that none of its factors do.
+    Multiplying 10x100, 100x5 and 5x50 matrices left to right takes 7500 multiply-adds, and
+    right to left 75000.
+    """
+
+    if not len(matrices):
+        raise ValueError
+    types = set()
+    if not trusted:
+        for matrix in matrices:
+            types |= check_validity(matrix)
+            matrix_shape(matrix)
+        for matrix1, matrix2 in zip(matrices, matrices[1:]):
+            if len(matrix1[0]) != len(matrix2):
+                raise ValueError
+    else:
+        for matrix in matrices:
+            for row in matrix:
+                types.update(map(type, row))
+
+    dims = [len(matrix) for matrix in matrices] + [len(matrices[-1][0])]
+    _, split = matrix_chain_order(dims)
+
+    def product(i: int, j: int) -> List[List[Union[int, float, complex]]]:
+        if i == j:
+            return matrices[i]
+        k = split[i][j]
+        return matrix_multiply(product(i, k), product(k + 1, j), trusted=True, types=types)
+
+    return product(0, len(matrices) - 1)
+
+
+def matrix_file_info(path: str, shape: Tuple[int, int] = None, dtype: str = None) -> Tuple[int, Tuple[int, int], str]:
+    """Describes a matrix stored row by row in a binary file.
+
+    Parameters:
+    path(str): A .npy file, whose header gives the shape and dtype, or a raw file of the elements.
+    shape(Tuple[int, int]): The rows and columns of a raw file.
+    dtype(str): The numpy dtype of a raw file, float64 by default.
+
+    Returns:
+    Tuple[int, Tuple[int, int], str]: The offset of the first element, the shape and the dtype.
+    """
+
+    np = _numpy()
+    if path.endswith('.npy'):
+        with open(path, 'rb') as filehandle:
+            version = np.lib.format.read_magic(filehandle)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, file_dtype = read_header(filehandle)
+            offset = filehandle.tell()
+        if fortran_order or len(shape) != 2:
+            raise ValueError("Only two dimensional matrices stored row by row are supported")
+        return offset, tuple(shape), file_dtype.str
+    if shape is None:
+        raise ValueError("The shape of a raw matrix file must be given")
+    dtype = np.dtype(dtype or 'float64')
+    if os.path.getsize(path) < shape[0] * shape[1] * dtype.itemsize:
+        raise ValueError("The matrix file is smaller than its shape")
+    return 0, tuple(shape), dtype.str
+
+
+def write_matrix_file(rows: Iterator[List[Union[int, float]]], path: str, shape: Tuple[int, int], dtype: str = 'float64') -> None:
+    """Writes rows of a matrix, such as a list of lists or a generator, to a .npy or raw file one at a time."""
+
+    np = _numpy()
+    with open(path, 'wb') as filehandle:
+        if path.endswith('.npy'):
+            np.lib.format.write_array_header_1_0(filehandle, {'descr': np.dtype(dtype).str, 'fortran_order': False, 'shape': tuple(shape)})
+        count = 0
+        for row in rows:
+            values = np.asarray(row, dtype=dtype)
+            if values.shape != (shape[1],):
+                raise ValueError
+            filehandle.write(values.tobytes())
+            count += 1
+        if count != shape[0]:
+            raise ValueError
+
+
+def _map_span(path: str, info: Tuple[int, Tuple[int, int], str], rows: Tuple[int, int], columns: Tuple[int, int], mode: str = 'r'):
+    # Maps the contiguous span of a matrix file from (rows[0], columns[0]) to (rows[1] - 1, columns[1] - 1),
+    # returning the map and a view of it with only the columns asked for. Unmapping releases its pages
+    offset, (_, cols), dtype = info
+    np = _numpy()
+    first = rows[0] * cols + columns[0]
+    length = (rows[1] - 1) * cols + columns[1] - first
+    flat = np.memmap(path, dtype=dtype, mode=mode, offset=offset + first * np.dtype(dtype).itemsize, shape=(length,))
+    return flat, np.lib.stride_tricks.as_strided(flat, (rows[1] - rows[0], columns[1] - columns[0]), (cols * flat.itemsize, flat.itemsize), writeable=mode != 'r')
+
+
+def _span_rows(info: Tuple[int, Tuple[int, int], str], span_bytes: int) -> int:
+    # The number of whole rows of a matrix file mapped at a time to stay within span_bytes
+    np = _numpy()
+    return max(1, span_bytes // (info[1][1] * np.dtype(info[2]).itemsize))
+
+
+def _read_tile(path: str, info: Tuple[int, Tuple[int, int], str], rows: Tuple[int, int], columns: Tuple[int, int], span_bytes: int, dtype=None):
+    # Copies a tile out of a matrix file, mapping a few rows at a time, converted to dtype when given
+    np = _numpy()
+    tile = np.empty((rows[1] - rows[0], columns[1] - columns[0]), dtype=dtype or info[2])
+    step = _span_rows(info, span_bytes)
+    for start in range(rows[0], rows[1], step):
+        end = min(rows[1], start + step)
+        mapped, view = _map_span(path, info, (start, end), columns)
+        tile[start - rows[0]:end - rows[0]] = view
+        del mapped, view
+    return tile
+
+
+def _write_tile(path: str, info: Tuple[int, Tuple[int, int], str], rows: Tuple[int, int], columns: Tuple[int, int], tile, span_bytes: int) -> None:
+    # Writes a tile into a matrix file, mapping and flushing a few rows at a time
+    step = _span_rows(info, span_bytes)
+    for start in range(rows[0], rows[1], step):
+        end = min(rows[1], start + step)
+        mapped, view = _map_span(path, info, (start, end), columns, 'r+')
+        view[:] = tile[start - rows[0]:end - rows[0]]
+        mapped.flush()
+        del mapped, view
+
+
+def multiply_files(
+    path1: str,
+    path2: str,
+    out_path: str,
+    shape1: Tuple[int, int] = None,
+    shape2: Tuple[int, int] = None,
+    dtype: str = None,
+    memory_budget: int = MEMORY_BUDGET,
+) -> Tuple[int, int]:
+    """Multiplies two matrices stored in files into a third file, holding only a few tiles in memory.
+
+    Parameters:
+    path1(str): The file of the first matrix, see matrix_file_info.
+    path2(str): The file of the second matrix.
+    out_path(str): The file the product is written to, as .npy when the name ends so and raw otherwise.
+    shape1(Tuple[int, int]), shape2(Tuple[int, int]): The shapes of raw files.
+    dtype(str): The dtype of raw files, float64 by default.
+    memory_budget(int): The bytes the tiles may take at once.
+
+    Returns:
+    Tuple[int, int]: The shape of the product.
+
+    The product is cut into square tiles, each the sum over bands of the inner dimension of a tile of the
+    first matrix times a tile of the second. Tiles are copied out of numpy memory maps of a few rows at a
+    time, at most an eighth of the budget, which are unmapped again straight away, and every finished
+    tile of the product is written and flushed the same way, so that the pages of the files never pile
+    up in the resident memory. The two input tiles, the running sum and the product of a band share the
+    rest of the budget, so the memory used stays the same for matrices of any size.
+    Integer matrices are summed and written as int64, or uint64 when both are unsigned, whatever their
+    own width, signed and unsigned 64 bit ones included, and are checked to be unable to overflow it
+    beforehand, in one pass over each file.
     """
 
-    test_matrices(
-        matrix1, matrix2
-    )  # Running the test function to check for compatibility and validity of the input matrices
+    np = _numpy()
+    if np is None:
+        raise ImportError("multiply_files needs numpy")
+    info1 = matrix_file_info(path1, shape1, dtype)
+    info2 = matrix_file_info(path2, shape2, dtype)
+    (rows, inner), (inner2, cols) = info1[1], info2[1]
+    if inner != inner2 or not (rows and inner and cols):
+        raise ValueError
+    dtypes = (np.dtype(info1[2]), np.dtype(info2[2]))
+    if all(np.issubdtype(dtype, np.integer) for dtype in dtypes):
+        # Narrow integers would wrap around within a few products, so the sum is kept in 64 bits. numpy
+        # promotes int64 with uint64 to float64, which would round, so that pair is summed as int64 too
+        result_dtype = np.dtype(np.uint64 if all(np.issubdtype(dtype, np.unsignedinteger) for dtype in dtypes) else np.int64)
+    else:
+        result_dtype = np.result_type(*dtypes)
+    itemsize = max(result_dtype.itemsize, np.dtype(info1[2]).itemsize, np.dtype(info2[2]).itemsize)
+
+    # An eighth of the budget goes to the file pages mapped at any one time, the rest to the tiles of
+    # both matrices, the running sum and the product of a band, square ones as large as it allows
+    span_bytes = memory_budget // 8
+    tile = max(1, int((7 * memory_budget / (32 * itemsize)) ** 0.5))
+    tile_rows, tile_inner, tile_cols = min(tile, rows), min(tile, inner), min(tile, cols)
+
+    if np.issubdtype(result_dtype, np.integer):
+        largest = [0, 0]
+        highest = 0
+        for index, (path, info) in enumerate(((path1, info1), (path2, info2))):
+            step = _span_rows(info, memory_budget // 2)
+            for start in range(0, info[1][0], step):
+                mapped, _ = _map_span(path, info, (start, min(info[1][0], start + step)), (0, info[1][1]))
+                # Taken as Python integers, as the absolute value of the most negative int64 overflows
+                largest[index] = max(largest[index], int(mapped.max()), -int(mapped.min()))
+                highest = max(highest, int(mapped.max()))
+                del mapped
+        # A uint64 element summed as int64 must fit it as well as every partial sum
+        if highest > np.iinfo(result_dtype).max or largest[0] * largest[1] * inner > np.iinfo(result_dtype).max:
+            raise OverflowError("integer matrix product does not fit 64 bits")
+
+    if out_path.endswith('.npy'):
+        # Only the header is written, the elements stay a hole in the file until their tile is written
+        header = np.lib.format.open_memmap(out_path, mode='w+', dtype=result_dtype, shape=(rows, cols))
+        del header
+    else:
+        with open(out_path, 'wb') as filehandle:
+            filehandle.truncate(rows * cols * result_dtype.itemsize)
+    out_info = matrix_file_info(out_path, (rows, cols), result_dtype.str)
 
-    return multiply(matrix1, matrix2)
+    for i in range(0, rows, tile_rows):
+        i_end = min(rows, i + tile_rows)
+        for j in range(0, cols, tile_cols):
+            j_end = min(cols, j + tile_cols)
+            total = np.zeros((i_end - i, j_end - j), dtype=result_dtype)
+            for k in range(0, inner, tile_inner):
+                k_end = min(inner, k + tile_inner)
+                block1 = _read_tile(path1, info1, (i, i_end), (k, k_end), span_bytes, result_dtype)
+                block2 = _read_tile(path2, info2, (k, k_end), (j, j_end), span_bytes, result_dtype)
+                total += block1 @ block2
+                del block1, block2
+            _write_tile(out_path, out_info, (i, i_end), (j, j_end), total, span_bytes)
+    return rows, cols
@@ -0,0 +1,25 @@
+# cython: language_level=3
+# Compiled matrix multiply kernel used by the 'cython' backend of matmul_correct.matrix_multiply.
+# It is built on first import through pyximport when Cython is installed, or ahead of time with
+#     cythonize -i matmul_cy.pyx
+
+cimport cython
+
+# The operands and the result are statically typed, C contiguous memoryviews of doubles, so every
+# element access compiles to a pointer offset, and the bounds and wraparound checks are switched off
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nonecheck(False)
+cpdef void multiply_doubles(double[:, ::1] a, double[:, ::1] b, double[:, ::1] out):
+    cdef Py_ssize_t rows = a.shape[0]
+    cdef Py_ssize_t inner = a.shape[1]
+    cdef Py_ssize_t cols = b.shape[1]
+    cdef Py_ssize_t i, j, k
+    cdef double aik
+
+    # The i-k-j order walks rows of b and out, which are contiguous, in the innermost loop
+    for i in range(rows):
+        for k in range(inner):
+            aik = a[i, k]
+            for j in range(cols):
+                out[i, j] += aik * b[k, j]
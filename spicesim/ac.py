@@ -0,0 +1,119 @@
+import numpy as np
+from typing import Dict, Tuple
+
+from evalSpice import Netlist, read_netlist, stamp_matrix, stamp_reactive, stamp_rhs, choose_solver, sp, spla, SOLVERS
+
+# Memory the dense path may use for the stacked (frequencies x n x n) complex matrices of one chunk
+AC_CHUNK_BYTES = 64 * 2**20
+SPACINGS = ('lin', 'dec', 'oct')
+# The complex systems of an AC sweep are only solved with the direct backends
+DIRECT_SOLVERS = ('auto', 'dense', 'sparse')
+
+def frequency_points(spacing: str, points: int, fstart: float, fstop: float) -> np.ndarray:
+    """Returns the frequencies of a sweep, following the conventions of the SPICE .ac directive.
+
+    Parameters:
+    spacing(str): 'lin' for `points` linearly spaced frequencies, 'dec' or 'oct' for `points` logarithmically
+    spaced frequencies per decade or per octave.
+    points(int): The number of points, in total or per decade/octave.
+    fstart(float), fstop(float): The first and last frequency of the sweep.
+
+    Returns:
+    np.ndarray: The frequencies in Hz.
+    """
+    if spacing not in SPACINGS:
+        raise ValueError("Unknown frequency spacing, expected one of " + ", ".join(SPACINGS))
+    if points < 1 or fstop < fstart or fstart < 0 or (spacing != 'lin' and fstart == 0):
+        raise ValueError("Invalid frequency range")
+    if spacing == 'lin':
+        return np.linspace(fstart, fstop, points)
+    ratio = np.log10(fstop / fstart) if spacing == 'dec' else np.log2(fstop / fstart)
+    return np.geomspace(fstart, fstop, int(round(points * ratio)) + 1)
+
+def ac_sweep(netlist: Netlist, freqs: np.ndarray, solver: str = 'auto') -> Tuple[np.ndarray, Dict, Dict]:
+    """Runs a small signal AC analysis of a compiled circuit over many frequencies.
+
+    Parameters:
+    netlist(Netlist): The compiled circuit, sources given as 'ac' are the excitation and all others are zero.
+    freqs(np.ndarray): The frequencies in Hz.
+    solver(str): The linear solver backend, one of DIRECT_SOLVERS.
+
+    Returns:
+    Tuple: The frequencies, a dictionary mapping every node to its complex phasors as an array over the
+    frequencies, and the same for the currents through the voltage sources.
+
+    The conductance matrix G and the reactive matrix C are stamped once, and (G + jwC) x = b is then solved
+    for all the frequencies together. The dense backend stacks the matrices of a chunk of frequencies and
+    solves them with a single batched call. The sparse backend reuses the sparsity pattern, which is the
+    same at every frequency, so each frequency only combines two data arrays before it is factored.
+    """
+    if solver in SOLVERS and solver not in DIRECT_SOLVERS:
+        raise ValueError("AC analysis needs a direct solver")
+    if not netlist.linear:
+        raise ValueError("AC analysis of diodes and MOSFETs is not supported")
+    freqs = np.atleast_1d(np.asarray(freqs, dtype=float))
+    size = netlist.size
+    solver = choose_solver(solver, size)
+    omega = 2 * np.pi * freqs
+    V = netlist.elements['V']
+    I = netlist.elements['I']
+    b = stamp_rhs(netlist, V.value_array()[:, 1], I.value_array()[:, 1]).astype(complex)
+
+    # Both matrices are built on the same coordinates, so that they share one sparsity pattern
+    G = stamp_matrix(netlist)
+    C = stamp_reactive(netlist)
+    rows, cols = (np.concatenate((g, c)) for g, c in zip(G[:2], C[:2]))
+    gvals = np.concatenate((G[2], np.zeros(len(C[2]))))
+    cvals = np.concatenate((np.zeros(len(G[2])), C[2]))
+
+    ans = np.zeros((len(freqs), size), dtype=complex)
+    if solver == 'sparse':
+        Gm = sp.csc_matrix((gvals, (rows, cols)), shape=(size, size))
+        Cm = sp.csc_matrix((cvals, (rows, cols)), shape=(size, size))
+        for k, w in enumerate(omega):
+            coeffs = sp.csc_matrix((Gm.data + 1j * w * Cm.data, Gm.indices, Gm.indptr), shape=(size, size))
+            try:
+                lu = spla.splu(coeffs, permc_spec='MMD_AT_PLUS_A')
+            except RuntimeError:
+                raise ValueError("Circuit error: no solution")
+            ans[k] = lu.solve(b)
+    else:
+        Gd = np.zeros((size, size))
+        Cd = np.zeros((size, size))
+        np.add.at(Gd, (rows, cols), gvals)
+        np.add.at(Cd, (rows, cols), cvals)
+        chunk = max(1, AC_CHUNK_BYTES // (16 * size * size)) if size else len(freqs)
+        for start in range(0, len(freqs), chunk):
+            w = omega[start:start + chunk, None, None]
+            try:
+                ans[start:start + chunk] = np.linalg.solve(Gd + 1j * w * Cd, np.broadcast_to(b[:, None], (len(w), size, 1)))[:, :, 0]
+            except np.linalg.LinAlgError:
+                raise ValueError("Circuit error: no solution")
+    if not np.all(np.isfinite(ans)):
+        raise ValueError("Circuit error: no solution")
+
+    n = netlist.num_nodes - 1
+    nodeV = dict(zip(netlist.node_names(), np.vstack((np.zeros(len(freqs)), ans[:, :n].T))))
+    sourceI = dict(zip(V.names, ans[:, n:n + len(V)].T))
+    return (freqs, nodeV, sourceI)
+
+def evalAC(filename: str, freqs: np.ndarray = None, solver: str = 'auto') -> Tuple[np.ndarray, Dict, Dict]:
+    """
+    Runs the AC analysis of a SPICE file.
+
+    Parameters:
+    filename(str): The name of the file which contains the circuit to be evaluated.
+    freqs(np.ndarray): The frequencies in Hz, by default those of the `.ac spacing points fstart fstop`
+    line of the netlist.
+    solver(str): The linear solver backend, as for evalSpice.
+
+    Returns:
+    Tuple: The frequencies and the node voltage and voltage source current phasors, see ac_sweep.
+    """
+    netlist = read_netlist(filename)
+    if freqs is None:
+        fields = netlist.analyses.get('.ac')
+        if fields is None:
+            raise ValueError("No AC analysis specified")
+        freqs = frequency_points(fields[0].lower(), int(fields[1]), float(fields[2]), float(fields[3]))
+    return ac_sweep(netlist, freqs, solver)
@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import numpy as np
+from typing import Dict, List
+
+from evalSpice import evalSpice, SOLVERS
+from netgen import KINDS, generate, write_netlist
+
+# The stages of evalSpice grouped into the three phases the report is about
+PHASES = {'parse': ('parse',), 'assemble': ('topology', 'stamp'), 'solve': ('factor', 'rhs', 'solve')}
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+# Largest default size of the kinds whose factorization grows faster than linearly, a 3D mesh fills in
+# as n^2 under a sparse LU and would take minutes at the largest of DEFAULT_SIZES
+DEFAULT_LIMITS = {'grid3d': 10000}
+# A phase has regressed once it is this much slower than in the baseline
+REGRESSION_RATIO = 1.5
+# Runs faster than this are too noisy to compare against a baseline
+MIN_COMPARED_TIME = 1e-3
+# A scaling exponent has regressed once it grew by this much
+EXPONENT_SLACK = 0.2
+
+def measure(filename: str, solver: str, repeats: int, memory: bool) -> Dict:
+    """Solves a netlist file repeatedly and returns the median time and the peak memory of every phase.
+
+    The times come from runs without memory tracing, which would slow parsing down several times over,
+    and the peak memory from one extra traced run.
+    """
+    times = {phase: [] for phase in PHASES}
+    for _ in range(repeats):
+        stats = evalSpice(filename, solver, stats='time')[2]
+        for phase, stages in PHASES.items():
+            times[phase].append(sum(stats['stages'][stage]['time'] for stage in stages))
+    result = {'size': stats['size'], 'nnz': stats['nnz'], 'solver': stats['solver'], 'phases': {}}
+    traced = evalSpice(filename, solver, stats=True)[2] if memory else None
+    for phase, stages in PHASES.items():
+        result['phases'][phase] = {'time': float(np.median(times[phase])), 'min_time': min(times[phase]),
+                                   'peak_memory': max(traced['stages'][stage]['peak_memory'] for stage in stages) if memory else None}
+    result['total_time'] = sum(entry['time'] for entry in result['phases'].values())
+    return result
+
+def scaling_exponents(results: List[Dict]) -> Dict[str, float]:
+    """Fits time ~ size^k to the total times of every circuit kind, over the sizes above a millisecond."""
+    exponents = dict()
+    for kind in sorted({entry['kind'] for entry in results}):
+        points = [(entry['size'], entry['total_time']) for entry in results if entry['kind'] == kind and entry['total_time'] >= MIN_COMPARED_TIME]
+        if len(points) >= 2:
+            size, elapsed = np.log(np.array(points)).T
+            exponents[kind] = float(np.polyfit(size, elapsed, 1)[0])
+    return exponents
+
+def run_benchmark(kinds: List[str], sizes: List[int], solver: str = 'auto', repeats: int = 3, memory: bool = True, seed: int = 0, verbose: bool = False, limits: Dict[str, int] = None) -> Dict:
+    """Generates and solves synthetic circuits of every kind and size.
+
+    Parameters:
+    kinds(List[str]): The circuit kinds, see netgen.KINDS.
+    sizes(List[int]): The approximate number of nodes of the circuits.
+    solver(str): The solver passed on to evalSpice.
+    repeats(int): The number of timed runs of every circuit.
+    memory(bool): Whether to also record the peak memory of every phase.
+    seed(int): Seeds the random circuits.
+    verbose(bool): Whether to print a line per circuit to stderr.
+    limits(Dict[str, int]): The largest size run for some kinds, such as DEFAULT_LIMITS.
+
+    Returns:
+    Dict: The report, with the environment, an entry per circuit and the fitted scaling exponents.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in kinds:
+            for nodes in sizes:
+                if limits is not None and nodes > limits.get(kind, nodes):
+                    continue
+                filename = os.path.join(directory, f"{kind}_{nodes}.ckt")
+                elements = write_netlist(filename, generate(kind, nodes, seed))
+                entry = dict(kind=kind, nodes=nodes, elements=elements, **measure(filename, solver, repeats, memory))
+                os.remove(filename)
+                results.append(entry)
+                if verbose:
+                    phases = ", ".join(f"{phase} {value['time']:.4f}s" for phase, value in entry['phases'].items())
+                    print(f"{kind:>8} {nodes:>8} nodes: {phases}", file=sys.stderr, flush=True)
+    environment = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(), 'platform': platform.platform()}
+    try:
+        import scipy
+        environment['scipy'] = scipy.__version__
+    except ImportError:
+        environment['scipy'] = None
+    return {'environment': environment, 'solver': solver, 'repeats': repeats, 'results': results, 'scaling': scaling_exponents(results)}
+
+def compare(report: Dict, baseline: Dict, ratio: float = REGRESSION_RATIO) -> List[str]:
+    """Lists the regressions of a report against a baseline report.
+
+    A phase of a circuit regresses when its median time grows past `ratio` times the baseline, ignoring
+    phases which took under MIN_COMPARED_TIME in both, and a circuit kind regresses when its scaling
+    exponent grows by more than EXPONENT_SLACK.
+    """
+    regressions = []
+    before = {(entry['kind'], entry['nodes']): entry for entry in baseline['results']}
+    for entry in report['results']:
+        old = before.get((entry['kind'], entry['nodes']))
+        if old is None:
+            continue
+        for phase, value in entry['phases'].items():
+            new_time, old_time = value['time'], old['phases'][phase]['time']
+            if max(new_time, old_time) >= MIN_COMPARED_TIME and new_time > ratio * old_time:
+                regressions.append(f"{entry['kind']} {entry['nodes']} nodes: {phase} took {new_time:.4g}s against {old_time:.4g}s")
+    for kind, exponent in report['scaling'].items():
+        old = baseline['scaling'].get(kind)
+        if old is not None and exponent > old + EXPONENT_SLACK:
+            regressions.append(f"{kind}: time now scales as size^{exponent:.2f} against size^{old:.2f}")
+    return regressions
+
+def main(argv: List[str] = None) -> int:
+    """Command line entry point, writes the report as JSON and returns 1 when a regression is found."""
+    parser = argparse.ArgumentParser(description="Benchmark evalSpice on synthetic circuits of growing size.")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS), help="circuit kinds to generate")
+    parser.add_argument("--sizes", nargs="+", type=lambda text: int(float(text)), default=None, help="approximate node counts, such as 1e6 (default: 10 to 1e5, capped per kind by DEFAULT_LIMITS)")
+    parser.add_argument("--solver", choices=SOLVERS, default='auto', help="linear solver backend")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per circuit, the median is reported")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random circuits")
+    parser.add_argument("-o", "--output", default=None, help="file to write the JSON report to (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="earlier report to check for regressions against")
+    parser.add_argument("--ratio", type=float, default=REGRESSION_RATIO, help="slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    sizes, limits = (args.sizes, None) if args.sizes is not None else (list(DEFAULT_SIZES), DEFAULT_LIMITS)
+    report = run_benchmark(args.kinds, sizes, args.solver, args.repeats, not args.no_memory, args.seed, verbose=True, limits=limits)
+    status = 0
+    if args.baseline is not None:
+        with open(args.baseline) as filehandle:
+            report['regressions'] = compare(report, json.load(filehandle), args.ratio)
+        for line in report['regressions']:
+            print("regression: " + line, file=sys.stderr)
+        status = 1 if report['regressions'] else 0
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as filehandle:
+            json.dump(report, filehandle, indent=2)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
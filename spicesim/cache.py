@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+import numpy as np
+
+from evalSpice import Netlist, ElementTable, read_netlist
+
+# Bumped whenever the layout of the compiled netlist changes, so that older cache files are never read back
+CACHE_VERSION = 1
+CACHE_DIR = '__spicecache__'
+
+def netlist_key(filename: str) -> str:
+    """Returns the hex digest identifying the content of a netlist file together with the cache layout."""
+    digest = hashlib.sha256(b'spicesim-%d\0' % CACHE_VERSION)
+    with open(filename, 'rb') as filehandle:
+        for chunk in iter(lambda: filehandle.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def save_netlist(netlist: Netlist, path: str) -> None:
+    """Writes a compiled netlist to an uncompressed .npz file.
+
+    Parameters:
+    netlist(Netlist): The compiled circuit.
+    path(str): The file to write, which is replaced atomically so that concurrent readers never see half of it.
+    """
+    arrays = {'nodes': np.array(list(netlist.node_ids), dtype=str), 'analyses': np.array(json.dumps(netlist.analyses))}
+    for kind, table in netlist.elements.items():
+        arrays[kind + '_names'] = np.array(table.names, dtype=str)
+        arrays[kind + '_nodes'] = table.node_array()
+        arrays[kind + '_values'] = table.value_array()
+    directory = os.path.dirname(path) or '.'
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as filehandle:
+        np.savez(filehandle, **arrays)
+    os.replace(filehandle.name, path)
+
+def load_netlist(path: str) -> Netlist:
+    """Reads back a netlist written by save_netlist, without any text processing of the circuit."""
+    netlist = Netlist()
+    with np.load(path) as data:
+        netlist.node_ids = dict(zip(data['nodes'].tolist(), range(len(data['nodes']))))
+        netlist.analyses = json.loads(data['analyses'].item())
+        for kind in netlist.elements:
+            netlist.elements[kind] = ElementTable.from_arrays(data[kind + '_names'].tolist(), data[kind + '_nodes'], data[kind + '_values'])
+    return netlist
+
+def cached_netlist(filename: str, cache_dir: str = None) -> Netlist:
+    """Compiles a netlist file, reusing the result of an earlier run on the same content.
+
+    Parameters:
+    filename(str): The name of the SPICE file.
+    cache_dir(str): Where the compiled netlists are kept, by default a __spicecache__ folder next to the file.
+
+    Returns:
+    Netlist: The compiled circuit, as read_netlist would return it.
+
+    Entries are named after the file and the SHA-256 of its content, so an edited netlist misses the cache
+    and is parsed again, and its stale entry is then deleted. Files which fail to parse are never cached,
+    so their errors are raised on every run, and an unreadable cache entry is simply rebuilt.
+    """
+    try:
+        key = netlist_key(filename)
+    except (FileNotFoundError, IsADirectoryError):
+        raise FileNotFoundError("Please give the name of a valid SPICE file as input")
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR)
+    stem = os.path.basename(filename) + '.'
+    path = os.path.join(cache_dir, stem + key[:32] + '.npz')
+    if os.path.exists(path):
+        try:
+            return load_netlist(path)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            # Truncated or damaged archives surface as any of these, depending on where the damage is
+            pass
+
+    netlist = read_netlist(filename)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for entry in os.listdir(cache_dir):
+            if entry.startswith(stem) and entry.endswith('.npz') and entry != os.path.basename(path) and len(entry) == len(stem) + 36:
+                os.remove(os.path.join(cache_dir, entry))
+        save_netlist(netlist, path)
+    except OSError:
+        # A read only location only costs the speedup
+        pass
+    return netlist
@@ -1,9 +1,70 @@
 import numpy as np #Numpy is used to populate matrices and solve the equation system
-from typing import List, Dict, Tuple
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import warnings
+import weakref
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
+
+# Scipy is optional, it provides the sparse solver path and reusable LU factorizations
+try:
+    import scipy.linalg as sla
+    import scipy.sparse as sp
+    import scipy.sparse.linalg as spla
+except ImportError:
+    sla = None
+    sp = None
+    spla = None
+
+from topology import check_topology, unknown_blocks, BlockSolver
+from profiling import PipelineStats, condition_estimate, stage_of
 
 START_OF_CIRCUIT = '.circuit'
 END_OF_CIRCUIT = '.end'
 
+# Number of fields, position of the value and error message for every permitted element type
+ELEMENT_SPECS = {
+    'V': (5, 4, "Invalidly specified voltage source element"),
+    'I': (5, 4, "Invalidly specified current source element"),
+    'R': (4, 3, "Invalidly specified resistance element"),
+    'C': (4, 3, "Invalidly specified capacitance element"),
+    'L': (4, 3, "Invalidly specified inductance element"),
+    'D': (4, 3, "Invalidly specified diode element"),
+    'M': (8, 5, "Invalidly specified MOSFET element"),
+}
+
+# Analysis directives that may appear among the components, with their number of fields and error message
+ANALYSIS_SPECS = {
+    '.tran': ((3, 4), "Invalidly specified transient analysis"),
+    '.ac': ((5,), "Invalidly specified AC analysis"),
+}
+
+# Sources keep two values, the one used by DC and transient analyses and their AC small signal magnitude
+SOURCES = ('V', 'I')
+
+# Nonlinear devices, which only the DC operating point of nonlinear.py solves. Diodes are written
+# `Dname anode cathode Is` and MOSFETs `Mname drain gate source nmos|pmos K Vth lambda`, the latter
+# keeping their polarity (+1 or -1), K, Vth and lambda as their four values
+NONLINEAR = ('D', 'M')
+MOSFET_TYPES = {'nmos': 1.0, 'pmos': -1.0}
+# Element kinds with other than two terminals or one value
+TERMINALS = {'M': 3}
+VALUE_WIDTHS = {'V': 2, 'I': 2, 'M': 4}
+
+# Number of unknowns above which the 'auto' solver switches to sparse assembly
+SPARSE_THRESHOLD = 500
+SOLVERS = ('auto', 'dense', 'sparse', 'iterative', 'cg', 'gmres')
+ITERATIVE = ('cg', 'gmres')
+# Default relative residual of the iterative solvers
+ITERATIVE_TOL = 1e-10
+# Number of low rank edits a Circuit accumulates before it refactors its matrix
+LOW_RANK_LIMIT = 32
+
 def parse_file(filename: str) -> List[str]:
     """Parses the circuit file and returns the nodes.
 
@@ -109,109 +170,880 @@ def make_dicts(components: List[List]) -> List[Dict]:
         raise ValueError("No GND node found")
     return [nodes, Resistances, Vsources, Isources]
 
-def evalSpice(filename):
+class ElementTable:
+    """Growable, array backed columns describing all the elements of one kind.
+
+    Every element has a name, a fixed number of terminals and a fixed number of values
+    (the resistance for R, the dc value for V and I). Node ids and values are kept in flat
+    arrays from the array module, which only cost 8 bytes per entry while growing, and are
+    copied into numpy arrays in a single buffer copy when the circuit is stamped.
+    """
+
+    def __init__(self, terminals: int = 2, width: int = 1):
+        self.terminals = terminals
+        self.width = width
+        self.names = []
+        self._index = dict() # Maps the element name to its row in the table
+        self.nodes = array('q')
+        self.values = array('d')
+
+    @classmethod
+    def from_arrays(cls, names: List[str], nodes: np.ndarray, values: np.ndarray) -> 'ElementTable':
+        """Builds a table from the columns returned by node_array and value_array.
+
+        The name index is only built when it is first used, as hashing every name is the slowest part
+        of reloading a large table and most analyses never look elements up by name.
+        """
+        table = cls(nodes.shape[1], values.shape[1])
+        table.names = names
+        table._index = None
+        table.nodes = array('q', np.ascontiguousarray(nodes, dtype=np.int64).tobytes())
+        table.values = array('d', np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        return table
+
+    @property
+    def index(self) -> Dict[str, int]:
+        if self._index is None:
+            self._index = dict(zip(self.names, range(len(self.names))))
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str, nodes: List[int], values: List[float]) -> None:
+        """Appends an element, the first definition wins when a name is repeated."""
+        if name in self.index:
+            return
+        self.index[name] = len(self.names)
+        self.names.append(name)
+        self.nodes.extend(nodes)
+        self.values.extend(values)
+
+    def node_array(self) -> np.ndarray:
+        """Returns the node ids as an (elements x terminals) integer array."""
+        return np.array(self.nodes, dtype=np.int64).reshape(-1, self.terminals)
+
+    def value_array(self) -> np.ndarray:
+        """Returns the values as an (elements x width) float array."""
+        return np.array(self.values, dtype=np.float64).reshape(-1, self.width)
+
+class Netlist:
+    """Compiled form of a circuit, with node names interned to integer ids.
+
+    The ground node ('GND', written as 'n0' internally) always has id 0, the other nodes are
+    numbered in the order they are first seen. Node k is unknown k-1 of the nodal equations,
+    voltage source j is unknown num_nodes-1+j and the inductor branch currents come last.
+    Analysis directives such as .tran are kept in `analyses`, mapping the directive to its fields.
+    """
+
+    def __init__(self):
+        self.node_ids = {'n0': 0}
+        self.elements = {kind: ElementTable(TERMINALS.get(kind, 2), VALUE_WIDTHS.get(kind, 1)) for kind in ELEMENT_SPECS}
+        self.analyses = dict()
+
+    def node_id(self, name: str) -> int:
+        """Returns the id of the node, assigning the next free one to unseen names."""
+        if name == 'GND':
+            name = 'n0'
+        node = self.node_ids.get(name)
+        if node is None:
+            node = len(self.node_ids)
+            self.node_ids[name] = node
+        return node
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def size(self) -> int:
+        """The number of unknowns, which is every node except GND plus every voltage source and inductor."""
+        return self.num_nodes - 1 + len(self.elements['V']) + len(self.elements['L'])
+
+    @property
+    def linear(self) -> bool:
+        """Whether the circuit is free of diodes and MOSFETs, so that its equations are linear."""
+        return all(len(self.elements[kind]) == 0 for kind in NONLINEAR)
+
+    @property
+    def definite(self) -> bool:
+        """Whether the nodal matrix can be symmetric positive definite, which needs a circuit without branch unknowns."""
+        return len(self.elements['V']) == 0 and len(self.elements['L']) == 0
+
+    def branch_offset(self, kind: str) -> int:
+        """Returns the unknown holding the current of the first element of a branch kind ('V' or 'L')."""
+        offset = self.num_nodes - 1
+        return offset if kind == 'V' else offset + len(self.elements['V'])
+
+    def node_names(self) -> List[str]:
+        """Returns the node names ordered by id, with the ground node reported as 'GND'."""
+        names = list(self.node_ids.keys())
+        names[0] = 'GND'
+        return names
+
+def component_values(temp: List[str]) -> List[float]:
+    """Returns the values stored for a component line split into fields.
+
+    Sources given as 'dc' or 'ac' both use their value in DC and transient analyses, as evalSpice always has,
+    and 'ac' sources also drive AC analyses with it as their magnitude. MOSFETs keep their polarity, K, Vth
+    and lambda. Other elements have a single value.
+    """
+    value = float(temp[ELEMENT_SPECS[temp[0][0]][1]])
+    if temp[0][0] in SOURCES:
+        return [value, value if temp[3].lower() == 'ac' else 0.0]
+    if temp[0][0] == 'M':
+        return [MOSFET_TYPES[temp[4].lower()], value, float(temp[6]), float(temp[7])]
+    return [value]
+
+def compile_netlist(nodes: Dict, Resistances: Dict, Vsources: Dict, Isources: Dict) -> Netlist:
+    """Turns the dictionaries built by make_dicts into a Netlist.
+
+    Parameters:
+    nodes(Dict): The nodes of the circuit, as returned by make_dicts.
+    Resistances(Dict), Vsources(Dict), Isources(Dict): The element dictionaries returned by make_dicts.
+
+    Returns:
+    Netlist: The circuit with integer node ids and float values, ready to be stamped.
+
+    Every value is converted from text exactly once here, so the stamping stage only deals with arrays.
+    """
+    netlist = Netlist()
+    for node in nodes.keys():
+        netlist.node_id(node)
+    for kind, table in (('R', Resistances), ('V', Vsources), ('I', Isources)):
+        for name, temp in table.items():
+            netlist.elements[kind].add(name, [netlist.node_id(temp[1]), netlist.node_id(temp[2])], component_values(temp))
+    return netlist
+
+def iter_components(filename: str) -> Iterator[List[str]]:
+    """Reads the circuit file one line at a time and yields the tokens of every component.
+
+    Parameters:
+    filename(str): The name of the SPICE file which needs to be solved for.
+
+    Returns:
+    Iterator[List[str]]: The component lines between .circuit and .end, already split into fields.
+
+    This is the streaming counterpart of parse_file. Comments and blank lines are dropped as the file is
+    read, so the netlist text is never held in memory. The structure of the file can only be verified once
+    the whole file has been seen, so the errors of parse_file are raised when the generator is exhausted.
+    """
+
+    # Check existence of the file and create a filehandle
+    try:
+        filehandle = open(filename, "r")
+    except FileNotFoundError:
+        raise FileNotFoundError("Please give the name of a valid SPICE file as input")
+
+    ckt_count = 0
+    end_count = 0
+    found = 0
+    malformed = False
+    with filehandle:
+        for line in filehandle:
+            line = line.split("#")[0].strip()
+            if line == START_OF_CIRCUIT:
+                ckt_count += 1
+            elif line == END_OF_CIRCUIT:
+                # An end before any start can not enclose a circuit
+                malformed = malformed or ckt_count == 0
+                end_count += 1
+            elif line and ckt_count == 1 and end_count == 0:
+                found += 1
+                yield line.split()
+
+    # Verify proper structure of the SPICE circuit
+    if ckt_count == 0 or end_count == 0 or malformed:
+        raise ValueError("Malformed circuit file")
+    if ckt_count != 1 or end_count != 1:
+        raise ValueError("Netlist has too many start/end identifiers")
+    if found == 0:
+        raise ValueError("No component found in the netlist")
+
+def read_netlist(filename: str) -> Netlist:
+    """Builds a Netlist straight from a SPICE file, without going through parse_file and make_dicts.
+
+    Parameters:
+    filename(str): The name of the SPICE file which needs to be solved for.
+
+    Returns:
+    Netlist: The compiled circuit.
+
+    Node names are interned into integer ids and the elements appended to the growable tables of the
+    Netlist while the file is being read, and nothing is sorted. Memory therefore grows with the number of
+    nodes and elements and not with the size of the text. The same errors as parse_file and make_dicts are
+    raised, with problems in the structure of the file reported before problems in the components.
+    """
+    netlist = Netlist()
+    grounded = False
+    error = None
+    for temp in iter_components(filename):
+        # Keep reading after a bad component so that structural errors still take precedence
+        if error is not None:
+            continue
+        if temp[0].lower() in ANALYSIS_SPECS:
+            fields, message = ANALYSIS_SPECS[temp[0].lower()]
+            if len(temp) not in fields:
+                error = message
+            else:
+                netlist.analyses[temp[0].lower()] = temp[1:]
+            continue
+        if temp[0][0] not in ELEMENT_SPECS:
+            error = "Only " + ", ".join(ELEMENT_SPECS) + " elements are permitted"
+            continue
+        fields, _, message = ELEMENT_SPECS[temp[0][0]]
+        if len(temp) != fields or (temp[0][0] == 'M' and temp[4].lower() not in MOSFET_TYPES):
+            error = message
+            continue
+        nodes = temp[1:1 + TERMINALS.get(temp[0][0], 2)]
+        grounded = grounded or 'GND' in nodes or 'n0' in nodes
+        netlist.elements[temp[0][0]].add(temp[0], [netlist.node_id(node) for node in nodes], component_values(temp))
+
+    if error is not None:
+        raise ValueError(error)
+    # Check for the valid presence of a GND node, otherwise, deem circuit invalid
+    if not grounded:
+        raise ValueError("No GND node found")
+    return netlist
+
+def load_circuit(filename: str, cache: bool = False) -> Netlist:
+    """Compiles a SPICE file with read_netlist, or with the on-disk cache of cache.cached_netlist when `cache` is set."""
+    if cache:
+        from cache import cached_netlist
+        return cached_netlist(filename)
+    return read_netlist(filename)
+
+def conductance_stamps(nodes: np.ndarray, g: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the (row, column, value) triplets of two terminal conductances.
+
+    Parameters:
+    nodes(np.ndarray): An (elements x 2) array of node ids.
+    g(np.ndarray): The conductance of every element.
+
+    Returns:
+    Tuple[np.ndarray]: The four entries of every stamp, with entries on the ground node left in as -1.
+    """
+    a, b = (nodes - 1).T
+    return (np.concatenate((a, b, a, b)), np.concatenate((a, b, b, a)), np.concatenate((g, g, -g, -g)))
+
+def branch_stamps(nodes: np.ndarray, branch: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the +-1 triplets coupling branch current unknowns to the terminals of their elements.
+
+    Parameters:
+    nodes(np.ndarray): An (elements x 2) array of node ids.
+    branch(np.ndarray): The unknown holding the current of every element.
+
+    Returns:
+    Tuple[np.ndarray]: The current entering the KCL rows of both nodes and the voltage across the element
+    in the branch rows, with entries on the ground node left in as -1.
+    """
+    a, b = (nodes - 1).T
+    ones = np.ones(len(branch))
+    return (np.concatenate((a, b, branch, branch)), np.concatenate((branch, branch, a, b)), np.concatenate((ones, -ones, ones, -ones)))
+
+def drop_ground(*stamps: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Joins groups of triplets and removes the entries on the ground node, which is not part of the system."""
+    rows, cols, vals = (np.concatenate(part) for part in zip(*stamps))
+    keep = (rows >= 0) & (cols >= 0)
+    return rows[keep], cols[keep], vals[keep]
+
+def stamp_matrix(netlist: Netlist) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Builds the coefficient matrix of the nodal equations as (row, column, value) triplets.
+
+    Parameters:
+    netlist(Netlist): The compiled circuit.
+
+    Returns:
+    Tuple[np.ndarray]: The row indices, column indices and values, repeated positions are to be summed.
+
+    Each resistor contributes the four entries of its conductance stamp and each voltage source the
+    four +-1 entries coupling its branch current to its terminals. Inductors get a branch like a 0V
+    source, which is their DC behaviour, and capacitors are left open; their dynamic part is given by
+    stamp_reactive. The stamps are produced with whole array operations.
+    """
+    R = netlist.elements['R']
+    V = netlist.elements['V']
+    L = netlist.elements['L']
+
+    resistance = R.value_array()[:, 0]
+    if np.any(resistance == 0):
+        raise ValueError("Short circuit leading to infinite current encountered")
+    return drop_ground(
+        conductance_stamps(R.node_array(), 1 / resistance),
+        branch_stamps(V.node_array(), netlist.branch_offset('V') + np.arange(len(V))),
+        branch_stamps(L.node_array(), netlist.branch_offset('L') + np.arange(len(L))),
+    )
+
+def stamp_reactive(netlist: Netlist) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Builds the matrix multiplying the time derivative of the unknowns, as (row, column, value) triplets.
+
+    Parameters:
+    netlist(Netlist): The compiled circuit.
+
+    Returns:
+    Tuple[np.ndarray]: The row indices, column indices and values, repeated positions are to be summed.
+
+    Together with stamp_matrix this describes the circuit as G x + C dx/dt = b. Capacitors stamp their
+    capacitance like a conductance and every inductor puts -L on the diagonal of its branch row.
+    """
+    C = netlist.elements['C']
+    L = netlist.elements['L']
+    branch = netlist.branch_offset('L') + np.arange(len(L))
+    return drop_ground(
+        conductance_stamps(C.node_array(), C.value_array()[:, 0]),
+        (branch, branch, -L.value_array()[:, 0]),
+    )
+
+def stamp_rhs(netlist: Netlist, vvalues: np.ndarray = None, ivalues: np.ndarray = None) -> np.ndarray:
+    """Builds the constants of the nodal equations.
+
+    Parameters:
+    netlist(Netlist): The compiled circuit.
+    vvalues(np.ndarray): Voltage source values, defaults to those in the netlist. A 2D array with one
+    column per operating point gives one right hand side per column.
+    ivalues(np.ndarray): Current source values, with the same conventions as vvalues.
+
+    Returns:
+    np.ndarray: The right hand side, of shape (size,) or (size, columns).
+    """
+    n = netlist.num_nodes - 1
+    V = netlist.elements['V']
+    I = netlist.elements['I']
+    if vvalues is None:
+        vvalues = V.value_array()[:, 0]
+    if ivalues is None:
+        ivalues = I.value_array()[:, 0]
+    vvalues = np.asarray(vvalues, dtype=float)
+    ivalues = np.asarray(ivalues, dtype=float)
+
+    rhs = np.zeros((netlist.size,) + np.broadcast_shapes(vvalues.shape[1:], ivalues.shape[1:]))
+    # A current source drives its value out of the first node and into the second
+    ia, ib = (I.node_array() - 1).T
+    np.add.at(rhs, ia[ia >= 0], -ivalues[ia >= 0])
+    np.add.at(rhs, ib[ib >= 0], ivalues[ib >= 0])
+    rhs[n:n + len(V)] += vvalues
+    return rhs
+
+def solution_dicts(netlist: Netlist, ans: np.ndarray) -> Tuple[Dict, Dict]:
+    """Maps a solution vector back to the node voltage and source current dictionaries."""
+    n = netlist.num_nodes - 1
+    nodeV = dict(zip(netlist.node_names(), [0.0] + ans[:n].tolist()))
+    sourceI = dict(zip(netlist.elements['V'].names, ans[n:n + len(netlist.elements['V'])].tolist()))
+    return (nodeV, sourceI)
+
+def choose_solver(solver: str, size: int, definite: bool = False) -> str:
+    """Resolves the solver keyword into the backend that will be used.
+
+    Parameters:
+    solver(str): One of 'auto', 'dense', 'sparse', 'iterative', 'cg' or 'gmres'.
+    size(int): The number of unknowns in the system.
+    definite(bool): Whether the matrix is symmetric positive definite, which is the case for circuits
+    without voltage sources and inductors.
+
+    Returns:
+    str: One of 'dense', 'sparse', 'cg' or 'gmres'.
+
+    'auto' picks the sparse backend once the system grows past SPARSE_THRESHOLD unknowns, provided
+    scipy is available, and the dense numpy backend otherwise. 'iterative' picks conjugate gradients
+    for definite matrices and GMRES once voltage source rows make the matrix indefinite.
+    """
+    if solver not in SOLVERS:
+        raise ValueError("Unknown solver, expected one of " + ", ".join(SOLVERS))
+    if solver not in ('auto', 'dense') and sp is None:
+        raise ImportError("The " + solver + " solver requires scipy to be installed")
+    if solver == 'iterative':
+        return 'cg' if definite else 'gmres'
+    if solver == 'cg' and not definite:
+        raise ValueError("Conjugate gradients need a circuit without voltage sources or inductors")
+    if solver == 'auto':
+        if sp is not None and size > SPARSE_THRESHOLD:
+            return 'sparse'
+        return 'dense'
+    return solver
+
+def factorize(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, size: int, solver: str, tol: float = ITERATIVE_TOL, precond: str = 'ilu') -> Callable[[np.ndarray], np.ndarray]:
+    """Assembles the coefficient matrix from (row, column, value) triplets and factors it.
+
+    Parameters:
+    rows(np.ndarray): Row indices of the matrix entries.
+    cols(np.ndarray): Column indices of the matrix entries.
+    vals(np.ndarray): Values of the matrix entries, repeated positions are summed.
+    size(int): The number of unknowns.
+    solver(str): 'dense' to factor a numpy array, 'sparse' to use a CSR matrix and a sparse LU,
+    'cg' or 'gmres' to solve iteratively.
+    tol(float), precond(str): The relative tolerance and preconditioner of the iterative solvers.
+
+    Returns:
+    Callable[[np.ndarray], np.ndarray]: A function solving the system for a right hand side, or for
+    a 2D array holding one right hand side per column. The direct solvers also have a `transposed`
+    attribute solving with the transposed matrix from the same factors.
+
+    The LU factors are computed once, so every later solve is only a pair of triangular solves.
+    The dense path needs O(n^2) memory, the sparse one only stores the nonzero entries, which is
+    a handful per row for a resistor network. The iterative solvers only keep the matrix and a
+    preconditioner, see iterative.IterativeSolver. Singular circuits raise a ValueError.
+    """
+    if solver in ITERATIVE:
+        from iterative import IterativeSolver
+        return IterativeSolver(sp.csr_matrix((vals, (rows, cols)), shape=(size, size)), solver, tol, precond)
+
+    if solver == 'sparse':
+        coeffs = sp.csr_matrix((vals, (rows, cols)), shape=(size, size))
+        try:
+            # splu works on CSC and raises a RuntimeError when the matrix is singular. Nodal matrices are
+            # structurally symmetric, so ordering on A^T+A gives much less fill-in than the default
+            lu = spla.splu(coeffs.tocsc(), permc_spec='MMD_AT_PLUS_A')
+        except RuntimeError:
+            raise ValueError("Circuit error: no solution")
+
+        def solve(consts):
+            ans = lu.solve(consts)
+            if not np.all(np.isfinite(ans)):
+                raise ValueError("Circuit error: no solution")
+            return ans
+        solve.transposed = lambda consts: lu.solve(consts, 'T')
+        return solve
+
+    coeffs = np.zeros((size, size))
+    np.add.at(coeffs, (rows, cols), vals)
+    if sla is None:
+        # Without scipy there is no reusable factorization, every solve starts from scratch
+        def solve(consts):
+            try:
+                return np.linalg.solve(coeffs, consts)
+            except np.linalg.LinAlgError:
+                raise ValueError("Circuit error: no solution")
+        solve.transposed = lambda consts: np.linalg.solve(coeffs.T, consts)
+        return solve
+
+    # lu_factor only warns about exactly singular matrices, so check the pivots ourselves
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", sla.LinAlgWarning)
+        lu, piv = sla.lu_factor(coeffs)
+    if size == 0 or np.any(np.diag(lu) == 0):
+        raise ValueError("Circuit error: no solution")
+    def solve(consts):
+        return sla.lu_solve((lu, piv), consts)
+    solve.transposed = lambda consts: sla.lu_solve((lu, piv), consts, trans=1)
+    return solve
+
+class FixedPattern:
+    """Assembles and solves a series of matrices whose nonzero positions never change.
+
+    The matrices are the sum of fixed entries, added up once, and varying entries whose values are given
+    to every solve, on positions that are known up front. The slot of every entry in the assembled matrix
+    is worked out once, so assembling is a single scatter of the varying values. The sparse backend also
+    keeps the fill reducing ordering of its first factorization and applies it to the slots as a symmetric
+    permutation of the unknowns, so that later factorizations skip the ordering and only redo the numeric
+    part. The dense backend can solve a batch of matrices with one stacked call.
+    """
+
+    def __init__(self, size: int, solver: str, fixed: Tuple[np.ndarray, np.ndarray, np.ndarray], rows: np.ndarray, cols: np.ndarray):
+        if solver not in ('dense', 'sparse'):
+            raise ValueError("A fixed pattern needs the dense or sparse solver")
+        self.size = size
+        self.solver = solver
+        self.fixed = fixed
+        self.varying = (rows, cols)
+        self.order = None
+        self._slots(np.arange(size))
+
+    def _slots(self, position: np.ndarray) -> None:
+        """Works out the slot of every fixed and varying entry, with unknown k moved to position[k]."""
+        size = self.size
+        rows = position[np.concatenate((self.fixed[0], self.varying[0]))]
+        cols = position[np.concatenate((self.fixed[1], self.varying[1]))]
+        if self.solver == 'sparse':
+            # Sorting by column and then row gives the CSC layout, repeated positions share a slot
+            keys, slots = np.unique(cols * size + rows, return_inverse=True)
+            self.indices = keys % size
+            self.indptr = np.searchsorted(keys // size, np.arange(size + 1))
+            self.nnz = len(keys)
+        else:
+            slots = rows * size + cols
+            self.nnz = size * size
+        fixed_slots, self.slots = np.split(slots.ravel(), [len(self.fixed[0])])
+        self.base = np.bincount(fixed_slots, self.fixed[2], minlength=self.nnz)
+
+    def data(self, vals: np.ndarray) -> np.ndarray:
+        """Returns the slot values for the varying values, or a (batch x slots) array for a (batch x varying) one."""
+        if vals.ndim == 1:
+            return self.base + np.bincount(self.slots, vals, minlength=self.nnz)
+        data = np.repeat(self.base[:, None], len(vals), axis=1)
+        np.add.at(data, self.slots, vals.T)
+        return data.T
+
+    def solve(self, vals: np.ndarray, consts: np.ndarray) -> np.ndarray:
+        """Assembles the matrix for the varying values and solves it for a right hand side."""
+        data = self.data(vals)
+        try:
+            if self.solver == 'dense':
+                ans = np.linalg.solve(data.reshape(self.size, self.size), consts)
+            elif self.order is None:
+                lu = spla.splu(sp.csc_matrix((data, self.indices, self.indptr), shape=(self.size, self.size)), permc_spec='MMD_AT_PLUS_A')
+                ans = lu.solve(consts)
+                # perm_c sends column k to position perm_c[k], which is kept for the rows as well so that
+                # the diagonal of the nodal matrix stays on the diagonal
+                self.order = np.argsort(lu.perm_c)
+                self._slots(lu.perm_c)
+            else:
+                lu = spla.splu(sp.csc_matrix((data, self.indices, self.indptr), shape=(self.size, self.size)), permc_spec='NATURAL')
+                ans = np.empty(consts.shape)
+                ans[self.order] = lu.solve(consts[self.order])
+        except (RuntimeError, np.linalg.LinAlgError):
+            raise ValueError("Circuit error: no solution")
+        if not np.all(np.isfinite(ans)):
+            raise ValueError("Circuit error: no solution")
+        return ans
+
+    def solve_batch(self, vals: np.ndarray, consts: np.ndarray) -> np.ndarray:
+        """Solves a (batch x varying) array of values against a (batch x size) array of right hand sides."""
+        if self.solver == 'sparse':
+            return np.array([self.solve(v, c) for v, c in zip(vals, consts)]).reshape(consts.shape)
+        try:
+            ans = np.linalg.solve(self.data(vals).reshape(-1, self.size, self.size), consts[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            raise ValueError("Circuit error: no solution")
+        if not np.all(np.isfinite(ans)):
+            raise ValueError("Circuit error: no solution")
+        return ans
+
+class Circuit:
+    """A circuit whose coefficient matrix is assembled and factored once.
+
+    The topology of the circuit fixes the matrix, the values of the voltage and current sources
+    only show up in the constants. A Circuit keeps the LU factors around so that sweeping the
+    sources costs a pair of triangular solves per operating point instead of a fresh solve. With
+    an iterative solver it keeps the preconditioner instead and warm starts every solve from the
+    previous solution.
+
+    Resistors can be changed or added after the matrix has been factored. Each edit is a rank one
+    update of the matrix, which the Sherman-Morrison-Woodbury formula folds into every later solve
+    at the cost of one extra solve per edited element, so the matrix is only refactored once
+    LOW_RANK_LIMIT elements have been edited.
+
+    Before anything is factored the connectivity of the circuit is checked for floating nodes and
+    loops of voltage sources, and circuits made of several parts only joined at GND are split into
+    independent blocks that are factored and solved separately, on `workers` threads. The thread pool
+    is started on the first such factorization and reused by every later one, close() or leaving a
+    with block shuts it down.
+
+    Given a profiling.PipelineStats, the time and memory of every stage are recorded in it together
+    with the size, nonzero count and condition estimate of the matrix and the solver used.
+    """
+
+    def __init__(self, netlist: Netlist, solver: str = 'auto', tol: float = ITERATIVE_TOL, precond: str = 'ilu', workers: int = 1, stats: PipelineStats = None):
+        if not netlist.linear:
+            raise ValueError("Diodes and MOSFETs need the nonlinear operating point solver")
+        self.netlist = netlist
+        self.solver = choose_solver(solver, netlist.size, netlist.definite)
+        self._requested = solver
+        self._options = (tol, precond)
+        self.workers = workers
+        self.stats = stats
+        self._pool = None
+        self.refactor()
+
+    def _thread_pool(self) -> Optional[ThreadPoolExecutor]:
+        """The pool the blocks are solved on, started once and shut down with the circuit."""
+        if self._pool is None and self.workers > 1:
+            self._pool = ThreadPoolExecutor(self.workers)
+            # A circuit that is never closed still stops its threads once it is collected
+            self._finalizer = weakref.finalize(self, self._pool.shutdown, wait=False)
+        return self._pool
+
+    def close(self) -> None:
+        """Shuts down the thread pool of the circuit, a later refactorization starts a new one."""
+        if self._pool is not None:
+            self._finalizer()
+            self._pool = None
+
+    def __enter__(self) -> 'Circuit':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def refactor(self) -> None:
+        """Stamps and factors the matrix of the netlist, folding in the edits made so far."""
+        with stage_of(self.stats, 'topology'):
+            check_topology(self.netlist)
+        with stage_of(self.stats, 'stamp'):
+            rows, cols, vals = stamp_matrix(self.netlist)
+            blocks = unknown_blocks(self.netlist)
+        with stage_of(self.stats, 'factor'):
+            if len(blocks) == 1:
+                self._solve = factorize(rows, cols, vals, self.netlist.size, self.solver, *self._options)
+            else:
+                # Every block picks its own backend from its size
+                definite = self.netlist.definite
+                def factor(rows, cols, vals, size):
+                    return factorize(rows, cols, vals, size, choose_solver(self._requested, size, definite), *self._options)
+                self._solve = BlockSolver(rows, cols, vals, blocks, factor, self._thread_pool())
+        if self.stats is not None:
+            size = self.netlist.size
+            with self.stats.stage('condition'):
+                condition = condition_estimate(rows, cols, vals, size, self._solve)
+            self.stats.record(size=size, nnz=int(len(np.unique(rows * size + cols))), solver=self.solver, blocks=len(blocks),
+                              elements={kind: len(table) for kind, table in self.netlist.elements.items()}, condition=condition)
+        # Every edited element maps to its terminal unknowns, its change of conductance since the last
+        # factorization and the solution of the factored system for its incidence vector
+        self._edits = dict()
+
+    @classmethod
+    def from_file(cls, filename: str, solver: str = 'auto', tol: float = ITERATIVE_TOL, precond: str = 'ilu', workers: int = 1, cache: bool = False) -> 'Circuit':
+        """Builds a Circuit from a SPICE file with the streaming parser, running the same checks as evalSpice."""
+        return cls(load_circuit(filename, cache), solver, tol, precond, workers)
+
+    @property
+    def iterations(self) -> List[int]:
+        """The iteration count of every solve so far with an iterative solver, None with a direct one."""
+        return getattr(self._solve, 'iterations', None)
+
+    @property
+    def node_names(self) -> List[str]:
+        return self.netlist.node_names()
+
+    @property
+    def source_names(self) -> List[str]:
+        """The voltage sources followed by the current sources, the column order used by solve_many."""
+        return self.netlist.elements['V'].names + self.netlist.elements['I'].names
+
+    def set_resistance(self, name: str, value: float) -> None:
+        """Changes the value of a resistor, an infinite value removes it from the circuit.
+
+        Parameters:
+        name(str): The name of the resistor.
+        value(float): The new resistance.
+        """
+        R = self.netlist.elements['R']
+        if name not in R.index:
+            raise KeyError("Unknown resistor " + name)
+        if value == 0:
+            raise ValueError("Short circuit leading to infinite current encountered")
+        row = R.index[name]
+        delta = 1 / value - 1 / R.values[row]
+        R.values[row] = value
+        self._edit(name, R.nodes[2 * row], R.nodes[2 * row + 1], delta)
+
+    def add_resistor(self, name: str, node1: str, node2: str, value: float) -> None:
+        """Adds a resistor between two nodes which are already part of the circuit.
+
+        Parameters:
+        name(str): The name of the new resistor.
+        node1(str), node2(str): The nodes it connects.
+        value(float): The resistance.
+        """
+        if name in self.netlist.elements['R'].index:
+            raise ValueError("Element " + name + " already exists")
+        if value == 0:
+            raise ValueError("Short circuit leading to infinite current encountered")
+        nodes = []
+        for node in (node1, node2):
+            node = 'n0' if node == 'GND' else node
+            if node not in self.netlist.node_ids:
+                raise KeyError("Unknown node " + node)
+            nodes.append(self.netlist.node_ids[node])
+        self.netlist.elements['R'].add(name, nodes, [value])
+        self._edit(name, nodes[0], nodes[1], 1 / value)
+
+    def _edit(self, name: str, node1: int, node2: int, delta: float) -> None:
+        """Records a change of conductance between two nodes as a rank one update of the factored matrix."""
+        if name in self._edits:
+            self._edits[name][1] += delta
+        elif len(self._edits) >= LOW_RANK_LIMIT:
+            self.refactor()
+        else:
+            # The incidence vector has +1 and -1 at the two terminals, which ground drops
+            u = np.zeros(self.netlist.size)
+            u[node1 - 1] += node1 > 0
+            u[node2 - 1] -= node2 > 0
+            self._edits[name] = [(node1 - 1, node2 - 1), delta, self._solve(u)]
+
+    def _solve_edited(self, consts: np.ndarray) -> np.ndarray:
+        """Solves with the factored matrix and corrects the answer for the edits made since.
+
+        With the edits written as A + U D U^T, Woodbury gives the solution as y - Z S^-1 U^T y, where
+        y = A^-1 b, Z = A^-1 U and S = D^-1 + U^T Z is a small matrix with one row per edited element.
+        """
+        y = self._solve(consts)
+        edits = [edit for edit in self._edits.values() if edit[1] != 0]
+        if not edits:
+            return y
+        a, b = np.array([edit[0] for edit in edits]).T
+        delta = np.array([edit[1] for edit in edits])
+        # A trailing zero row stands for the ground node, which index -1 picks up
+        Z = np.vstack((np.column_stack([edit[2] for edit in edits]), np.zeros(len(edits))))
+        y_ext = np.concatenate((y, np.zeros((1,) + y.shape[1:])))
+        S = np.diag(1 / delta) + (Z[a] - Z[b])
+        try:
+            return y - Z[:-1] @ np.linalg.solve(S, y_ext[a] - y_ext[b])
+        except np.linalg.LinAlgError:
+            raise ValueError("Circuit error: no solution")
+
+    def solve(self, source_overrides: Dict[str, float] = None) -> Tuple[Dict, Dict]:
+        """Solves the circuit, optionally with new values for some of the sources.
+
+        Parameters:
+        source_overrides(Dict[str, float]): Maps source names to the value to use instead of the one in the netlist.
+
+        Returns:
+        Tuple[Dict]: The node voltages and the currents through the voltage sources, as returned by evalSpice.
+        """
+        V = self.netlist.elements['V']
+        I = self.netlist.elements['I']
+        vvalues = V.value_array()[:, 0]
+        ivalues = I.value_array()[:, 0]
+        for name, value in (source_overrides or {}).items():
+            if name in V.index:
+                vvalues[V.index[name]] = value
+            elif name in I.index:
+                ivalues[I.index[name]] = value
+            else:
+                raise KeyError("Unknown source " + name)
+        with stage_of(self.stats, 'rhs'):
+            consts = stamp_rhs(self.netlist, vvalues, ivalues)
+        with stage_of(self.stats, 'solve'):
+            ans = self._solve_edited(consts)
+        if self.stats is not None and self.iterations is not None:
+            self.stats.record(iterations=list(self.iterations))
+        return solution_dicts(self.netlist, ans)
+
+    def solve_many(self, source_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Solves the circuit for many sets of source values at once.
+
+        Parameters:
+        source_values(np.ndarray): A (points x sources) array, whose columns follow source_names.
+
+        Returns:
+        Tuple[np.ndarray]: The node voltages as a (points x nodes) array with columns following
+        node_names, and the voltage source currents as a (points x voltage sources) array.
+        """
+        source_values = np.atleast_2d(np.asarray(source_values, dtype=float))
+        nv = len(self.netlist.elements['V'])
+        if source_values.shape[1] != len(self.source_names):
+            raise ValueError("Expected one column per source")
+        ans = self._solve_edited(stamp_rhs(self.netlist, source_values[:, :nv].T, source_values[:, nv:].T))
+        n = self.netlist.num_nodes - 1
+        nodeV = np.zeros((source_values.shape[0], n + 1))
+        nodeV[:, 1:] = ans[:n].T
+        return nodeV, ans[n:n + nv].T.copy()
+
+def evalSpice(filename, solver='auto', tol=ITERATIVE_TOL, precond='ilu', cache=False, stats=False):
     """
     Evaluates the SPICE circuit and returns node voltages and currents through voltage sources.
 
     Parameters:
     filename(str): The name of the file which contains the circuit to be evaluated.
+    solver(str): 'dense', 'sparse' or 'auto' (default), which picks sparse for large circuits, or 'iterative',
+    'cg' or 'gmres' for a preconditioned iterative solve. Circuits with diodes or MOSFETs need a direct solver.
+    tol(float): The relative residual at which the iterative solvers stop.
+    precond(str): The preconditioner of the iterative solvers, 'ilu', 'jacobi', 'amg' or None.
+    cache(bool): Whether to keep the compiled circuit in a __spicecache__ folder next to the file, so that
+    later runs on the unchanged file skip parsing.
+    stats(bool): Whether to profile the solve, see profiling.PipelineStats. Tracing memory slows down the
+    stages which create many Python objects, parsing above all, so 'time' records the times alone.
 
     Returns:
     Tuple[Dict]: Two dictionaries. The first contains the node voltages of all the nodes in the circuit while
-    the second contains the currents through the voltage sources.
+    the second contains the currents through the voltage sources. With `stats` a third dictionary holds the
+    time and peak memory of the parse, topology, stamp, factor, rhs and solve stages, the size, nonzero
+    count and condition estimate of the matrix and the solver used.
 
     This function runs all routine checks on the file given as input to solve for the circuit variables. It is 
-    assumed that the circuit consists purely of resistances, and independent current and voltage sources and 
-    will raise errors when not compliant. It also runs checks on the solvability of the circuit and returns the 
-    solved variables for evaluation.
+    assumed that the circuit consists purely of resistances, capacitances, inductances, diodes, MOSFETs and
+    independent current and voltage sources and will raise errors when not compliant. Capacitors are open and
+    inductors are shorts at DC. Circuits with diodes or MOSFETs are solved by Newton iteration, see
+    nonlinear.operating_point. It also runs checks on the solvability of the circuit and returns the solved
+    variables for evaluation.
     """
+    if stats:
+        return _profiled_evalSpice(filename, solver, tol, precond, cache, stats != 'time')
+    netlist = load_circuit(filename, cache)
+    if not netlist.linear:
+        from nonlinear import operating_point
+        return operating_point(netlist, solver)[:2]
+    # Building the circuit stamps and factors the nodal equations with the chosen backend,
+    # singular circuits raise a ValueError
+    return Circuit(netlist, solver, tol, precond).solve()
 
-    components = parse_file(filename)
-    nodes, Resistances, Vsources, Isources = make_dicts(components)
-    
-    # Ensure the nodes dictionary contains only unique nodes without redundancies
-    for node in nodes.keys():
-        nodes[node] = list(dict.fromkeys(nodes[node]))
-    
-    # Create mappings of the nodes in the circuit to whole numbers which are used to index the coefficient matrix
-    nodemap = {}
-    i = 0
-    for key in nodes.keys():
-        if not key == 'n0': #Ignore GND node
-            nodemap[key] = i
-            i += 1
-    # The index i is carefully handled to ensure the matrix is of the form required to solve
-    # Create mappings of the voltage sources in the circuit to whole numbers, similar to node mapping above
-    vsource_map = {}
-    for v in Vsources.keys():
-        vsource_map[v] = i
-        i += 1
-    
-    # Compute the number of rows and columns the coefficient matrix will have
-    num_rows = len(nodes.keys()) + len(Vsources) - 1 # Ignoring the GND node
-    num_cols = num_rows
+def _profiled_evalSpice(filename: str, solver: str, tol: float, precond: str, cache: bool, memory: bool) -> Tuple[Dict, Dict, Dict]:
+    """Runs evalSpice stage by stage under a PipelineStats, kept apart so that unprofiled runs pay nothing for it."""
+    stats = PipelineStats(memory)
+    with stats.stage('parse'):
+        netlist = load_circuit(filename, cache)
+    if not netlist.linear:
+        from nonlinear import operating_point
+        with stats.stage('newton'):
+            nodeV, sourceI, newton = operating_point(netlist, solver)
+        stats.record(size=netlist.size, solver='newton', newton=newton)
+        return (nodeV, sourceI, stats.as_dict())
+    nodeV, sourceI = Circuit(netlist, solver, tol, precond, stats=stats).solve()
+    return (nodeV, sourceI, stats.as_dict())
 
-    # Initializing numpy zero matrices for coefficients and constants
-    coeffs = np.zeros((num_rows, num_cols))
-    consts = np.zeros((num_rows, 1))
-    
-    # Populating the matrices according to nodal analysis equations
-    i = 0
-    for node in nodes.keys():
-        if not node == 'n0':
-            for element in nodes[node]:
-                if element[0] == 'R':
-                    if float(Resistances[element][3]) == 0:
-                        raise ValueError("Short circuit leading to infinite current encountered")
-                    if Resistances[element][1] == node:
-                        coeffs[i][nodemap[Resistances[element][1]]] += 1/float(Resistances[element][3])
-                    elif Resistances[element][1] != 'n0':
-                        coeffs[i][nodemap[Resistances[element][1]]] -= 1 / float(Resistances[element][3])
-                    if Resistances[element][2] == node:
-                        coeffs[i][nodemap[Resistances[element][2]]] += 1/float(Resistances[element][3])
-                    elif Resistances[element][2] != 'n0':
-                        coeffs[i][nodemap[Resistances[element][2]]] -= 1 / float(Resistances[element][3])
-               
-                elif element[0] == 'I':
-                    if Isources[element][1] == node:
-                        consts[i][0] -= float(Isources[element][4])
-                    else:
-                        consts[i][0] += float(Isources[element][4])
-                
-                elif element[0] == 'V':
-                    if Vsources[element][1] == node:
-                        coeffs[i][vsource_map[element]] += 1 
-                    elif Vsources[element][2] == node:
-                        coeffs[i][vsource_map[element]] -= 1
-            i += 1
-
-    for v in Vsources.keys():
-        if not Vsources[v][1] == 'n0':
-            coeffs[i][nodemap[Vsources[v][1]]] += 1
-
-        if not Vsources[v][2] == 'n0':
-            coeffs[i][nodemap[Vsources[v][2]]] -= 1
-        consts[i] += float(Vsources[v][4])
-        i+=1
-
-    # Use numpy to solve the system and raise an error if the circuit is unsolvable
+def _eval_one(filename: str, solver: str, cache: bool = False, stats: bool = False) -> Tuple[str, Optional[Tuple[Dict, Dict]], Optional[Exception]]:
+    """Runs evalSpice on one file for evalSpice_many, turning the expected errors into results."""
     try:
-        ans = np.linalg.solve(coeffs, consts)
-    except np.linalg.LinAlgError:
-        raise ValueError("Circuit error: no solution")
-    
-    # Create the return dictionaries by mapping the solution values to the corresponding nodes
-    nodeV = dict()
-    for key in nodes.keys():
-        if key == 'n0':
-            nodeV['GND'] = float(0)
+        return (filename, evalSpice(filename, solver, cache=cache, stats=stats), None)
+    except (ValueError, FileNotFoundError) as error:
+        return (filename, None, error)
+
+def evalSpice_many(filenames: Iterable[str], workers: int = None, solver: str = 'auto', chunksize: int = None, cache: bool = False, stats: bool = False) -> Iterator[Tuple[str, Optional[Tuple[Dict, Dict]], Optional[Exception]]]:
+    """
+    Evaluates many SPICE files over a pool of worker processes.
+
+    Parameters:
+    filenames(Iterable[str]): The names of the files to be evaluated.
+    workers(int): The number of processes, defaults to the number of CPUs. With 1 worker the files are
+    evaluated in the calling process.
+    solver(str): The solver passed on to evalSpice.
+    chunksize(int): The number of files handed to a worker at a time, by default the files are split into
+    about four chunks per worker to keep the dispatch overhead low while balancing the load.
+    cache(bool): Whether the compiled circuits are cached on disk, as for evalSpice.
+    stats(bool): Whether every result also carries the profile of its solve, as for evalSpice.
+
+    Returns:
+    Iterator[Tuple]: A (filename, result, error) tuple per file, in the order the files finish. The result is
+    the tuple returned by evalSpice, or None when the file raised a ValueError or a
+    FileNotFoundError, which is then given as the error. Such errors do not stop the rest of the batch.
+    """
+    filenames = list(filenames)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    task = functools.partial(_eval_one, solver=solver, cache=cache, stats=stats)
+    if workers <= 1 or len(filenames) <= 1:
+        yield from map(task, filenames)
+        return
+    if chunksize is None:
+        chunksize = max(1, len(filenames) // (4 * workers))
+    with multiprocessing.Pool(min(workers, len(filenames))) as pool:
+        yield from pool.imap_unordered(task, filenames, chunksize)
+
+def main(argv: List[str] = None) -> int:
+    """Command line entry point, evaluates the given files and prints one JSON object per line.
+
+    Returns:
+    int: The exit status, 1 if any of the files could not be evaluated.
+    """
+    parser = argparse.ArgumentParser(description="Solve SPICE netlists of V, I and R elements.")
+    parser.add_argument("files", nargs="+", help="the netlist files to evaluate")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes (default: all CPUs)")
+    parser.add_argument("--solver", choices=SOLVERS, default='auto', help="linear solver backend")
+    parser.add_argument("--cache", action="store_true", help="cache the compiled netlists next to the files")
+    parser.add_argument("--stats", nargs="?", const=True, choices=[True, 'time'], default=False, help="add the time and memory of every stage to the output, or only the time with --stats time")
+    args = parser.parse_args(argv)
+
+    status = 0
+    for filename, result, error in evalSpice_many(args.files, args.workers, args.solver, cache=args.cache, stats=args.stats):
+        if error is not None:
+            status = 1
+            record = {"file": filename, "error": str(error)}
         else:
-            nodeV[key] = float(ans[nodemap[key]][0])
-    
-    sourceI = dict()
-    for key in Vsources.keys():
-        sourceI[key] = float(ans[vsource_map[key]][0])
-    
-    # Returns dictionaries for evaluation
-    return (nodeV, sourceI)
+            record = {"file": filename, "nodeV": result[0], "sourceI": result[1]}
+            if args.stats:
+                record["stats"] = result[2]
+        print(json.dumps(record), flush=True)
+    return status
 
+if __name__ == "__main__":
+    sys.exit(main())
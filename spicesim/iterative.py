@@ -0,0 +1,119 @@
+import numpy as np
+from typing import List
+
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+# pyamg is optional and only needed for the algebraic multigrid preconditioner
+try:
+    import pyamg
+except ImportError:
+    pyamg = None
+
+METHODS = ('cg', 'gmres')
+PRECONDITIONERS = ('ilu', 'jacobi', 'amg', None)
+
+def preconditioner(coeffs: sp.csr_matrix, method: str, precond: str) -> spla.LinearOperator:
+    """Builds the preconditioner of an iterative solve.
+
+    Parameters:
+    coeffs(sp.csr_matrix): The coefficient matrix.
+    method(str): 'cg' or 'gmres', CG needs a symmetric preconditioner.
+    precond(str): 'ilu' for an incomplete factorization, 'jacobi' for the inverse diagonal, 'amg' for a
+    smoothed aggregation multigrid cycle (CG only, needs pyamg) or None.
+
+    Returns:
+    spla.LinearOperator: The preconditioner, or None.
+
+    For CG the incomplete factorization runs in SuperLU's symmetric mode, without pivoting away from the
+    diagonal. Dropping small entries leaves its upper factor out of step with the lower one, so the ILU
+    solve itself is not symmetric and CG may stall on it. Only the unit lower factor L and the pivots D
+    are kept instead, and applied as (L D L^T)^-1 in the fill reducing order, which is symmetric, and
+    positive definite whenever every pivot is positive. Should a pivot not be, CG falls back to Jacobi.
+    """
+    if precond not in PRECONDITIONERS:
+        raise ValueError("Unknown preconditioner, expected one of ilu, jacobi, amg or None")
+    if precond is None:
+        return None
+    if precond == 'jacobi':
+        return jacobi(coeffs)
+    if precond == 'amg':
+        if pyamg is None:
+            raise ImportError("The amg preconditioner requires pyamg to be installed")
+        if method != 'cg':
+            raise ValueError("The amg preconditioner is only available with cg")
+        return pyamg.smoothed_aggregation_solver(coeffs).aspreconditioner(cycle='V')
+
+    options = dict(drop_tol=1e-4, fill_factor=10, permc_spec='MMD_AT_PLUS_A')
+    if method == 'cg':
+        options.update(diag_pivot_thresh=0, options=dict(SymmetricMode=True))
+    try:
+        ilu = spla.spilu(coeffs.tocsc(), **options)
+    except RuntimeError:
+        raise ValueError("Circuit error: no solution")
+    if method != 'cg':
+        return spla.LinearOperator(coeffs.shape, matvec=ilu.solve)
+
+    pivots = ilu.U.diagonal()
+    if not (np.array_equal(ilu.perm_r, ilu.perm_c) and np.all(pivots > 0)):
+        return jacobi(coeffs)
+    order = ilu.perm_c
+    lower = ilu.L.tocsr()
+    upper = ilu.L.T.tocsr()
+    def solve(x):
+        # Element i of the system is row order[i] of the factors
+        permuted = np.empty_like(x)
+        permuted[order] = x
+        y = spla.spsolve_triangular(lower, permuted, lower=True, unit_diagonal=True)
+        y = spla.spsolve_triangular(upper, y / pivots, lower=False, unit_diagonal=True)
+        return y[order]
+    return spla.LinearOperator(coeffs.shape, matvec=solve)
+
+def jacobi(coeffs: sp.csr_matrix) -> spla.LinearOperator:
+    """The inverse diagonal of the matrix as a preconditioner."""
+    diagonal = coeffs.diagonal()
+    # Voltage source rows have no diagonal entry and are left unscaled
+    diagonal[diagonal == 0] = 1
+    return spla.LinearOperator(coeffs.shape, matvec=lambda x: x / diagonal)
+
+class IterativeSolver:
+    """Solves a sparse system with a preconditioned Krylov method.
+
+    Instances are used in place of the LU factors returned by evalSpice.factorize. The last solution is
+    kept as the initial guess of the next solve, so that sweeps and repeated solves of slowly changing
+    circuits start close to the answer, and the iteration count of every solve is recorded in `iterations`.
+    """
+
+    def __init__(self, coeffs: sp.csr_matrix, method: str = 'cg', tol: float = 1e-10, precond: str = 'ilu', maxiter: int = None):
+        if method not in METHODS:
+            raise ValueError("Unknown iterative method, expected one of " + ", ".join(METHODS))
+        self.coeffs = coeffs
+        self.method = method
+        self.tol = tol
+        self.maxiter = maxiter
+        self.M = preconditioner(coeffs, method, precond)
+        self.x0 = None
+        self.iterations: List[int] = []
+
+    def solve_one(self, rhs: np.ndarray) -> np.ndarray:
+        """Solves for a single right hand side, starting from x0 when it is set."""
+        count = [0]
+        def callback(_):
+            count[0] += 1
+        if self.method == 'cg':
+            x, info = spla.cg(self.coeffs, rhs, self.x0, rtol=self.tol, maxiter=self.maxiter, M=self.M, callback=callback)
+        else:
+            x, info = spla.gmres(self.coeffs, rhs, self.x0, rtol=self.tol, maxiter=self.maxiter, M=self.M, callback=callback, callback_type='pr_norm')
+        self.iterations.append(count[0])
+        if info < 0 or not np.all(np.isfinite(x)):
+            raise ValueError("Circuit error: no solution")
+        if info > 0:
+            raise ValueError("Iterative solver did not converge")
+        self.x0 = x
+        return x
+
+    def __call__(self, consts: np.ndarray) -> np.ndarray:
+        if consts.ndim == 1:
+            return self.solve_one(consts)
+        # One right hand side per column, each warm started from the previous one
+        return np.column_stack([self.solve_one(column) for column in consts.T])
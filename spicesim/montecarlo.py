@@ -0,0 +1,126 @@
+import numpy as np
+from typing import Dict, List, Tuple, Union
+
+from evalSpice import Netlist, FixedPattern, read_netlist, stamp_matrix, stamp_rhs, conductance_stamps, choose_solver, ITERATIVE
+from topology import check_topology
+
+# Memory one chunk of trials may use, for the stacked (trials x n x n) matrices of the dense path, and for
+# the sampled matrix values and right hand sides of the sparse path
+MC_CHUNK_BYTES = 64 * 2**20
+DISTRIBUTIONS = ('uniform', 'gauss')
+# Element kinds whose values can be varied
+VARIED = ('R', 'V', 'I')
+
+def sample_values(nominal: np.ndarray, trials: int, tolerance: float, distribution: str, rng: np.random.Generator) -> np.ndarray:
+    """Draws random element values around their nominal values.
+
+    Parameters:
+    nominal(np.ndarray): The nominal value of every element.
+    trials(int): The number of samples of every element.
+    tolerance(float): The relative tolerance, such as 0.05 for 5% parts.
+    distribution(str): 'uniform' within the tolerance, or 'gauss' with the tolerance as three standard deviations.
+    rng(np.random.Generator): The source of random numbers.
+
+    Returns:
+    np.ndarray: A (trials x elements) array of values.
+    """
+    if distribution == 'uniform':
+        spread = rng.uniform(-1, 1, (trials, len(nominal)))
+    else:
+        spread = rng.standard_normal((trials, len(nominal))) / 3
+    return nominal * (1 + tolerance * spread)
+
+def summarize(names: List[str], samples: np.ndarray, q: np.ndarray) -> Dict:
+    """Returns the names, mean, standard deviation and percentiles of (trials x names) samples."""
+    return {'names': names, 'mean': samples.mean(axis=0), 'std': samples.std(axis=0), 'q': q,
+            'percentiles': np.percentile(samples, q, axis=0).reshape(len(q), len(names))}
+
+def monte_carlo(netlist: Netlist, trials: int, tolerance: Union[float, Dict[str, float]] = 0.05, distribution: str = 'uniform', seed: int = None, percentiles: Tuple[float, ...] = (5, 50, 95), probes: List[str] = None, solver: str = 'auto') -> Tuple[Dict, Dict]:
+    """Runs a Monte Carlo tolerance analysis of the DC operating point of a compiled circuit.
+
+    Parameters:
+    netlist(Netlist): The compiled circuit.
+    trials(int): The number of random circuits to solve.
+    tolerance(float or Dict[str, float]): The relative tolerance of the resistors, or a dictionary giving it
+    for any of 'R', 'V' and 'I', kinds left out being exact.
+    distribution(str): 'uniform' (default) or 'gauss', see sample_values.
+    seed(int): Seeds the sampling, so that runs with the same seed draw the same circuits.
+    percentiles(Tuple[float]): The percentiles reported for every node and source.
+    probes(List[str]): The nodes whose voltages are kept, all of them by default.
+    solver(str): 'dense', 'sparse' or 'auto', as for evalSpice.
+
+    Returns:
+    Tuple[Dict]: The statistics of the probed node voltages and of the voltage source currents. Each holds
+    the 'names', and the 'mean', 'std' and 'percentiles' arrays, the last one with a row per percentile
+    in 'q'.
+
+    The nominal matrix is stamped once and every trial only adds the change of the resistor conductances,
+    on positions that never move, with an evalSpice.FixedPattern. The trials are sampled and solved in chunks
+    sized to MC_CHUNK_BYTES on both backends. The dense backend solves a whole chunk with one stacked call,
+    and the sparse backend reuses the symbolic analysis of its first factorization for all the trials. Every
+    kind draws from its own stream of the seed, so the samples do not depend on the chunk size.
+    """
+    if trials < 1:
+        raise ValueError("Invalid number of trials")
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError("Unknown distribution, expected one of " + ", ".join(DISTRIBUTIONS))
+    tolerance = tolerance if isinstance(tolerance, dict) else {'R': tolerance}
+    if any(kind not in VARIED for kind in tolerance):
+        raise ValueError("Only the values of " + ", ".join(VARIED) + " elements can be varied")
+    size = netlist.size
+    solver = choose_solver(solver, size)
+    if solver in ITERATIVE:
+        raise ValueError("Monte Carlo analysis needs a direct solver")
+    if not netlist.linear:
+        raise ValueError("Monte Carlo analysis of diodes and MOSFETs is not supported")
+    node_ids = netlist.node_ids
+    probes = netlist.node_names() if probes is None else probes
+    for name in probes:
+        if (name if name != 'GND' else 'n0') not in node_ids:
+            raise KeyError("Unknown node " + name)
+    check_topology(netlist)
+
+    R = netlist.elements['R']
+    rows, cols, _ = conductance_stamps(R.node_array(), R.value_array()[:, 0])
+    keep = (rows >= 0) & (cols >= 0)
+    fixed = stamp_matrix(netlist)
+    pattern = FixedPattern(size, solver, fixed, rows[keep], cols[keep])
+    nominal = {kind: netlist.elements[kind].value_array()[:, 0] for kind in VARIED}
+    streams = dict(zip(VARIED, (np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(len(VARIED)))))
+
+    n = netlist.num_nodes - 1
+    nv = len(netlist.elements['V'])
+    probe_index = np.array([node_ids[name if name != 'GND' else 'n0'] - 1 for name in probes], dtype=np.int64)
+    nodeV = np.zeros((trials, len(probes)))
+    sourceI = np.zeros((trials, nv))
+    # A dense trial holds its matrix, counted twice for the copy LAPACK factors, and a sparse one its matrix
+    # entries and right hand side
+    per_trial = 16 * size * size if solver == 'dense' else 8 * (len(fixed[0]) + size)
+    chunk = max(1, MC_CHUNK_BYTES // per_trial) if per_trial else trials
+    for start in range(0, trials, chunk):
+        count = min(chunk, trials - start)
+        values = {kind: sample_values(nominal[kind], count, tolerance[kind], distribution, streams[kind]) if kind in tolerance else np.broadcast_to(nominal[kind], (count, len(nominal[kind]))) for kind in VARIED}
+        if np.any(values['R'] == 0):
+            raise ValueError("Short circuit leading to infinite current encountered")
+        delta = 1 / values['R'] - 1 / nominal['R']
+        vals = np.hstack((delta, delta, -delta, -delta))[:, keep]
+        consts = stamp_rhs(netlist, values['V'].T, values['I'].T).reshape(size, count).T
+        ans = np.hstack((pattern.solve_batch(vals, consts), np.zeros((count, 1))))
+        # Unknown -1 is the ground node, picked up from the trailing zero column
+        nodeV[start:start + count] = ans[:, probe_index]
+        sourceI[start:start + count] = ans[:, n:n + nv]
+
+    q = np.asarray(percentiles, dtype=float)
+    return (summarize(list(probes), nodeV, q), summarize(netlist.elements['V'].names, sourceI, q))
+
+def evalMonteCarlo(filename: str, trials: int, tolerance: Union[float, Dict[str, float]] = 0.05, distribution: str = 'uniform', seed: int = None, percentiles: Tuple[float, ...] = (5, 50, 95), probes: List[str] = None, solver: str = 'auto') -> Tuple[Dict, Dict]:
+    """
+    Runs a Monte Carlo tolerance analysis of a SPICE file, see monte_carlo for the parameters.
+
+    Parameters:
+    filename(str): The name of the file which contains the circuit to be evaluated.
+
+    Returns:
+    Tuple[Dict]: The statistics of the node voltages and of the voltage source currents.
+    """
+    return monte_carlo(read_netlist(filename), trials, tolerance, distribution, seed, percentiles, probes, solver)
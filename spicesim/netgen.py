@@ -0,0 +1,122 @@
+import numpy as np
+from typing import Iterable, Iterator
+
+from evalSpice import START_OF_CIRCUIT, END_OF_CIRCUIT
+
+# Every generator takes the approximate number of nodes first and yields component lines
+KINDS = ('ladder', 'grid2d', 'grid3d', 'random', 'sources')
+
+def ladder(nodes: int, series: float = 100, shunt: float = 1000, supply: float = 10) -> Iterator[str]:
+    """Yields a resistor ladder driven by a voltage source at one end.
+
+    Parameters:
+    nodes(int): The number of nodes besides GND.
+    series(float), shunt(float): The resistance of every rung along the ladder and to GND.
+    supply(float): The source voltage.
+    """
+    yield f"V1 n1 GND dc {supply}"
+    for k in range(1, nodes):
+        yield f"R{k} n{k} n{k + 1} {series}"
+        yield f"RG{k} n{k + 1} GND {shunt}"
+
+def grid(nodes: int, dims: int = 2, resistance: float = 100, shunt: float = 1e4, supply: float = 10) -> Iterator[str]:
+    """Yields a square (dims=2) or cubic (dims=3) resistor mesh with a leak to GND at every node.
+
+    Parameters:
+    nodes(int): The approximate number of nodes, rounded to a whole number of nodes per side.
+    dims(int): 2 or 3.
+    resistance(float): The resistance between neighbouring nodes.
+    shunt(float): The resistance from every node to GND.
+    supply(float): The voltage of the source on the first corner.
+    """
+    side = max(2, int(round(nodes ** (1 / dims))))
+    shape = (side,) * dims
+    names = np.arange(1, side ** dims + 1).reshape(shape)
+    yield f"V1 n1 GND dc {supply}"
+    for axis in range(dims):
+        first = np.delete(names, -1, axis=axis).ravel()
+        second = np.delete(names, 0, axis=axis).ravel()
+        for a, b in zip(first.tolist(), second.tolist()):
+            yield f"R{axis}_{a} n{a} n{b} {resistance}"
+    for a in names.ravel().tolist():
+        yield f"RG{a} n{a} GND {shunt}"
+
+def random_graph(nodes: int, degree: float = 4, seed: int = 0, supply: float = 10, span: int = 20) -> Iterator[str]:
+    """Yields a connected random sparse resistor network with log-uniform resistances.
+
+    Parameters:
+    nodes(int): The number of nodes besides GND.
+    degree(float): The average number of resistors per node.
+    seed(int): Seeds the graph and the values.
+    supply(float): The voltage of the source on node 1.
+    span(int): The largest difference between the numbers of two nodes joined by a resistor.
+
+    A random tree, every node hanging off one of the `span` nodes before it, keeps the graph connected, and
+    the rest of the resistors join random pairs of nodes at most `span` apart. One node in a hundred also
+    leaks to GND. Keeping the resistors local gives the graph the bounded bandwidth of a real layout, while
+    uniformly random pairs would make an expander on which a sparse LU fills in almost completely.
+    """
+    rng = np.random.default_rng(seed)
+    extra = max(0, int(nodes * degree / 2) - (nodes - 1))
+    tree = np.arange(2, nodes + 1)
+    ends = rng.integers(1, nodes + 1, extra)
+    a = np.concatenate((tree, ends))
+    b = np.concatenate((tree - rng.integers(1, np.minimum(tree - 1, span) + 1), ends + rng.integers(-span, span + 1, extra)))
+    b = np.clip(b, 1, nodes)
+    values = 10 ** rng.uniform(1, 4, len(a))
+    yield f"V1 n1 GND dc {supply}"
+    for k, (x, y, r) in enumerate(zip(a.tolist(), b.tolist(), values.tolist())):
+        if x != y:
+            yield f"R{k} n{x} n{y} {r:.6g}"
+    for x in range(1, nodes + 1, 100):
+        yield f"RG{x} n{x} GND 1000"
+
+def many_sources(nodes: int, sources: int = None, seed: int = 0) -> Iterator[str]:
+    """Yields a resistor ladder with voltage and current sources spread along it.
+
+    Parameters:
+    nodes(int): The number of nodes besides GND.
+    sources(int): The number of sources, by default one for every ten nodes, alternating between
+    voltage sources behind a resistor and current sources.
+    seed(int): Seeds the source values and positions.
+    """
+    rng = np.random.default_rng(seed)
+    sources = max(1, nodes // 10) if sources is None else sources
+    yield from ladder(nodes)
+    taps = rng.integers(1, nodes + 1, sources).tolist()
+    values = rng.uniform(-5, 5, sources).tolist()
+    for k, (tap, value) in enumerate(zip(taps, values)):
+        if k % 2:
+            yield f"I{k} GND n{tap} dc {value * 1e-3:.6g}"
+        else:
+            # Every voltage source drives its own node, so sources never form a loop
+            yield f"V{k + 2} s{k} GND dc {value:.6g}"
+            yield f"RS{k} s{k} n{tap} 50"
+
+def generate(kind: str, nodes: int, seed: int = 0) -> Iterator[str]:
+    """Yields the components of a synthetic circuit of one of the KINDS with about `nodes` nodes."""
+    if kind == 'ladder':
+        return ladder(nodes)
+    if kind == 'grid2d':
+        return grid(nodes, 2)
+    if kind == 'grid3d':
+        return grid(nodes, 3)
+    if kind == 'random':
+        return random_graph(nodes, seed=seed)
+    if kind == 'sources':
+        return many_sources(nodes, seed=seed)
+    raise ValueError("Unknown circuit kind, expected one of " + ", ".join(KINDS))
+
+def write_netlist(filename: str, components: Iterable[str]) -> int:
+    """Writes components into a netlist file one line at a time, returning the number of components.
+
+    Lines are streamed to the file, so circuits with millions of elements never sit in memory as text.
+    """
+    count = 0
+    with open(filename, 'w') as filehandle:
+        filehandle.write(START_OF_CIRCUIT + "\n")
+        for line in components:
+            filehandle.write(line + "\n")
+            count += 1
+        filehandle.write(END_OF_CIRCUIT + "\n")
+    return count
@@ -0,0 +1,272 @@
+import time
+import numpy as np
+from typing import Dict, Tuple
+
+from evalSpice import Netlist, FixedPattern, read_netlist, stamp_matrix, stamp_rhs, conductance_stamps, solution_dicts, choose_solver, ITERATIVE
+
+# Thermal voltage kT/q at 300 K
+VT = 0.025852
+# Conductance every diode keeps across its junction and every MOSFET across its channel, as in SPICE
+GMIN = 1e-12
+# Shunt conductances from every node to GND tried in turn by gmin stepping, ending without any
+GMIN_STEPS = (1e-2, 1e-3, 1e-4, 1e-5, 1e-6, 1e-7, 1e-8, 1e-9, 1e-10, 1e-11, 1e-12, 0.0)
+# Newton has converged once no unknown moves by more than ABSTOL + RELTOL * |value|
+ABSTOL = 1e-9
+RELTOL = 1e-6
+MAX_ITERATIONS = 100
+# Largest change of a MOSFET gate-source or drain-source voltage in one iteration
+MOS_STEP = 0.5
+# Smallest fraction of the full sources that source stepping advances by before giving up
+MIN_SOURCE_STEP = 1e-3
+
+def diode_current(v: np.ndarray, Is: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the current and small signal conductance of exponential diodes at junction voltages v."""
+    e = np.exp(np.minimum(v / VT, 80.0))
+    return Is * (e - 1), Is / VT * e
+
+def limit_junction(v: np.ndarray, v_old: np.ndarray, vcrit: np.ndarray) -> np.ndarray:
+    """Limits the new junction voltages of diodes the way the pnjlim routine of SPICE does.
+
+    Parameters:
+    v(np.ndarray): The junction voltages given by the last linear solve.
+    v_old(np.ndarray): The voltages the diodes were linearized at in the previous iteration.
+    vcrit(np.ndarray): The voltage above which the exponential makes large steps unsafe.
+
+    Returns:
+    np.ndarray: The voltages to linearize the diodes at.
+
+    Above vcrit a forward step of the voltage is replaced by the step of the logarithm of the current,
+    so that the exponential can neither overflow nor make Newton oscillate around the knee.
+    """
+    limited = (v > vcrit) & (np.abs(v - v_old) > 2 * VT)
+    arg = 1 + (v - v_old) / VT
+    stepped = np.where(arg > 0, v_old + VT * np.log(np.maximum(arg, 1e-300)), vcrit)
+    fresh = VT * np.log(np.maximum(v / VT, 1e-300))
+    return np.where(limited, np.where(v_old > 0, stepped, fresh), v)
+
+def mosfet_current(vgs: np.ndarray, vds: np.ndarray, K: np.ndarray, vth: np.ndarray, lam: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the level 1 drain current of MOSFETs with its derivatives gm and gds.
+
+    Parameters:
+    vgs(np.ndarray), vds(np.ndarray): The gate-source and drain-source voltages, in the polarity of the
+    devices and with vds >= 0.
+    K(np.ndarray), vth(np.ndarray), lam(np.ndarray): The transconductance parameter, threshold voltage and
+    channel length modulation of every device.
+
+    Returns:
+    Tuple[np.ndarray]: The drain current and its derivatives with respect to vgs and vds.
+    """
+    vov = vgs - vth
+    on = vov > 0
+    saturated = vds >= vov
+    clm = 1 + lam * vds
+    core = np.where(saturated, vov ** 2 / 2, vov * vds - vds ** 2 / 2)
+    current = np.where(on, K * core * clm, 0.0)
+    gm = np.where(on, K * np.where(saturated, vov, vds) * clm, 0.0)
+    gds = np.where(on, K * (np.where(saturated, 0.0, vov - vds) * clm + core * lam), 0.0)
+    return current, gm, gds
+
+class NewtonSolver:
+    """Finds the DC operating point of a circuit with diodes and MOSFETs by Newton-Raphson iteration.
+
+    The linear elements are stamped once, and every iteration only restamps the companion models of the
+    nonlinear devices, a conductance and a current source for each diode and the gm and gds entries with a
+    current source for each MOSFET. All of these land on positions fixed by the topology, so the matrices
+    are assembled on an evalSpice.FixedPattern, which works out the sparsity pattern once and keeps the
+    fill reducing ordering of the first sparse factorization.
+    """
+
+    def __init__(self, netlist: Netlist, solver: str = 'auto'):
+        size = netlist.size
+        self.solver = choose_solver(solver, size)
+        if self.solver in ITERATIVE:
+            raise ValueError("Newton iteration needs a direct solver")
+        self.netlist = netlist
+        self.size = size
+        self.b = stamp_rhs(netlist)
+
+        D = netlist.elements['D']
+        M = netlist.elements['M']
+        # Unknown -1 is the ground node, the iterates are kept with a trailing zero so that it can be indexed by -1
+        self.da, self.dk = (D.node_array() - 1).T
+        self.Is = D.value_array()[:, 0]
+        if np.any(self.Is <= 0):
+            raise ValueError("Invalidly specified diode element")
+        self.vcrit = VT * np.log(VT / (np.sqrt(2) * self.Is))
+        self.md, self.mg, self.ms = (M.node_array() - 1).T
+        self.polarity, self.K, self.vth, self.lam = M.value_array().T
+        # Thresholds are given like VTO in SPICE, negative for enhancement pmos devices
+        self.vth = self.polarity * self.vth
+        if np.any(self.K <= 0):
+            raise ValueError("Invalidly specified MOSFET element")
+
+        # Positions of the diode stamps, the six MOSFET entries of rows drain and source against columns
+        # drain, source and gate, and the node diagonals used by gmin stepping
+        n = netlist.num_nodes - 1
+        d, g, s = self.md, self.mg, self.ms
+        diode_rows, diode_cols, _ = conductance_stamps(D.node_array(), self.Is)
+        rows = np.concatenate((diode_rows, d, d, d, s, s, s, np.arange(n)))
+        cols = np.concatenate((diode_cols, d, s, g, d, s, g, np.arange(n)))
+        self.keep = (rows >= 0) & (cols >= 0)
+        self.pattern = FixedPattern(size, self.solver, stamp_matrix(netlist), rows[self.keep], cols[self.keep])
+        self.stats = dict(iterations=0, factorizations=0, gmin_steps=0, source_steps=0, strategy=None, assembly_time=0.0, solve_time=0.0, time=0.0)
+
+    def _solve(self, nl_vals: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+        """Adds the nonlinear entries to the linear part and solves, returning None for a singular matrix."""
+        start = time.perf_counter()
+        self.stats['factorizations'] += 1
+        try:
+            return self.pattern.solve(nl_vals, rhs)
+        except ValueError:
+            return None
+        finally:
+            self.stats['solve_time'] += time.perf_counter() - start
+
+    def _stamp(self, vd: np.ndarray, vgs: np.ndarray, vds: np.ndarray, gshunt: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Builds the companion model entries of the devices linearized at the given voltages.
+
+        Parameters:
+        vd(np.ndarray): The diode junction voltages.
+        vgs(np.ndarray), vds(np.ndarray): The MOSFET voltages, in the polarity of the devices.
+        gshunt(float): The conductance from every node to GND added by gmin stepping.
+
+        Returns:
+        Tuple[np.ndarray]: The values of the nonlinear entries and the currents they add to the right hand side.
+        """
+        start = time.perf_counter()
+        current, gd = diode_current(vd, self.Is)
+        gd = gd + GMIN
+        ieq_d = current - (gd - GMIN) * vd
+
+        # A MOSFET with vds < 0 conducts the other way round, its source acting as the drain
+        swap = vds < 0
+        vgs_eff = np.where(swap, vgs - vds, vgs)
+        vds_eff = np.abs(vds)
+        current, gm, gds = mosfet_current(vgs_eff, vds_eff, self.K, self.vth, self.lam)
+        # The current from drain to source is polarity * Id, which has the same derivatives for both polarities
+        ieq_m = np.where(swap, -1, 1) * self.polarity * (current - gm * vgs_eff - gds * vds_eff)
+        gm_d = np.where(swap, 0.0, gm)
+        gm_s = np.where(swap, gm, 0.0)
+        gds = gds + GMIN
+        vals = np.concatenate((gd, gd, -gd, -gd,
+                               gds + gm_s, -gds - gm_d, gm_d - gm_s,
+                               -gds - gm_s, gds + gm_d, gm_s - gm_d,
+                               np.full(self.netlist.num_nodes - 1, gshunt)))
+
+        # Device currents leave the first terminal and enter the second, ground taken by the extra slot
+        scatter = np.concatenate((self.da, self.dk, self.md, self.ms))
+        currents = np.concatenate((-ieq_d, ieq_d, -ieq_m, ieq_m))
+        rhs = np.bincount(np.where(scatter < 0, self.size, scatter), currents, minlength=self.size + 1)[:self.size]
+        self.stats['assembly_time'] += time.perf_counter() - start
+        return vals[self.keep], rhs
+
+    def _mos_voltages(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the gate-source and drain-source voltages of the MOSFETs in their own polarity."""
+        return self.polarity * (x[self.mg] - x[self.ms]), self.polarity * (x[self.md] - x[self.ms])
+
+    def newton(self, x: np.ndarray, gshunt: float = 0.0, scale: float = 1.0) -> Tuple[np.ndarray, int, str]:
+        """Runs Newton iteration from an initial guess.
+
+        Parameters:
+        x(np.ndarray): The initial guess of the unknowns.
+        gshunt(float): The conductance from every node to GND, used by gmin stepping.
+        scale(float): The fraction of the sources switched on, used by source stepping.
+
+        Returns:
+        Tuple: The last iterate, the number of iterations and 'converged', 'singular' or 'diverged'.
+        """
+        b = scale * self.b
+        xe = np.append(x, 0.0)
+        vd_old = xe[self.da] - xe[self.dk]
+        vgs_old, vds_old = self._mos_voltages(xe)
+        for k in range(1, MAX_ITERATIONS + 1):
+            vd = xe[self.da] - xe[self.dk]
+            vgs, vds = self._mos_voltages(xe)
+            vd_lim = limit_junction(vd, vd_old, self.vcrit)
+            vgs_lim = np.clip(vgs, vgs_old - MOS_STEP, vgs_old + MOS_STEP)
+            vds_lim = np.clip(vds, vds_old - MOS_STEP, vds_old + MOS_STEP)
+            limited = not (np.array_equal(vd, vd_lim) and np.array_equal(vgs, vgs_lim) and np.array_equal(vds, vds_lim))
+
+            nl_vals, rhs = self._stamp(vd_lim, vgs_lim, vds_lim, gshunt)
+            ans = self._solve(nl_vals, b + rhs)
+            self.stats['iterations'] += 1
+            if ans is None:
+                return x, k, 'singular'
+            converged = not limited and np.all(np.abs(ans - xe[:-1]) <= ABSTOL + RELTOL * np.abs(ans))
+            xe[:-1] = ans
+            vd_old, vgs_old, vds_old = vd_lim, vgs_lim, vds_lim
+            if converged:
+                return xe[:-1].copy(), k, 'converged'
+        return xe[:-1].copy(), MAX_ITERATIONS, 'diverged'
+
+    def run(self) -> np.ndarray:
+        """Solves for the operating point, falling back on gmin stepping and then on source stepping.
+
+        Returns:
+        np.ndarray: The unknowns at the operating point.
+
+        Plain Newton is tried first from all unknowns at zero. Gmin stepping then ties every node to GND with
+        a conductance that is lowered a decade at a time, each solve starting from the previous one, and
+        source stepping ramps the sources up from zero, halving the step whenever Newton fails. The counts
+        and timings are kept in `stats`.
+        """
+        start = time.perf_counter()
+        zero = np.zeros(self.size)
+        x, _, status = self.newton(zero)
+        self.stats['strategy'] = 'newton'
+        if status != 'converged':
+            self.stats['strategy'] = 'gmin'
+            x = zero
+            for gshunt in GMIN_STEPS:
+                self.stats['gmin_steps'] += 1
+                x, _, status = self.newton(x, gshunt)
+                if status != 'converged':
+                    break
+        if status != 'converged':
+            self.stats['strategy'] = 'source'
+            x = zero
+            scale = 0.0
+            step = 0.1
+            while scale < 1 and step >= MIN_SOURCE_STEP:
+                target = min(1.0, scale + step)
+                self.stats['source_steps'] += 1
+                trial, _, status = self.newton(x, 0.0, target)
+                if status == 'converged':
+                    x, scale, step = trial, target, 2 * step
+                else:
+                    step /= 2
+        self.stats['time'] = time.perf_counter() - start
+        if status == 'singular':
+            raise ValueError("Circuit error: no solution")
+        if status != 'converged':
+            raise ValueError("Newton iteration did not converge")
+        return x
+
+def operating_point(netlist: Netlist, solver: str = 'auto') -> Tuple[Dict, Dict, Dict]:
+    """Solves the DC operating point of a circuit with diodes and MOSFETs.
+
+    Parameters:
+    netlist(Netlist): The compiled circuit.
+    solver(str): 'dense', 'sparse' or 'auto', as for evalSpice.
+
+    Returns:
+    Tuple[Dict]: The node voltages and voltage source currents, as returned by evalSpice, and the statistics
+    of the solve: the total Newton iterations and factorizations, the gmin and source steps taken, the
+    strategy that converged and the time spent assembling, solving and overall in seconds.
+    """
+    newton = NewtonSolver(netlist, solver)
+    x = newton.run()
+    return solution_dicts(netlist, x) + (newton.stats,)
+
+def evalOperatingPoint(filename: str, solver: str = 'auto') -> Tuple[Dict, Dict, Dict]:
+    """
+    Solves the DC operating point of a SPICE file, see operating_point.
+
+    Parameters:
+    filename(str): The name of the file which contains the circuit to be evaluated.
+    solver(str): 'dense', 'sparse' or 'auto', as for evalSpice.
+
+    Returns:
+    Tuple[Dict]: The node voltages, the voltage source currents and the statistics of the Newton solve.
+    """
+    return operating_point(read_netlist(filename), solver)
@@ -0,0 +1,112 @@
+import json
+import time
+import tracemalloc
+import numpy as np
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, IO, Union
+
+# scipy is optional here as well, without it the condition number is computed from the dense matrix
+try:
+    import scipy.sparse as sp
+    import scipy.sparse.linalg as spla
+except ImportError:
+    sp = None
+    spla = None
+
+# Largest system whose condition number is computed densely when scipy is missing
+DENSE_CONDITION_LIMIT = 2000
+
+def condition_estimate(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, size: int, factors: Callable = None) -> float:
+    """Estimates the 1-norm condition number of a matrix given as (row, column, value) triplets.
+
+    Parameters:
+    rows(np.ndarray), cols(np.ndarray), vals(np.ndarray): The entries, repeated positions are summed.
+    size(int): The number of unknowns.
+    factors(Callable): The solve of a factorization of the same matrix already at hand, as returned by
+    evalSpice.factorize, which is reused when it also offers a `transposed` solve.
+
+    Returns:
+    float: The estimate, inf for a singular matrix and nan when it is too costly to compute.
+
+    With scipy the norm of the inverse comes from Higham's block 1-norm estimator, which only costs a few
+    solves. They go through the given factors, or else through an LU factorization made for the purpose,
+    such as for the iterative solvers, which hold none. Without scipy the matrix is inverted densely.
+    """
+    if size == 0:
+        return float('nan')
+    if sp is None:
+        if size > DENSE_CONDITION_LIMIT:
+            return float('nan')
+        coeffs = np.zeros((size, size))
+        np.add.at(coeffs, (rows, cols), vals)
+        return float(np.linalg.cond(coeffs, 1))
+    coeffs = sp.csc_matrix((vals, (rows, cols)), shape=(size, size))
+    transposed = getattr(factors, 'transposed', None)
+    if transposed is not None:
+        solve = factors
+    else:
+        try:
+            lu = spla.splu(coeffs, permc_spec='MMD_AT_PLUS_A')
+        except RuntimeError:
+            return float('inf')
+        solve, transposed = lu.solve, lambda x: lu.solve(x, 'T')
+    inverse = spla.LinearOperator((size, size), matvec=solve, rmatvec=transposed, dtype=float)
+    return float(spla.norm(coeffs, 1) * spla.onenormest(inverse))
+
+class PipelineStats:
+    """Records the wall time and peak memory of the stages of a solve, with facts about its matrix.
+
+    Stages are timed with `stage`, which accumulates over repeated stages of the same name, and facts such
+    as the matrix dimension are added with `record`. The peak memory of a stage is the most memory
+    allocated through Python and numpy at any point of it, above what was allocated when it started, as
+    traced by tracemalloc. Tracing is only switched on while a stage runs, and is skipped altogether with
+    memory=False, as it slows down stages which allocate many small Python objects several times over.
+    """
+
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.stages: Dict[str, Dict[str, float]] = dict()
+        self.info: Dict[str, object] = dict()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = self.memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        if self.memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = self.stages.setdefault(name, {'time': 0.0, 'peak_memory': 0 if self.memory else None, 'calls': 0})
+            entry['time'] += elapsed
+            entry['calls'] += 1
+            if self.memory:
+                entry['peak_memory'] = max(entry['peak_memory'], tracemalloc.get_traced_memory()[1] - base)
+            if started:
+                tracemalloc.stop()
+
+    def record(self, **info) -> None:
+        self.info.update(info)
+
+    def as_dict(self) -> Dict:
+        """Returns the stages, their total time and the recorded facts as plain, JSON serializable values."""
+        return dict(self.info, stages=self.stages, total_time=sum(entry['time'] for entry in self.stages.values()))
+
+    def dump(self, target: Union[str, IO]) -> None:
+        """Writes the statistics as JSON to a file name or an open text file."""
+        if isinstance(target, str):
+            with open(target, 'w') as filehandle:
+                json.dump(self.as_dict(), filehandle, indent=2)
+        else:
+            json.dump(self.as_dict(), target, indent=2)
+
+# Stands in for a stage when no statistics are kept, nullcontext is reusable so a single one does
+_UNTIMED = nullcontext()
+
+def stage_of(stats: PipelineStats, name: str):
+    """Returns the context timing a stage, or the shared no-op context when statistics are not kept."""
+    return stats.stage(name) if stats is not None else _UNTIMED
@@ -0,0 +1,66 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import numpy as np
+from evalSpice import evalSpice, read_netlist
+from ac import ac_sweep, evalAC, frequency_points
+
+# Path to the test data folder - end with / 
+testdata = "./testdata/"
+
+def test_frequency_points():
+    assert np.allclose(frequency_points("lin", 5, 0, 100), [0, 25, 50, 75, 100])
+    f = frequency_points("dec", 10, 1, 1e3)
+    assert len(f) == 31 and np.isclose(f[0], 1) and np.isclose(f[-1], 1e3) and np.isclose(f[10], 10)
+    assert len(frequency_points("oct", 2, 1, 8)) == 7
+    with pytest.raises(ValueError):
+        frequency_points("dec", 10, 0, 1e3)
+    with pytest.raises(ValueError):
+        frequency_points("log", 10, 1, 1e3)
+
+@pytest.mark.parametrize("solver", ["dense", "sparse"])
+def test_lowpass(solver):
+    (f, V, I) = evalAC(testdata + "lowpass.ckt", solver=solver)
+    assert len(f) == 61
+    assert V["n2"].shape == f.shape and V["n2"].dtype == complex
+    assert np.allclose(V["n2"], 1 / (1 + 2j * np.pi * f * 1e-3))
+    assert np.all(V["GND"] == 0) and np.allclose(V["n1"], 1)
+
+def test_series_resonance():
+    f0 = 1 / (2 * np.pi * np.sqrt(1e-3 * 1e-6))
+    (f, Vd, Id) = evalAC(testdata + "rlc.ckt", freqs=[f0, 100, 1e4], solver="dense")
+    # At resonance the reactances cancel and only the 10 ohm resistor is left
+    assert np.isclose(Id["V1"][0], -0.1)
+    (f, Vs, Is) = evalAC(testdata + "rlc.ckt", freqs=[f0, 100, 1e4], solver="sparse")
+    for node in Vd:
+        assert np.allclose(Vd[node], Vs[node])
+    assert np.allclose(Id["V1"], Is["V1"])
+
+def test_ac_sources_only():
+    """Sources given as 'dc' do not drive the AC analysis, while DC analyses keep using every source."""
+    netlist = read_netlist(testdata + "divider.ckt")
+    (f, V, I) = ac_sweep(netlist, [0, 1e3])
+    assert np.all(V["n2"] == 0)
+    (Vout, Iout) = evalSpice(testdata + "lowpass.ckt")
+    assert abs(Vout["n2"] - 1) < 1e-9
+
+@pytest.mark.parametrize("solver", ["dense", "sparse"])
+def test_ac_errors(tmp_path, solver):
+    with pytest.raises(ValueError) as exc_info:
+        evalAC(testdata + "rc.ckt")
+    assert str(exc_info.value) == "No AC analysis specified"
+    # The capacitive divider leaves n2 floating at DC
+    netlist = tmp_path / "divider.ckt"
+    netlist.write_text(".circuit\nV1 n1 GND ac 1\nC1 n1 n2 1e-6\nC2 n2 GND 1e-6\n.end\n")
+    (f, V, I) = evalAC(str(netlist), [1e3], solver=solver)
+    assert np.isclose(V["n2"][0], 0.5)
+    with pytest.raises(ValueError) as exc_info:
+        evalAC(str(netlist), [0, 1e3], solver=solver)
+    assert str(exc_info.value) == "Circuit error: no solution"
+
+@pytest.mark.parametrize("solver", ["iterative", "cg", "gmres"])
+def test_ac_needs_direct_solver(solver):
+    with pytest.raises(ValueError) as exc_info:
+        evalAC(testdata + "lowpass.ckt", solver=solver)
+    assert str(exc_info.value) == "AC analysis needs a direct solver"
@@ -0,0 +1,76 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import shutil
+import pytest
+import numpy as np
+from evalSpice import evalSpice, read_netlist, main
+from cache import cached_netlist, save_netlist, load_netlist, CACHE_DIR
+
+# Path to the test data folder - end with /
+testdata = "./testdata/"
+
+def same_netlist(a, b):
+    assert a.node_ids == b.node_ids and a.analyses == b.analyses
+    for kind in a.elements:
+        assert a.elements[kind].names == b.elements[kind].names
+        assert a.elements[kind].index == b.elements[kind].index
+        assert np.array_equal(a.elements[kind].node_array(), b.elements[kind].node_array())
+        assert np.array_equal(a.elements[kind].value_array(), b.elements[kind].value_array())
+
+@pytest.mark.parametrize("inFile", ["divider.ckt", "rc.ckt", "rlc.ckt", "nmos.ckt"])
+def test_round_trip(tmp_path, inFile):
+    netlist = read_netlist(testdata + inFile)
+    save_netlist(netlist, str(tmp_path / "netlist.npz"))
+    same_netlist(netlist, load_netlist(str(tmp_path / "netlist.npz")))
+
+def test_cache_hit_and_invalidation(tmp_path, monkeypatch):
+    path = tmp_path / "divider.ckt"
+    shutil.copy(testdata + "divider.ckt", path)
+    assert evalSpice(str(path), cache=True) == evalSpice(testdata + "divider.ckt")
+    entries = os.listdir(tmp_path / CACHE_DIR)
+    assert len(entries) == 1
+
+    # A hit never goes near the parser
+    def fail(filename):
+        raise AssertionError("parsed again")
+    monkeypatch.setattr("cache.read_netlist", fail)
+    same_netlist(cached_netlist(str(path)), read_netlist(testdata + "divider.ckt"))
+    monkeypatch.undo()
+
+    # Editing the file misses, and the stale entry is replaced
+    path.write_text(path.read_text().replace("R2 n2 GND 1000", "R2 n2 GND 3000"))
+    (V, I) = evalSpice(str(path), cache=True)
+    assert not np.isclose(V["n2"], 5.5)
+    assert len(os.listdir(tmp_path / CACHE_DIR)) == 1 and os.listdir(tmp_path / CACHE_DIR) != entries
+
+def test_cache_errors(tmp_path):
+    path = tmp_path / "bad.ckt"
+    path.write_text(".circuit\nV1 n1 GND dc 10\nR1 n1 n2\n.end\n")
+    for _ in range(2):
+        with pytest.raises(ValueError) as exc_info:
+            evalSpice(str(path), cache=True)
+        assert str(exc_info.value) == "Invalidly specified resistance element"
+    assert not os.listdir(tmp_path / CACHE_DIR) if os.path.isdir(tmp_path / CACHE_DIR) else True
+    with pytest.raises(FileNotFoundError):
+        evalSpice(str(tmp_path / "missing.ckt"), cache=True)
+
+    # A corrupt entry is rebuilt
+    good = tmp_path / "divider.ckt"
+    shutil.copy(testdata + "divider.ckt", good)
+    evalSpice(str(good), cache=True)
+    entry = tmp_path / CACHE_DIR / os.listdir(tmp_path / CACHE_DIR)[0]
+    entry.write_bytes(b"garbage")
+    assert evalSpice(str(good), cache=True) == evalSpice(str(good))
+
+    # So is an entry cut short, as left behind by a full disk
+    data = entry.read_bytes()
+    for length in (len(data) // 2, len(data) - 10, 40):
+        entry.write_bytes(data[:length])
+        assert evalSpice(str(good), cache=True) == evalSpice(str(good))
+
+def test_cli_cache(tmp_path, capsys):
+    path = tmp_path / "divider.ckt"
+    shutil.copy(testdata + "divider.ckt", path)
+    assert main([str(path), "-j", "1", "--cache"]) == 0
+    assert os.listdir(tmp_path / CACHE_DIR)
@@ -3,7 +3,10 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 import pytest
 import ast
-from evalSpice import evalSpice
+import numpy as np
+import json
+import evalSpice as evalSpice_module
+from evalSpice import evalSpice, evalSpice_many, main, Circuit, parse_file, make_dicts, compile_netlist, iter_components, read_netlist, stamp_matrix, stamp_rhs
 
 # Path to the test data folder - end with / 
 testdata = "./testdata/"
@@ -20,7 +23,7 @@ def test_invalid_file():
 def test_invalid_element():
     with pytest.raises(ValueError) as exc_info:
         evalSpice(testdata + "test_invalid_element.ckt")
-    assert str(exc_info.value) == 'Only V, I, R elements are permitted'
+    assert str(exc_info.value) == 'Only V, I, R, C, L, D, M elements are permitted'
 
 def test_malformed():
     with pytest.raises(ValueError) as exc_info:
@@ -63,3 +66,180 @@ def test_spice(inFile, expFile):
     """Test with various input combinations."""
     (Vout, Iout) = evalSpice(testdata + inFile)
     assert checkdiff(Vout, Iout, expFile) <= 0.001
+
+def write_ladder(path, n):
+    """Writes a resistor ladder driven by a 1V source with `n` series sections."""
+    lines = [".circuit", "V1 n1 GND dc 1"]
+    for k in range(1, n + 1):
+        lines.append(f"Rs{k} n{k} n{k+1} 1")
+        lines.append(f"Rp{k} n{k+1} GND 2")
+    lines.append(".end")
+    path.write_text("\n".join(lines) + "\n")
+
+@pytest.mark.parametrize("solver", ["dense", "sparse", "auto"])
+def test_solvers_divider(solver):
+    (Vout, Iout) = evalSpice(testdata + "divider.ckt", solver=solver)
+    assert Vout["GND"] == 0
+    assert abs(Vout["n1"] - 10) < 1e-9
+    assert abs(Vout["n2"] - 5.5) < 1e-9
+    assert abs(Iout["V1"] + 0.0045) < 1e-9
+
+def test_sparse_matches_dense(tmp_path):
+    netlist = tmp_path / "ladder.ckt"
+    write_ladder(netlist, 50)
+    (Vd, Id) = evalSpice(str(netlist), solver="dense")
+    (Vs, Is) = evalSpice(str(netlist), solver="sparse")
+    assert Vd.keys() == Vs.keys()
+    assert max(abs(Vd[k] - Vs[k]) for k in Vd) < 1e-9
+    assert abs(Id["V1"] - Is["V1"]) < 1e-9
+
+@pytest.mark.parametrize("solver", ["dense", "sparse"])
+def test_singular_circuits(solver):
+    for name in ("hangingisource.netlist", "parallelsource.netlist"):
+        with pytest.raises(ValueError) as exc_info:
+            evalSpice(testdata + name, solver=solver)
+        assert str(exc_info.value) == 'Circuit error: no solution'
+
+def test_unknown_solver():
+    with pytest.raises(ValueError):
+        evalSpice(testdata + "divider.ckt", solver="magic")
+
+def test_short_circuit():
+    with pytest.raises(ValueError) as exc_info:
+        evalSpice(testdata + "ckt18.netlist")
+    assert str(exc_info.value) == 'Short circuit leading to infinite current encountered'
+
+def test_stamped_system():
+    netlist = compile_netlist(*make_dicts(parse_file(testdata + "divider.ckt")))
+    # Nodes are numbered in the order of the sorted component lines
+    assert netlist.node_names() == ["GND", "n2", "n1"]
+    rows, cols, vals = stamp_matrix(netlist)
+    coeffs = np.zeros((netlist.size, netlist.size))
+    np.add.at(coeffs, (rows, cols), vals)
+    expected = [[2e-3, -1e-3, 0], [-1e-3, 1e-3, 1], [0, 1, 0]]
+    assert np.allclose(coeffs, expected)
+    assert np.allclose(stamp_rhs(netlist), [1e-3, 0, 10])
+    # One column of constants per operating point
+    assert stamp_rhs(netlist, vvalues=[[1, 2]], ivalues=[[0, 1]]).shape == (3, 2)
+
+@pytest.mark.parametrize("solver", ["dense", "sparse"])
+def test_circuit_source_sweep(solver):
+    circuit = Circuit.from_file(testdata + "divider.ckt", solver=solver)
+    assert circuit.source_names == ["V1", "I1"]
+    (Vout, Iout) = circuit.solve({"V1": 5})
+    assert abs(Vout["n2"] - 3) < 1e-9
+    assert abs(Iout["V1"] + 0.002) < 1e-9
+    # The overrides do not stick to the circuit
+    assert abs(circuit.solve()[0]["n2"] - 5.5) < 1e-9
+
+    points = np.array([[10, 0.001], [5, 0], [0, 0.002]])
+    nodeV, sourceI = circuit.solve_many(points)
+    assert nodeV.shape == (3, 3) and sourceI.shape == (3, 1)
+    for k, (v, i) in enumerate(points):
+        (Vout, Iout) = circuit.solve({"V1": v, "I1": i})
+        assert np.allclose(nodeV[k], [Vout[name] for name in circuit.node_names])
+        assert np.isclose(sourceI[k, 0], Iout["V1"])
+
+def test_circuit_unknown_source():
+    circuit = Circuit.from_file(testdata + "divider.ckt")
+    with pytest.raises(KeyError):
+        circuit.solve({"V9": 1})
+
+netlist_errors = [
+    ("ckt11.netlist", "Malformed circuit file"),
+    ("ckt21.netlist", "Malformed circuit file"),
+    ("ckt4.netlist", "Netlist has too many start/end identifiers"),
+    ("ckt8.netlist", "Netlist has too many start/end identifiers"),
+    ("ckt9.netlist", "No component found in the netlist"),
+    ("ckt14.netlist", "Invalidly specified resistance element"),
+    ("ckt6.netlist", "Invalidly specified voltage source element"),
+    ("ckt2.netlist", "No GND node found"),
+]
+
+@pytest.mark.parametrize("inFile, message", netlist_errors)
+def test_streaming_parser_errors(inFile, message):
+    """The streaming parser reports the same errors as parse_file and make_dicts."""
+    with pytest.raises(ValueError) as exc_info:
+        read_netlist(testdata + inFile)
+    assert str(exc_info.value) == message
+    with pytest.raises(ValueError) as exc_info:
+        make_dicts(parse_file(testdata + inFile))
+    assert str(exc_info.value) == message
+
+def test_streaming_parser_element_error():
+    # make_dicts only knows the DC elements, the streaming parser also takes C and L
+    with pytest.raises(ValueError) as exc_info:
+        make_dicts(parse_file(testdata + "ckt15.netlist"))
+    assert str(exc_info.value) == "Only V, I, R elements are permitted"
+    with pytest.raises(ValueError) as exc_info:
+        read_netlist(testdata + "ckt15.netlist")
+    assert str(exc_info.value) == "Only V, I, R, C, L, D, M elements are permitted"
+
+def test_streaming_parser():
+    components = iter_components(testdata + "divider.ckt")
+    assert next(components) == ["V1", "n1", "GND", "dc", "10"]
+    netlist = read_netlist(testdata + "divider.ckt")
+    # Nodes are interned in the order they appear in the file
+    assert netlist.node_names() == ["GND", "n1", "n2"]
+    assert netlist.elements["R"].names == ["R1", "R2"]
+    assert list(netlist.elements["R"].values) == [1000, 1000]
+    with pytest.raises(FileNotFoundError):
+        read_netlist("")
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_evalSpice_many(workers):
+    files = [testdata + name for name in ("divider.ckt", "ckt5.netlist", "ckt14.netlist", "missing.ckt", "test_temp.ckt")]
+    results = {filename: (result, error) for filename, result, error in evalSpice_many(files, workers=workers, chunksize=1)}
+    assert results.keys() == set(files)
+    for name in ("divider.ckt", "ckt5.netlist", "test_temp.ckt"):
+        assert results[testdata + name] == (evalSpice(testdata + name), None)
+    result, error = results[testdata + "ckt14.netlist"]
+    assert result is None and isinstance(error, ValueError)
+    assert str(error) == "Invalidly specified resistance element"
+    result, error = results[testdata + "missing.ckt"]
+    assert result is None and isinstance(error, FileNotFoundError)
+
+def test_cli(capsys):
+    status = main([testdata + "divider.ckt", testdata + "ckt9.netlist", "-j", "1"])
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert status == 1
+    assert records[0]["file"] == testdata + "divider.ckt"
+    assert abs(records[0]["nodeV"]["n2"] - 5.5) < 1e-9
+    assert records[1]["error"] == "No component found in the netlist"
+
+@pytest.mark.parametrize("solver", ["dense", "sparse"])
+def test_circuit_edits(tmp_path, solver):
+    netlist = tmp_path / "ladder.ckt"
+    write_ladder(netlist, 20)
+    circuit = Circuit.from_file(str(netlist), solver=solver)
+    circuit.set_resistance("Rs3", 2.2)
+    circuit.set_resistance("Rp7", float("inf"))
+    circuit.add_resistor("Rx", "n5", "n15", 0.5)
+    circuit.set_resistance("Rs3", 4.7)
+    (Vout, Iout) = circuit.solve()
+    # The updated solution matches a fresh factorization of the edited netlist
+    (Vref, Iref) = Circuit(circuit.netlist, solver=solver).solve()
+    assert max(abs(Vout[k] - Vref[k]) for k in Vref) < 1e-9
+    assert abs(Iout["V1"] - Iref["V1"]) < 1e-9
+    nodeV, sourceI = circuit.solve_many([[1], [2]])
+    assert np.allclose(nodeV[1], 2 * np.array([Vref[name] for name in circuit.node_names]))
+
+def test_circuit_edits_refactor(monkeypatch):
+    monkeypatch.setattr(evalSpice_module, "LOW_RANK_LIMIT", 1)
+    circuit = Circuit.from_file(testdata + "divider.ckt")
+    circuit.set_resistance("R2", 3000)
+    circuit.add_resistor("R3", "n2", "GND", 1000)
+    assert len(circuit._edits) == 0
+    assert abs(circuit.solve()[0]["n2"] - 33 / 7) < 1e-9
+
+def test_circuit_edit_errors():
+    circuit = Circuit.from_file(testdata + "divider.ckt")
+    with pytest.raises(KeyError):
+        circuit.set_resistance("R9", 1)
+    with pytest.raises(KeyError):
+        circuit.add_resistor("R3", "n2", "n7", 1)
+    with pytest.raises(ValueError):
+        circuit.add_resistor("R1", "n1", "n2", 1)
+    with pytest.raises(ValueError) as exc_info:
+        circuit.set_resistance("R1", 0)
+    assert str(exc_info.value) == 'Short circuit leading to infinite current encountered'
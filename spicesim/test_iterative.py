@@ -0,0 +1,105 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import numpy as np
+from evalSpice import evalSpice, Circuit
+from iterative import pyamg, preconditioner
+from evalSpice import read_netlist, stamp_matrix, sp
+
+# Path to the test data folder - end with / 
+testdata = "./testdata/"
+
+def write_grid(path, n, source=False):
+    """Writes an n x n resistor grid loaded by current sources, tied to GND at a few nodes or by a source."""
+    lines = [".circuit"]
+    if source:
+        lines.append("V1 a0_0 GND dc 1")
+    for i in range(n):
+        for j in range(n):
+            if i + 1 < n:
+                lines.append(f"Rv{i}_{j} a{i}_{j} a{i+1}_{j} 1")
+            if j + 1 < n:
+                lines.append(f"Rh{i}_{j} a{i}_{j} a{i}_{j+1} 1")
+            if (i * n + j) % 7 == 0:
+                lines.append(f"Rg{i}_{j} a{i}_{j} GND 10")
+            lines.append(f"I{i}_{j} a{i}_{j} GND dc 1e-3")
+    lines.append(".end")
+    path.write_text("\n".join(lines) + "\n")
+
+def max_difference(first, second):
+    return max(abs(first[key] - second[key]) for key in first)
+
+@pytest.mark.parametrize("precond", ["ilu", "jacobi", None])
+def test_cg(tmp_path, precond):
+    netlist = tmp_path / "grid.ckt"
+    write_grid(netlist, 12)
+    (Vref, Iref) = evalSpice(str(netlist), solver="sparse")
+    circuit = Circuit.from_file(str(netlist), solver="iterative", precond=precond)
+    assert circuit.solver == "cg"
+    (Vout, Iout) = circuit.solve()
+    assert max_difference(Vref, Vout) < 1e-8
+    assert len(circuit.iterations) == 1 and circuit.iterations[0] > 0
+
+def test_gmres(tmp_path):
+    netlist = tmp_path / "grid.ckt"
+    write_grid(netlist, 12, source=True)
+    (Vref, Iref) = evalSpice(str(netlist), solver="sparse")
+    circuit = Circuit.from_file(str(netlist), solver="iterative")
+    assert circuit.solver == "gmres"
+    (Vout, Iout) = circuit.solve()
+    assert max_difference(Vref, Vout) < 1e-8
+    assert abs(Iref["V1"] - Iout["V1"]) < 1e-8
+    (Vout, Iout) = evalSpice(testdata + "divider.ckt", solver="gmres", precond="jacobi")
+    assert abs(Vout["n2"] - 5.5) < 1e-8
+
+def test_cg_ilu_is_symmetric(tmp_path):
+    # Resistances over six decades and a single tie to GND, far from diagonally dominant rows
+    rng = np.random.default_rng(3)
+    n = 25
+    lines = [".circuit", "Rg a0_0 GND 1e3"]
+    for i in range(n):
+        for j in range(n):
+            if i + 1 < n:
+                lines.append(f"Rv{i}_{j} a{i}_{j} a{i+1}_{j} {10 ** rng.uniform(-3, 3)}")
+            if j + 1 < n:
+                lines.append(f"Rh{i}_{j} a{i}_{j} a{i}_{j+1} {10 ** rng.uniform(-3, 3)}")
+            lines.append(f"I{i}_{j} a{i}_{j} GND dc 1e-3")
+    netlist = tmp_path / "grid.ckt"
+    netlist.write_text("\n".join(lines + [".end"]) + "\n")
+    compiled = read_netlist(str(netlist))
+    rows, cols, vals = stamp_matrix(compiled)
+    M = preconditioner(sp.csr_matrix((vals, (rows, cols)), shape=(compiled.size,) * 2), "cg", "ilu")
+    x, y = rng.random(compiled.size), rng.random(compiled.size)
+    assert np.isclose(x @ M.matvec(y), y @ M.matvec(x), rtol=1e-10)
+    assert x @ M.matvec(x) > 0
+    (Vref, Iref) = evalSpice(str(netlist), solver="sparse")
+    circuit = Circuit.from_file(str(netlist), solver="cg", precond="ilu", tol=1e-12)
+    (Vout, Iout) = circuit.solve()
+    assert max_difference(Vref, Vout) < 1e-6 * max(abs(value) for value in Vref.values())
+
+def test_warm_start(tmp_path):
+    netlist = tmp_path / "grid.ckt"
+    write_grid(netlist, 12)
+    circuit = Circuit.from_file(str(netlist), solver="cg", precond="jacobi", tol=1e-12)
+    circuit.solve()
+    # Solving again from the previous answer converges straight away
+    circuit.solve()
+    assert circuit.iterations[1] < circuit.iterations[0]
+    # Every column of a sweep is warm started from the previous one
+    circuit.solve_many(np.full((3, len(circuit.source_names)), 1e-3))
+    assert len(circuit.iterations) == 5
+
+def test_iterative_errors():
+    with pytest.raises(ValueError):
+        Circuit.from_file(testdata + "divider.ckt", solver="cg")
+    with pytest.raises(ValueError):
+        evalSpice(testdata + "divider.ckt", solver="gmres", precond="ssor")
+    assert Circuit.from_file(testdata + "divider.ckt").iterations is None
+
+@pytest.mark.skipif(pyamg is not None, reason="pyamg is installed")
+def test_amg_needs_pyamg(tmp_path):
+    netlist = tmp_path / "grid.ckt"
+    write_grid(netlist, 4)
+    with pytest.raises(ImportError):
+        evalSpice(str(netlist), solver="cg", precond="amg")
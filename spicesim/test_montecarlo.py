@@ -0,0 +1,68 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import numpy as np
+import montecarlo
+from evalSpice import read_netlist, Circuit
+from montecarlo import evalMonteCarlo, monte_carlo, sample_values
+
+# Path to the test data folder - end with /
+testdata = "./testdata/"
+
+def test_sample_values():
+    rng = np.random.default_rng(0)
+    samples = sample_values(np.array([100.0, 1000.0]), 1000, 0.05, "uniform", rng)
+    assert samples.shape == (1000, 2)
+    assert np.all(np.abs(samples / [100, 1000] - 1) <= 0.05)
+    samples = sample_values(np.array([100.0]), 20000, 0.03, "gauss", rng)
+    assert np.isclose(samples.std(), 1, rtol=0.05)
+
+def test_matches_individual_solves():
+    # Replaying the resistor samples through Circuit has to give the same node voltages
+    netlist = read_netlist(testdata + "divider.ckt")
+    (V, I) = monte_carlo(netlist, 50, 0.1, seed=3, percentiles=(0, 100))
+    streams = [np.random.default_rng(child) for child in np.random.SeedSequence(3).spawn(3)]
+    samples = sample_values(netlist.elements["R"].value_array()[:, 0], 50, 0.1, "uniform", streams[0])
+    n2 = []
+    for R1, R2 in samples:
+        circuit = Circuit(read_netlist(testdata + "divider.ckt"))
+        circuit.set_resistance("R1", R1)
+        circuit.set_resistance("R2", R2)
+        n2.append(circuit.solve()[0]["n2"])
+    assert V["names"] == ["GND", "n1", "n2"]
+    assert np.isclose(V["mean"][2], np.mean(n2)) and np.isclose(V["std"][2], np.std(n2))
+    assert np.allclose(V["percentiles"][:, 2], [min(n2), max(n2)])
+    assert np.all(V["mean"][:2] == [0, 10]) and np.all(V["std"][:2] == 0)
+    assert I["names"] == ["V1"] and I["percentiles"].shape == (2, 1)
+
+@pytest.mark.parametrize("solver", ["dense", "sparse"])
+def test_reproducible(solver, monkeypatch):
+    (V, I) = evalMonteCarlo(testdata + "divider.ckt", 500, {"R": 0.05, "V": 0.02, "I": 0.1}, "gauss", seed=7, solver=solver)
+    assert 5.4 < V["mean"][2] < 5.6 and V["std"][1] > 0
+    # Tiny chunks draw the same samples, on either path
+    monkeypatch.setattr(montecarlo, "MC_CHUNK_BYTES", 16 * 4 * 4 * 3)
+    calls = []
+    sample_values = montecarlo.sample_values
+    monkeypatch.setattr(montecarlo, "sample_values", lambda *args: calls.append(args[1]) or sample_values(*args))
+    (V2, I2) = evalMonteCarlo(testdata + "divider.ckt", 500, {"R": 0.05, "V": 0.02, "I": 0.1}, "gauss", seed=7, solver=solver)
+    assert max(calls) < 50 and sum(calls) == 3 * 500
+    assert np.allclose(V["mean"], V2["mean"]) and np.allclose(V["percentiles"], V2["percentiles"])
+    assert np.allclose(I["std"], I2["std"])
+    (V3, _) = evalMonteCarlo(testdata + "divider.ckt", 500, seed=8, solver=solver)
+    assert not np.isclose(V["mean"][2], V3["mean"][2])
+
+def test_probes_and_errors():
+    (V, I) = evalMonteCarlo(testdata + "divider.ckt", 10, probes=["n2"], seed=0)
+    assert V["names"] == ["n2"] and V["mean"].shape == (1,) and V["percentiles"].shape == (3, 1)
+    with pytest.raises(KeyError):
+        evalMonteCarlo(testdata + "divider.ckt", 10, probes=["n9"])
+    with pytest.raises(ValueError):
+        evalMonteCarlo(testdata + "divider.ckt", 10, {"C": 0.1})
+    with pytest.raises(ValueError):
+        evalMonteCarlo(testdata + "divider.ckt", 0)
+    with pytest.raises(ValueError):
+        evalMonteCarlo(testdata + "divider.ckt", 10, distribution="lognormal")
+    with pytest.raises(ValueError) as exc_info:
+        evalMonteCarlo(testdata + "divider.ckt", 10, solver="gmres")
+    assert str(exc_info.value) == "Monte Carlo analysis needs a direct solver"
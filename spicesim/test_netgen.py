@@ -0,0 +1,65 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import copy
+import pytest
+import numpy as np
+from evalSpice import evalSpice, read_netlist
+from netgen import KINDS, generate, write_netlist, ladder, grid
+from bench import run_benchmark, compare, main, DEFAULT_SIZES, DEFAULT_LIMITS
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_generated_circuits_solve(tmp_path, kind):
+    path = str(tmp_path / "circuit.ckt")
+    count = write_netlist(path, generate(kind, 300, seed=1))
+    netlist = read_netlist(path)
+    assert sum(len(table) for table in netlist.elements.values()) == count
+    assert 250 <= netlist.num_nodes - 1 <= 400
+    (V, I) = evalSpice(path)
+    assert all(np.isfinite(value) for value in V.values())
+
+def test_generator_shapes(tmp_path):
+    path = str(tmp_path / "ladder.ckt")
+    write_netlist(path, ladder(50))
+    (V, I) = evalSpice(path)
+    assert len(V) == 51 and V["n1"] == 10 and 0 < V["n50"] < V["n2"]
+    # A 4 x 4 x 4 cube has 3 * 4 * 4 * 3 resistors between neighbours and a leak at every node
+    assert write_netlist(path, grid(64, 3)) == 1 + 144 + 64
+    with pytest.raises(ValueError):
+        generate("torus", 10)
+    # The random circuits follow their seed
+    assert list(generate("random", 100, seed=2)) == list(generate("random", 100, seed=2))
+    assert list(generate("random", 100, seed=2)) != list(generate("random", 100, seed=3))
+
+def test_benchmark_report(tmp_path, capsys):
+    report = run_benchmark(["ladder", "grid2d"], [10, 200], repeats=1)
+    assert len(report["results"]) == 4
+    entry = report["results"][0]
+    assert set(entry["phases"]) == {"parse", "assemble", "solve"}
+    # Ten nodes and the branch current of the source
+    assert entry["phases"]["parse"]["peak_memory"] > 0 and entry["size"] == 11
+    assert compare(report, report) == []
+
+    # Slowing a phase down and steepening the scaling are both flagged
+    slower = copy.deepcopy(report)
+    slower["results"][1]["phases"]["solve"]["time"] = 1.0
+    slower["scaling"]["ladder"] = report["scaling"].get("ladder", 1.0) + 1
+    report["scaling"].setdefault("ladder", 1.0)
+    regressions = compare(slower, report)
+    assert len(regressions) == 2 and "solve" in regressions[0] and "ladder" in regressions[1]
+
+    baseline = tmp_path / "baseline.json"
+    assert main(["--kinds", "ladder", "--sizes", "10", "--repeats", "1", "--no-memory", "-o", str(baseline)]) == 0
+    assert main(["--kinds", "ladder", "--sizes", "10", "--repeats", "1", "--no-memory", "--baseline", str(baseline)]) == 0
+    assert '"regressions": []' in capsys.readouterr().out
+
+def test_default_sizes_finish(tmp_path):
+    # The time of the largest default circuit of every kind, extrapolated from 10^4 nodes with the scaling
+    # measured from 10^3, stays within seconds, as the random graphs keep their resistors local
+    report = run_benchmark(list(KINDS), [1000, 10000], repeats=1, memory=False, limits=DEFAULT_LIMITS)
+    for kind in KINDS:
+        largest = max(size for size in DEFAULT_SIZES if size <= DEFAULT_LIMITS.get(kind, size))
+        measured = max((entry for entry in report["results"] if entry["kind"] == kind and entry["nodes"] <= largest), key=lambda entry: entry["nodes"])
+        exponent = max(1.0, report["scaling"].get(kind, 1.0))
+        assert measured["total_time"] * (largest / measured["nodes"]) ** exponent < 20
+    assert report["scaling"]["random"] < 1.3
@@ -0,0 +1,97 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import numpy as np
+import nonlinear
+from evalSpice import evalSpice, read_netlist, Circuit
+from nonlinear import evalOperatingPoint, operating_point, NewtonSolver, VT
+from transient import transient
+
+# Path to the test data folder - end with /
+testdata = "./testdata/"
+
+@pytest.mark.parametrize("solver", ["dense", "sparse"])
+def test_diode(solver):
+    (V, I, stats) = evalOperatingPoint(testdata + "diode.ckt", solver)
+    # The resistor current has to match the diode equation at the junction voltage
+    current = (V["n1"] - V["n2"]) / 1000
+    assert np.isclose(current, 1e-14 * (np.exp(V["n2"] / VT) - 1), rtol=1e-6)
+    assert np.isclose(I["V1"], -current)
+    assert 0.6 < V["n2"] < 0.75
+    assert stats["strategy"] == "newton" and stats["iterations"] == stats["factorizations"] > 1
+
+@pytest.mark.parametrize("solver", ["dense", "sparse"])
+def test_nmos_saturation(solver):
+    (V, I) = evalSpice(testdata + "nmos.ckt", solver)
+    assert np.isclose(V["drain"], 4.5) and np.isclose(I["V1"], -0.5e-3)
+    assert V["gate"] == 2
+
+def test_pmos_and_reversed_channel(tmp_path):
+    # M2 has its drain and source swapped, with `drain` below its source terminal `x`
+    path = tmp_path / "pmos.ckt"
+    path.write_text(".circuit\nV1 vdd GND dc 5\nV2 gate GND dc 3\nR1 drain GND 1000\n"
+                    "M1 drain gate vdd pmos 1e-3 -1 0.01\nM2 x gate drain nmos 2e-3 1 0.02\nR2 x vdd 2000\n.end\n")
+    (V, I, stats) = evalOperatingPoint(str(path))
+    vsd = 5 - V["drain"]
+    i1 = 1e-3 / 2 * (2 - 1) ** 2 * (1 + 0.01 * vsd)
+    vds = V["x"] - V["drain"]
+    i2 = 2e-3 / 2 * (3 - V["drain"] - 1) ** 2 * (1 + 0.02 * vds)
+    assert np.isclose(i2, (5 - V["x"]) / 2000, rtol=1e-6)
+    assert np.isclose(i1 + i2, V["drain"] / 1000, rtol=1e-6)
+
+def test_sparse_matches_dense(tmp_path):
+    lines = [".circuit", "V1 in GND dc 10", "R0 in n0_0 10"]
+    for i in range(12):
+        for j in range(12):
+            if j < 11:
+                lines.append(f"R{i}_{j}h n{i}_{j} n{i}_{j + 1} 100")
+            if i < 11:
+                lines.append(f"R{i}_{j}v n{i}_{j} n{i + 1}_{j} 100")
+            lines.append(f"D{i}_{j} n{i}_{j} GND 1e-14")
+    path = tmp_path / "grid.ckt"
+    path.write_text("\n".join(lines + [".end"]))
+    (Vd, Id, _) = evalOperatingPoint(str(path), "dense")
+    (Vs, Is, stats) = evalOperatingPoint(str(path), "sparse")
+    for node in Vd:
+        assert np.isclose(Vd[node], Vs[node])
+    assert np.isclose(Id["V1"], Is["V1"])
+
+def test_stepping(monkeypatch):
+    # With too few iterations for plain Newton the solver has to ramp its way to the answer
+    (V, I, stats) = evalOperatingPoint(testdata + "diode.ckt")
+    monkeypatch.setattr(nonlinear, "MAX_ITERATIONS", 5)
+    (Vs, Is, stepped) = evalOperatingPoint(testdata + "diode.ckt")
+    assert stepped["strategy"] == "source" and stepped["gmin_steps"] > 0 and stepped["source_steps"] > 0
+    assert np.isclose(Vs["n2"], V["n2"])
+    monkeypatch.setattr(nonlinear, "MAX_ITERATIONS", 1)
+    with pytest.raises(ValueError) as exc_info:
+        evalOperatingPoint(testdata + "diode.ckt")
+    assert str(exc_info.value) == "Newton iteration did not converge"
+
+def test_nonlinear_errors(tmp_path):
+    # A gate only tied to a gate has no DC path to anything
+    path = tmp_path / "floating.ckt"
+    path.write_text(".circuit\nV1 vdd GND dc 5\nR1 vdd d 1000\nM1 d g GND nmos 1e-3 1 0\n.end\n")
+    with pytest.raises(ValueError) as exc_info:
+        evalSpice(str(path))
+    assert str(exc_info.value) == "Circuit error: no solution"
+
+    path.write_text(".circuit\nV1 vdd GND dc 5\nR1 vdd d 1000\nM1 d vdd GND bjt 1e-3 1 0\n.end\n")
+    with pytest.raises(ValueError) as exc_info:
+        read_netlist(str(path))
+    assert str(exc_info.value) == "Invalidly specified MOSFET element"
+
+    netlist = read_netlist(testdata + "diode.ckt")
+    with pytest.raises(ValueError):
+        Circuit(netlist)
+    with pytest.raises(ValueError):
+        transient(netlist, 1e-3, 1e-2)
+    with pytest.raises(ValueError) as exc_info:
+        NewtonSolver(netlist, "gmres")
+    assert str(exc_info.value) == "Newton iteration needs a direct solver"
+
+def test_linear_circuit():
+    # Without nonlinear devices Newton lands on the linear solution
+    (V, I, stats) = operating_point(read_netlist(testdata + "divider.ckt"))
+    assert np.isclose(V["n2"], 5.5) and np.isclose(I["V1"], -0.0045)
@@ -0,0 +1,86 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import io
+import json
+import pytest
+import numpy as np
+from evalSpice import evalSpice, read_netlist, stamp_matrix, Circuit, main
+from profiling import PipelineStats, condition_estimate
+import evalSpice as evalSpice_module
+
+# Path to the test data folder - end with /
+testdata = "./testdata/"
+
+STAGES = {"parse", "topology", "stamp", "factor", "condition", "rhs", "solve"}
+
+@pytest.mark.parametrize("solver", ["dense", "sparse", "gmres"])
+def test_evalSpice_stats(solver):
+    (V, I, stats) = evalSpice(testdata + "divider.ckt", solver, stats=True)
+    assert np.isclose(V["n2"], 5.5) and np.isclose(I["V1"], -0.0045)
+    assert set(stats["stages"]) == STAGES
+    assert all(stage["time"] >= 0 and stage["peak_memory"] >= 0 and stage["calls"] == 1 for stage in stats["stages"].values())
+    assert stats["size"] == 3 and stats["nnz"] == 6 and stats["solver"] == solver and stats["blocks"] == 1
+    assert stats["elements"]["R"] == 2
+    assert np.isclose(stats["total_time"], sum(stage["time"] for stage in stats["stages"].values()))
+    assert ("iterations" in stats) == (solver == "gmres")
+    json.dumps(stats)
+
+def test_time_only_and_nonlinear():
+    (V, I, stats) = evalSpice(testdata + "divider.ckt", stats="time")
+    assert all(stage["peak_memory"] is None for stage in stats["stages"].values())
+    (V, I, stats) = evalSpice(testdata + "nmos.ckt", stats=True)
+    assert set(stats["stages"]) == {"parse", "newton"}
+    assert stats["solver"] == "newton" and stats["newton"]["iterations"] > 0
+
+def test_condition_estimate():
+    netlist = read_netlist(testdata + "divider.ckt")
+    rows, cols, vals = stamp_matrix(netlist)
+    dense = np.zeros((3, 3))
+    np.add.at(dense, (rows, cols), vals)
+    assert np.isclose(condition_estimate(rows, cols, vals, 3), np.linalg.cond(dense, 1))
+    # A floating node makes the matrix singular
+    assert condition_estimate(np.array([0]), np.array([0]), np.array([1.0]), 2) == float("inf")
+
+@pytest.mark.parametrize("solver", ["dense", "sparse"])
+def test_condition_reuses_factors(tmp_path, solver, monkeypatch):
+    # Two dividers only joined at GND are factored as two blocks
+    netlist = tmp_path / "dividers.ckt"
+    netlist.write_text(".circuit\nV1 n1 GND dc 10\nR1 n1 n2 1000\nR2 n2 GND 2000\nI1 n3 GND dc 1\nR3 n3 GND 5\n.end\n")
+    for blocks in (1, 2):
+        compiled = read_netlist(testdata + "divider.ckt" if blocks == 1 else str(netlist))
+        rows, cols, vals = stamp_matrix(compiled)
+        dense = np.zeros((compiled.size, compiled.size))
+        np.add.at(dense, (rows, cols), vals)
+        # The factors of the circuit are reused, no second factorization is made for the estimate
+        calls = []
+        splu = evalSpice_module.spla.splu
+        monkeypatch.setattr(evalSpice_module.spla, "splu", lambda *args, **kwargs: calls.append(1) or splu(*args, **kwargs))
+        stats = PipelineStats(memory=False)
+        Circuit(compiled, solver, stats=stats)
+        monkeypatch.undo()
+        assert stats.info["blocks"] == blocks and len(calls) == (blocks if solver == "sparse" else 0)
+        assert np.isclose(stats.info["condition"], np.linalg.cond(dense, 1))
+
+def test_pipeline_stats():
+    stats = PipelineStats()
+    for _ in range(2):
+        with stats.stage("fill"):
+            block = np.ones(1 << 20)
+    stats.record(size=4)
+    result = stats.as_dict()
+    assert result["size"] == 4 and result["stages"]["fill"]["calls"] == 2
+    assert result["stages"]["fill"]["peak_memory"] >= 8 << 20
+    buffer = io.StringIO()
+    stats.dump(buffer)
+    assert json.loads(buffer.getvalue())["stages"]["fill"]["calls"] == 2
+
+def test_circuit_stats_and_cli(capsys):
+    stats = PipelineStats(memory=False)
+    circuit = Circuit(read_netlist(testdata + "divider.ckt"), stats=stats)
+    circuit.solve()
+    circuit.solve({"V1": 5})
+    assert stats.stages["solve"]["calls"] == 2 and stats.stages["factor"]["calls"] == 1
+    assert main([testdata + "divider.ckt", "-j", "1", "--stats"]) == 0
+    record = json.loads(capsys.readouterr().out)
+    assert set(record["stats"]["stages"]) == STAGES
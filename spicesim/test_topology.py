@@ -0,0 +1,81 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import numpy as np
+from evalSpice import Circuit, read_netlist, stamp_matrix, stamp_rhs, factorize
+from topology import component_labels, check_topology, unknown_blocks
+
+# Path to the test data folder - end with / 
+testdata = "./testdata/"
+
+def write_ladders(path, count, sections):
+    """Writes `count` independent resistor ladders, each driven by its own source and only sharing GND."""
+    lines = [".circuit"]
+    for b in range(count):
+        lines.append(f"V{b} b{b}_0 GND dc {b + 1}")
+        for k in range(sections):
+            lines.append(f"Rs{b}_{k} b{b}_{k} b{b}_{k+1} 1")
+            lines.append(f"Rp{b}_{k} b{b}_{k+1} GND 2")
+    lines.append(".end")
+    path.write_text("\n".join(lines) + "\n")
+
+def test_component_labels():
+    labels = component_labels(7, np.array([1, 2, 5, 6]), np.array([2, 3, 6, 4]))
+    assert labels.tolist() == [0, 1, 1, 1, 4, 4, 4]
+    # A long chain joined in the worst order still ends up in one component
+    chain = np.arange(1000)
+    assert np.all(component_labels(1001, chain[::-1] + 1, chain[::-1]) == 0)
+
+@pytest.mark.parametrize("inFile", ["hangingisource.netlist", "parallelsource.netlist", "ckt10.netlist", "ckt12.netlist"])
+def test_check_topology(inFile):
+    with pytest.raises(ValueError) as exc_info:
+        check_topology(read_netlist(testdata + inFile))
+    assert str(exc_info.value) == 'Circuit error: no solution'
+
+def test_check_topology_passes():
+    for inFile in ("divider.ckt", "test_temp.ckt", "rl.ckt", "rlc.ckt"):
+        check_topology(read_netlist(testdata + inFile))
+
+def test_inductor_loop(tmp_path):
+    netlist = tmp_path / "loop.ckt"
+    netlist.write_text(".circuit\nV1 n1 GND dc 1\nL1 n1 GND 1e-3\nR1 n1 GND 1\n.end\n")
+    with pytest.raises(ValueError):
+        check_topology(read_netlist(str(netlist)))
+
+def test_unknown_blocks(tmp_path):
+    netlist = tmp_path / "ladders.ckt"
+    write_ladders(netlist, 5, 4)
+    blocks = unknown_blocks(read_netlist(str(netlist)))
+    assert len(blocks) == 5
+    # Five nodes and the source current per ladder
+    assert sorted(len(block) for block in blocks) == [6] * 5
+    assert len(unknown_blocks(read_netlist(testdata + "divider.ckt"))) == 1
+
+@pytest.mark.parametrize("solver, workers", [("dense", 1), ("sparse", 2), ("auto", 3)])
+def test_block_solve(tmp_path, solver, workers):
+    netlist = tmp_path / "ladders.ckt"
+    write_ladders(netlist, 6, 10)
+    circuit = Circuit.from_file(str(netlist), solver=solver, workers=workers)
+    (Vout, Iout) = circuit.solve()
+    compiled = read_netlist(str(netlist))
+    rows, cols, vals = stamp_matrix(compiled)
+    ans = factorize(rows, cols, vals, compiled.size, "dense")(stamp_rhs(compiled))
+    assert np.allclose([Vout[name] for name in circuit.node_names][1:], ans[:compiled.num_nodes - 1])
+    nodeV, sourceI = circuit.solve_many(np.eye(6))
+    assert np.allclose(np.diag(sourceI), sourceI[0, 0])
+    circuit.close()
+
+def test_block_solver_pool(tmp_path):
+    netlist = tmp_path / "ladders.ckt"
+    write_ladders(netlist, 4, 5)
+    with Circuit.from_file(str(netlist), workers=2) as circuit:
+        pool = circuit._pool
+        circuit.refactor()
+        circuit.refactor()
+        # Refactoring reuses the one pool instead of starting new threads
+        assert circuit._pool is pool and circuit._solve.pool is pool
+        Vout, Iout = circuit.solve()
+    assert circuit._pool is None
+    with pytest.raises(RuntimeError):
+        pool.submit(int)
@@ -0,0 +1,59 @@
+import os, sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+import numpy as np
+from evalSpice import evalSpice, read_netlist
+from transient import transient, evalTransient
+
+# Path to the test data folder - end with / 
+testdata = "./testdata/"
+
+def test_dc_operating_point():
+    """Capacitors are open and inductors are shorts at DC."""
+    (Vout, Iout) = evalSpice(testdata + "rc.ckt")
+    assert abs(Vout["n2"] - 1) < 1e-9 and abs(Iout["V1"]) < 1e-12
+    (Vout, Iout) = evalSpice(testdata + "rl.ckt")
+    assert abs(Vout["n2"]) < 1e-9 and abs(Iout["V1"] + 0.1) < 1e-9
+
+@pytest.mark.parametrize("method, tolerance", [("trapezoidal", 1e-4), ("backward_euler", 5e-3)])
+def test_rc_step(method, tolerance):
+    (t, V, I) = evalTransient(testdata + "rc.ckt", method=method)
+    assert len(t) == 501 and abs(t[-1] - 5e-3) < 1e-12
+    # The capacitor charges through R with a time constant of 1ms
+    assert np.max(np.abs(V["n2"] - (1 - np.exp(-t / 1e-3)))) < tolerance
+    assert np.all(V["n1"][1:] == 1)
+    assert abs(I["V1"][1] + 1e-3) < 1e-4
+
+@pytest.mark.parametrize("method, tolerance", [("trap", 1e-4), ("be", 5e-3)])
+def test_rl_step(method, tolerance):
+    (t, V, I) = evalTransient(testdata + "rl.ckt", method=method, probes=["n2"])
+    assert list(V.keys()) == ["n2"]
+    # The inductor current rises to 0.1A with a time constant of 1ms
+    assert np.max(np.abs(-I["V1"] - 0.1 * (1 - np.exp(-t / 1e-3)))) < tolerance * 0.1
+    assert np.max(np.abs(V["n2"][1:] - np.exp(-t[1:] / 1e-3))) < tolerance
+
+def test_tran_directive():
+    netlist = read_netlist(testdata + "rl.ckt")
+    assert netlist.analyses[".tran"] == ["1e-5", "5e-3", "be"]
+    # Arguments override the directive
+    (t, V, I) = evalTransient(testdata + "rl.ckt", tstep=1e-4, tstop=1e-3)
+    assert len(t) == 11
+
+def test_sparse_matches_dense():
+    netlist = read_netlist(testdata + "rc.ckt")
+    (t, Vd, Id) = transient(netlist, 1e-5, 1e-3, solver="dense")
+    (t, Vs, Is) = transient(netlist, 1e-5, 1e-3, solver="sparse")
+    assert np.allclose(Vd["n2"], Vs["n2"]) and np.allclose(Id["V1"], Is["V1"])
+
+def test_transient_errors():
+    with pytest.raises(ValueError) as exc_info:
+        evalTransient(testdata + "divider.ckt")
+    assert str(exc_info.value) == "No transient analysis specified"
+    netlist = read_netlist(testdata + "rc.ckt")
+    with pytest.raises(ValueError):
+        transient(netlist, 0, 1e-3)
+    with pytest.raises(ValueError):
+        transient(netlist, 1e-5, 1e-3, method="gear")
+    with pytest.raises(KeyError):
+        transient(netlist, 1e-5, 1e-3, probes=["n9"])
@@ -0,0 +1,137 @@
+import numpy as np
+from concurrent.futures import Executor
+from typing import Callable, List, Optional
+
+def component_labels(size: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Labels the connected components of a graph with a vectorized union-find.
+
+    Parameters:
+    size(int): The number of vertices.
+    a(np.ndarray), b(np.ndarray): The two ends of every edge.
+
+    Returns:
+    np.ndarray: The smallest vertex of the component of every vertex.
+
+    Every round hooks the larger root of each edge joining two sets onto the smaller one, and then
+    compresses the paths by pointer jumping until every vertex points at its root. All of it is done
+    with whole array operations, so large netlists never go through a Python loop per element.
+    """
+    parent = np.arange(size)
+    while True:
+        grand = parent[parent]
+        while not np.array_equal(grand, parent):
+            parent = grand
+            grand = parent[parent]
+        ra = parent[a]
+        rb = parent[b]
+        joining = ra != rb
+        if not joining.any():
+            return parent
+        # Roots only ever point at smaller roots, so no cycles are formed
+        np.minimum.at(parent, np.maximum(ra, rb)[joining], np.minimum(ra, rb)[joining])
+
+def check_topology(netlist) -> None:
+    """Checks from the connectivity alone that the DC equations of a circuit can have a solution.
+
+    Parameters:
+    netlist(Netlist): The compiled circuit.
+
+    Returns:
+    None
+
+    Two conditions make the nodal matrix singular whatever the element values are. A loop made only of
+    voltage sources and inductors, which are shorts at DC, over-determines the voltages around it, and a
+    group of nodes with no path of resistors, sources or inductors to GND has a floating potential. Both
+    raise the same ValueError as a failed solve, found with a few array passes over the elements instead
+    of the cost of a factorization.
+    """
+    size = netlist.num_nodes
+    branches = np.vstack((netlist.elements['V'].node_array(), netlist.elements['L'].node_array()))
+    # The branches form a forest exactly when every one of them merges two components
+    labels = component_labels(size, branches[:, 0], branches[:, 1])
+    if len(branches) > size - np.count_nonzero(labels == np.arange(size)):
+        raise ValueError("Circuit error: no solution")
+    edges = np.vstack((branches, netlist.elements['R'].node_array()))
+    if np.any(component_labels(size, edges[:, 0], edges[:, 1]) != 0):
+        raise ValueError("Circuit error: no solution")
+
+def unknown_blocks(netlist) -> List[np.ndarray]:
+    """Splits the unknowns of a circuit into independent blocks.
+
+    Parameters:
+    netlist(Netlist): The compiled circuit.
+
+    Returns:
+    List[np.ndarray]: The unknowns of every block, sorted within each block.
+
+    Elements only couple the unknowns of the nodes they connect, and GND is not an unknown, so the
+    connected components of the circuit with GND taken out give a block diagonal matrix. A voltage
+    source or inductor joins the block of its terminals with its branch current.
+    """
+    n = netlist.num_nodes - 1
+    edges = np.vstack([netlist.elements[kind].node_array() for kind in ('R', 'V', 'L')])
+    edges = edges[(edges[:, 0] != 0) & (edges[:, 1] != 0)]
+    node_labels = component_labels(netlist.num_nodes, edges[:, 0], edges[:, 1])
+
+    labels = np.empty(netlist.size, dtype=np.int64)
+    labels[:n] = node_labels[1:]
+    for kind in ('V', 'L'):
+        nodes = netlist.elements[kind].node_array()
+        offset = netlist.branch_offset(kind)
+        # The branch belongs with whichever terminal is not GND
+        labels[offset:offset + len(nodes)] = node_labels[np.where(nodes[:, 0] != 0, nodes[:, 0], nodes[:, 1])]
+    order = np.argsort(labels, kind='stable')
+    splits = np.flatnonzero(np.diff(labels[order])) + 1
+    return np.split(order, splits)
+
+class BlockSolver:
+    """Solves a block diagonal system one independent block at a time.
+
+    Instances are used in place of the LU factors returned by evalSpice.factorize, and factor and solve
+    their blocks on the given thread pool, as the numpy and scipy solvers release the GIL. The pool
+    belongs to the caller, which reuses it across refactorizations and shuts it down.
+    """
+
+    def __init__(self, rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, blocks: List[np.ndarray], factor: Callable, pool: Optional[Executor] = None):
+        size = sum(len(block) for block in blocks)
+        block_of = np.empty(size, dtype=np.int64)
+        local = np.empty(size, dtype=np.int64)
+        for k, block in enumerate(blocks):
+            block_of[block] = k
+            local[block] = np.arange(len(block))
+        # Group the triplets by the block of their row, every entry lies inside one block
+        owner = block_of[rows]
+        order = np.argsort(owner, kind='stable')
+        bounds = np.searchsorted(owner[order], np.arange(len(blocks) + 1))
+        parts = [order[bounds[k]:bounds[k + 1]] for k in range(len(blocks))]
+
+        self.blocks = blocks
+        self.pool = pool
+        tasks = [(local[rows[part]], local[cols[part]], vals[part], len(block)) for part, block in zip(parts, blocks)]
+        self.solvers = self._map(lambda task: factor(*task), tasks)
+
+    def _map(self, function: Callable, items: list) -> list:
+        return list(self.pool.map(function, items) if self.pool is not None else map(function, items))
+
+    @property
+    def iterations(self) -> List[int]:
+        counts = [getattr(solve, 'iterations', None) for solve in self.solvers]
+        return None if all(count is None for count in counts) else sum((count or [] for count in counts), [])
+
+    def __call__(self, consts: np.ndarray) -> np.ndarray:
+        return self._solve_blocks(self.solvers, consts)
+
+    @property
+    def transposed(self) -> Optional[Callable]:
+        """Solves with the transposed matrix, when every block has a direct solver offering it."""
+        solvers = [getattr(solve, 'transposed', None) for solve in self.solvers]
+        if any(solve is None for solve in solvers):
+            return None
+        return lambda consts: self._solve_blocks(solvers, consts)
+
+    def _solve_blocks(self, solvers: List[Callable], consts: np.ndarray) -> np.ndarray:
+        ans = np.empty(consts.shape)
+        results = self._map(lambda k: solvers[k](consts[self.blocks[k]]), range(len(self.blocks)))
+        for block, result in zip(self.blocks, results):
+            ans[block] = result
+        return ans
@@ -0,0 +1,124 @@
+import numpy as np
+from typing import Dict, List, Tuple
+
+from evalSpice import Netlist, read_netlist, stamp_matrix, stamp_reactive, stamp_rhs, choose_solver, factorize
+
+# Integration methods accepted by transient, with the short names allowed in a .tran directive
+METHODS = {'trapezoidal': 'trapezoidal', 'trap': 'trapezoidal', 'backward_euler': 'backward_euler', 'be': 'backward_euler'}
+
+def transient(netlist: Netlist, tstep: float, tstop: float, method: str = 'trapezoidal', probes: List[str] = None, solver: str = 'auto') -> Tuple[np.ndarray, Dict, Dict]:
+    """Runs a fixed step transient analysis of a compiled circuit.
+
+    Parameters:
+    netlist(Netlist): The compiled circuit.
+    tstep(float): The time step.
+    tstop(float): The end time, rounded to a whole number of steps.
+    method(str): 'trapezoidal' (default) or 'backward_euler'.
+    probes(List[str]): The nodes whose voltages are recorded, all of them by default.
+    solver(str): The linear solver backend, as for evalSpice.
+
+    Returns:
+    Tuple: The time points, a dictionary mapping the probed nodes to their voltage waveforms and a
+    dictionary mapping the voltage sources to their current waveforms.
+
+    The circuit starts at rest, with every capacitor discharged and no current in the inductors, and the
+    sources switch on at t = 0. Every capacitor and inductor is replaced by its companion model, a
+    conductance in parallel with a current source for capacitors and a branch equation with a history term
+    for inductors. With a fixed step the companion conductances never change, so the system matrix is
+    factored once and each step only updates the history terms of the right hand side and back-substitutes.
+    """
+    if not netlist.linear:
+        raise ValueError("Transient analysis of diodes and MOSFETs is not supported")
+    if method not in METHODS:
+        raise ValueError("Unknown integration method, expected one of " + ", ".join(METHODS))
+    trapezoidal = METHODS[method] == 'trapezoidal'
+    steps = int(round(tstop / tstep)) if tstep > 0 else 0
+    if steps < 1:
+        raise ValueError("Invalid transient time step")
+    node_ids = netlist.node_ids
+    probes = netlist.node_names() if probes is None else probes
+    for name in probes:
+        if (name if name != 'GND' else 'n0') not in node_ids:
+            raise KeyError("Unknown node " + name)
+
+    # The trapezoidal rule doubles the companion conductances of backward Euler
+    size = netlist.size
+    scale = (2 if trapezoidal else 1) / tstep
+    G = stamp_matrix(netlist)
+    C = stamp_reactive(netlist)
+    rows, cols, vals = (np.concatenate((g, c)) for g, c in zip(G, C))
+    vals[len(G[2]):] *= scale
+    solve = factorize(rows, cols, vals, size, choose_solver(solver, size, netlist.definite))
+    b = stamp_rhs(netlist)
+
+    # Unknown -1 is the ground node, the solution is kept with a trailing zero so that it can be indexed by -1
+    cap = netlist.elements['C']
+    ind = netlist.elements['L']
+    ca, cb = (cap.node_array() - 1).T
+    la, lb = (ind.node_array() - 1).T
+    gc = scale * cap.value_array()[:, 0]
+    rl = scale * ind.value_array()[:, 0]
+    lk = netlist.branch_offset('L') + np.arange(len(ind))
+    # The companion current of a capacitor is injected into its first node and drawn from its second
+    scatter = np.where(np.concatenate((ca, cb)) < 0, size, np.concatenate((ca, cb)))
+
+    nv = len(netlist.elements['V'])
+    probe_index = [node_ids[name if name != 'GND' else 'n0'] - 1 for name in probes]
+    source_index = netlist.branch_offset('V') + np.arange(nv)
+    nodeV = np.zeros((steps + 1, len(probes)))
+    sourceI = np.zeros((steps + 1, nv))
+
+    x = np.zeros(size + 1)
+    vc = np.zeros(len(cap))
+    ic = np.zeros(len(cap))
+    vl = np.zeros(len(ind))
+    for k in range(1, steps + 1):
+        # The sources switching on at t = 0 make the rest state an inconsistent start for the trapezoidal
+        # rule, so its first step is taken as two backward Euler half steps, which use the same matrix
+        if not trapezoidal:
+            substeps = (False,)
+        elif k == 1:
+            substeps = (False, False)
+        else:
+            substeps = (True,)
+        for history in substeps:
+            ieq = gc * vc + ic if history else gc * vc
+            rhs = b + np.bincount(scatter, np.concatenate((ieq, -ieq)), minlength=size + 1)[:size]
+            rhs[lk] = -rl * x[lk] - vl if history else -rl * x[lk]
+            x[:size] = solve(rhs)
+
+            vc_new = x[ca] - x[cb]
+            ic = gc * (vc_new - vc) - ic if history else gc * (vc_new - vc)
+            vc = vc_new
+            vl = x[la] - x[lb]
+        nodeV[k] = x[probe_index]
+        sourceI[k] = x[source_index]
+
+    times = np.arange(steps + 1) * tstep
+    return (times, dict(zip(probes, nodeV.T)), dict(zip(netlist.elements['V'].names, sourceI.T)))
+
+def evalTransient(filename: str, tstep: float = None, tstop: float = None, method: str = None, probes: List[str] = None, solver: str = 'auto') -> Tuple[np.ndarray, Dict, Dict]:
+    """
+    Runs the transient analysis of a SPICE file.
+
+    Parameters:
+    filename(str): The name of the file which contains the circuit to be evaluated.
+    tstep(float), tstop(float), method(str): The time step, end time and integration method. Those not
+    given are taken from the `.tran tstep tstop [method]` line of the netlist.
+    probes(List[str]): The nodes whose voltages are recorded, all of them by default.
+    solver(str): The linear solver backend, as for evalSpice.
+
+    Returns:
+    Tuple: The time points and the node voltage and voltage source current waveforms, see transient.
+    """
+    netlist = read_netlist(filename)
+    fields = netlist.analyses.get('.tran')
+    if fields is None and (tstep is None or tstop is None):
+        raise ValueError("No transient analysis specified")
+    if tstep is None:
+        tstep = float(fields[0])
+    if tstop is None:
+        tstop = float(fields[1])
+    if method is None:
+        method = fields[2].lower() if fields is not None and len(fields) == 3 else 'trapezoidal'
+    return transient(netlist, tstep, tstop, method, probes, solver)